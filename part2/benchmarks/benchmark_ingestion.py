@@ -0,0 +1,126 @@
+"""Measures the throughput of a full ingestion run against a fake exchange.
+
+Run from the part2 directory with:
+python -m benchmarks.benchmark_ingestion --symbols 100 --days 30 --latency 0.05
+"""
+import argparse
+import asyncio
+import math
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from src.utils.concurrency import AdaptiveConcurrency
+from src.utils.cost_model import KLINES_WEIGHT, CostModel
+from src.utils.fake_exchange import FakeAsyncClient, FakeExchange
+from src.utils.helpers import logger
+from src.utils.orderbook import Orderbook
+
+logger = logger("benchmark_ingestion")
+
+
+def symbol_names(number_of_symbols: int) -> list:
+    """Generates names of symbols that do not exist on the real exchange."""
+    return [
+        "Q" + chr(65 + i // 26 % 26) + chr(65 + i % 26) + chr(65 + i // 676)
+        for i in range(number_of_symbols)
+    ]
+
+
+async def run(
+    number_of_symbols: int,
+    days: int,
+    latency: float,
+    throttle_rate: float,
+    error_rate: float,
+    backfill_concurrency: int,
+    fixed_concurrency: int = None,
+    window_size: str = "5m",
+) -> None:
+    start_date = datetime.utcnow() - timedelta(days=days)
+    start_time = int(start_date.timestamp() * 1000)
+    symbols = symbol_names(number_of_symbols)
+    exchange = FakeExchange(
+        symbols=[f"{symbol}USDT" for symbol in symbols],
+        # a third of the symbols is listed halfway through the range
+        listings={
+            f"{symbol}USDT": start_time + (i % 3 == 0) * days * 43_200_000
+            for i, symbol in enumerate(symbols)
+        },
+        request_weight=CostModel.request_weight,
+        latency=latency,
+        throttle_rate=throttle_rate,
+        error_rate=error_rate,
+    )
+
+    with tempfile.TemporaryDirectory() as base_path:
+        orderbook = Orderbook(
+            base_currencies=["USDT"],
+            window_size=window_size,
+            base_path=base_path,
+            start_date=start_date.strftime("%d-%m-%Y"),
+            backfill_concurrency=backfill_concurrency,
+        )
+        if fixed_concurrency is not None:
+            # a static limit to compare the adaptive limit with
+            orderbook.concurrency = AdaptiveConcurrency(
+                initial=fixed_concurrency,
+                minimum=fixed_concurrency,
+                maximum=fixed_concurrency,
+            )
+        orderbook.use_client(FakeAsyncClient(exchange))
+
+        start = time.perf_counter()
+        await orderbook.get_orderbook(action="update", to_write=True)
+        duration = time.perf_counter() - start
+
+        candles = [
+            len(orderbook.storage.read("USDT", symbol, window_size))
+            for symbol in symbols
+        ]
+
+    # the weight of only the pages that hold the candles, without any overhead
+    minimal_weight = sum(
+        math.ceil(n / orderbook.cost_model.page_limit) * KLINES_WEIGHT for n in candles
+    )
+    logger.info(f"duration:          {duration:.2f}s")
+    logger.info(f"symbols/sec:       {number_of_symbols / duration:.1f}")
+    logger.info(f"candles/sec:       {sum(candles) / duration:.0f}")
+    logger.info(f"requests:          {exchange.requests}")
+    logger.info(f"rejected (429):    {exchange.rejected}")
+    logger.info(f"errors (503):      {exchange.errors}")
+    logger.info(f"weight used:       {exchange.total_weight}")
+    logger.info(f"weight efficiency: {minimal_weight / exchange.total_weight:.2f}")
+    logger.info(f"concurrency:       {orderbook.concurrency.metrics}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--backfill-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--fixed-concurrency",
+        type=int,
+        help="a fixed number of requests in flight instead of the adaptive limit",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            number_of_symbols=args.symbols,
+            days=args.days,
+            latency=args.latency,
+            throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate,
+            backfill_concurrency=args.backfill_concurrency,
+            fixed_concurrency=args.fixed_concurrency,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
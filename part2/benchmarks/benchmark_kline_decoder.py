@@ -0,0 +1,74 @@
+"""Compares the decoding of raw klines into a dataframe with the row based approach.
+
+Run from the root of the repository with:
+python -m part2.benchmarks.benchmark_kline_decoder
+"""
+import random
+import time
+from typing import Callable, List
+
+import polars as pl
+
+from part2.src.utils.helpers import logger
+from part2.src.utils.kline_decoder import PRICE_COLUMNS, decode_klines
+
+logger = logger("benchmark_kline_decoder")
+
+
+def generate_klines(number_of_klines: int, seed: int = 42) -> List:
+    """Generates klines in the format in which the exchange returns them."""
+    rng = random.Random(seed)
+    start_time = 1648425600000
+    window_size_ms = 5 * 60 * 1000
+    klines = []
+    for i in range(number_of_klines):
+        open_time = start_time + i * window_size_ms
+        klines.append(
+            [open_time]
+            + [f"{rng.uniform(0, 100):.8f}" for _ in range(5)]
+            + [open_time + window_size_ms - 1, f"{rng.uniform(0, 1e5):.8f}"]
+            + [rng.randint(0, 1000)]
+            + [f"{rng.uniform(0, 1e4):.8f}", f"{rng.uniform(0, 1e5):.8f}", "0"]
+        )
+    return klines
+
+
+def decode_klines_row_based(klines: List, symbol: str) -> pl.DataFrame:
+    """The original decoding: a dataframe built from the rows, cast afterwards."""
+    columns = ["timestamp", "open", "high", "low", "close", "volume", "close_time"]
+    columns += ["quote_av", "trades", "tb_base_av", "tb_quote_av", "ignore"]
+    df = pl.DataFrame(klines, columns=columns)
+    return df.select(
+        [
+            pl.col(["timestamp", "close_time"]).cast(pl.Datetime("ms")),
+            pl.col(PRICE_COLUMNS).cast(pl.Float64),
+            pl.col("trades"),
+            pl.lit(symbol).alias("symbol"),
+        ]
+    )
+
+
+def time_decoder(decoder: Callable, klines: List, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        decoder(klines, "ETH")
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def main(number_of_klines: int = 100_000, repeat: int = 5):
+    klines = generate_klines(number_of_klines)
+    assert decode_klines(klines, "ETH").frame_equal(
+        decode_klines_row_based(klines, "ETH")
+    )
+
+    row_based = time_decoder(decode_klines_row_based, klines, repeat)
+    columnar = time_decoder(decode_klines, klines, repeat)
+    logger.info(f"row based: {row_based:.3f}s for {number_of_klines} klines")
+    logger.info(f"columnar:  {columnar:.3f}s for {number_of_klines} klines")
+    logger.info(f"speedup:   {row_based / columnar:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""Compares the pandas and the polars squeeze pipelines stage by stage on generated
+candles.
+
+Every combination of the given numbers of symbols, years and base intervals is
+generated from a fixed seed, so the same arguments always measure the same data. Each
+pipeline runs in a fresh process and the report holds per stage the duration, the
+throughput and the peak memory. Given the report of an earlier run as baseline, the
+stages that became slower are reported as regressions.
+
+Run from the root of the repository with:
+python -m part2.benchmarks.benchmark_pipelines --symbols 5 20 --years 1 \
+    --output report.json --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from part2.src.indicators.ttm_squeeze import SCAN_COLUMNS
+from part2.src.indicators.ttm_squeeze import TTMSqueeze as PolarsTTMSqueeze
+from part2.src.pandas.indicators.ttm_squeeze import TTMSqueeze as PandasTTMSqueeze
+from part2.src.utils.dataloader import DataLoader
+from part2.src.utils.helpers import logger
+from part2.src.utils.resample import interval_to_timedelta
+from part2.src.utils.storage import ParquetStorage
+
+logger = logger("benchmark_pipelines")
+
+BASE_CURRENCY = "USDT"
+START = datetime(2019, 1, 1)
+STAGES = ["load", "resample", "indicators", "detect"]
+PIPELINES = ["pandas", "polars"]
+# the intervals of polars_ttmsqueeze_breakouts.py and pandas_ttmsqueeze_breakouts.py
+POLARS_INTERVALS = ["1h", "2h", "4h", "8h", "12h", "1d", "2d", "3d", "1w"]
+PANDAS_INTERVALS = ["1h", "2h", "4h", "8h", "12h", "1d", "2d", "3d", "7d"]
+
+
+def generate_candles(
+    symbol_index: int, years: int, base_interval: str, seed: int = 42
+) -> pl.DataFrame:
+    """Generates the candles of a symbol in the stored format: a random walk of which
+    the volatility changes every 500 candles, so squeezes and breakouts occur.
+
+    :param symbol_index: The number of the symbol, every symbol gets other candles.
+    :param years: The number of years of candles.
+    :param base_interval: The interval of the candles e.g. 5m.
+    :param seed: The seed of the random generator.
+    """
+    window = interval_to_timedelta(base_interval)
+    n = timedelta(days=365 * years) // window
+    rng = np.random.default_rng([seed, symbol_index])
+
+    # the same volatility per day, whatever the interval
+    scale = np.sqrt(window / timedelta(minutes=5))
+    volatility = np.repeat(rng.uniform(0.2, 2, n // 500 + 1), 500)[:n]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003 * scale, n) * volatility))
+    open_price = np.concatenate([[100.0], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.002 * scale, n)) * volatility
+    volume = rng.lognormal(10, 1, n)
+    taker_volume = volume * rng.uniform(0.3, 0.7, n)
+
+    timestamps = pl.date_range(START, START + (n - 1) * window, base_interval)
+    return pl.DataFrame(
+        {
+            "timestamp": timestamps,
+            "close_time": timestamps,
+            "open": open_price,
+            "high": np.maximum(open_price, close) * (1 + spread),
+            "low": np.minimum(open_price, close) * (1 - spread),
+            "close": close,
+            "volume": volume,
+            "quote_av": volume * close,
+            "tb_base_av": taker_volume,
+            "tb_quote_av": taker_volume * close,
+            "trades": rng.integers(10, 1000, n),
+            "symbol": [f"S{symbol_index:03d}"] * n,
+        }
+    ).with_columns(
+        [
+            pl.col("timestamp").dt.cast_time_unit("ms"),
+            (pl.col("close_time").dt.cast_time_unit("ms") + window)
+            - timedelta(milliseconds=1),
+        ]
+    )
+
+
+def generate_dataset(
+    path: str, symbols: int, years: int, base_interval: str, seed: int
+) -> int:
+    """Stores the generated candles as parquet, which both pipelines read.
+
+    Returns the number of candles.
+    """
+    storage = ParquetStorage(os.path.join(path, "parquet"))
+    candles = 0
+    for i in range(symbols):
+        df = generate_candles(i, years, base_interval, seed)
+        storage.append(BASE_CURRENCY, df["symbol"][0], base_interval, df)
+        candles += len(df)
+    return candles
+
+
+def resident_memory() -> int:
+    """Returns the memory the process currently uses, in bytes.
+
+    Where /proc is missing the highest memory use so far is returned instead.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageRecorder:
+    def __init__(self, sample_interval: float = 0.005):
+        """Records the duration and the peak memory of the stages of a pipeline.
+
+        The memory is sampled in the background while a stage runs, and counted from
+        the memory in use when the recorder is created.
+
+        :param sample_interval: The number of seconds between the memory samples.
+        """
+        self.sample_interval = sample_interval
+        self.seconds = defaultdict(float)
+        self.peak_memory = defaultdict(int)
+        self._baseline = resident_memory()
+        self._stage = None
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Adds the duration and the memory of the block to the stage."""
+        self._stage = name
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start_time
+            self._record()
+            self._stage = None
+
+    def close(self) -> None:
+        self._running = False
+        self._thread.join()
+        return
+
+    def _sample(self) -> None:
+        while self._running:
+            self._record()
+            time.sleep(self.sample_interval)
+        return
+
+    def _record(self) -> None:
+        stage = self._stage
+        if stage is not None:
+            self.peak_memory[stage] = max(
+                self.peak_memory[stage], resident_memory() - self._baseline
+            )
+        return
+
+
+def run_polars(path: str, base_interval: str, recorder: StageRecorder) -> int:
+    """Runs the squeeze of polars_ttmsqueeze_breakouts.py on the whole history.
+
+    Returns the number of breakouts.
+    """
+    dataloader = DataLoader(storage=ParquetStorage(os.path.join(path, "parquet")))
+    ttm_squeeze = PolarsTTMSqueeze()
+
+    with recorder.stage("load"):
+        df = dataloader.scan_universe(
+            BASE_CURRENCY, base_interval, columns=SCAN_COLUMNS
+        ).collect()
+    with recorder.stage("resample"):
+        pyramid = dataloader.to_pyramid_polars(df, POLARS_INTERVALS)
+    with recorder.stage("indicators"):
+        pyramid = {
+            interval: ttm_squeeze._gather_squeeze_indicators_polars(df, by="symbol")
+            for interval, df in pyramid.items()
+        }
+    with recorder.stage("detect"):
+        breakouts = sum(
+            len(ttm_squeeze.detect_breakouts_polars(df)) for df in pyramid.values()
+        )
+    return breakouts
+
+
+def run_pandas(path: str, base_interval: str, recorder: StageRecorder) -> int:
+    """Runs the squeeze of pandas_ttmsqueeze_breakouts.py, symbol by symbol.
+
+    Returns the number of breakouts.
+    """
+    dataloader = DataLoader(storage=ParquetStorage(os.path.join(path, "parquet")))
+    ttm_squeeze = PandasTTMSqueeze()
+
+    breakouts = 0
+    for symbol in dataloader.storage.symbols(BASE_CURRENCY, base_interval):
+        with recorder.stage("load"):
+            df = dataloader.read_symbol_pandas(BASE_CURRENCY, symbol, base_interval)
+        for interval in PANDAS_INTERVALS:
+            # every interval is resampled from the previous one, as in the pipeline
+            with recorder.stage("resample"):
+                df = dataloader.to_interval_pandas(df, interval)
+            with recorder.stage("indicators"):
+                df = ttm_squeeze._gather_squeeze_indicators_pandas(df)
+            with recorder.stage("detect"):
+                breakouts += bool(ttm_squeeze.is_breaking_out_pandas(df))
+    return breakouts
+
+
+def measure(pipeline: str, path: str, base_interval: str, repeat: int) -> Dict:
+    """Runs a pipeline repeatedly and keeps per stage the shortest duration and the
+    highest memory use."""
+    run = run_pandas if pipeline == "pandas" else run_polars
+    seconds = defaultdict(list)
+    peak_memory = defaultdict(int)
+    for _ in range(repeat):
+        recorder = StageRecorder()
+        breakouts = run(path, base_interval, recorder)
+        recorder.close()
+        for stage in STAGES:
+            seconds[stage].append(recorder.seconds[stage])
+            peak_memory[stage] = max(peak_memory[stage], recorder.peak_memory[stage])
+    return {
+        "seconds": {stage: min(seconds[stage]) for stage in STAGES},
+        "peak_memory": dict(peak_memory),
+        "breakouts": breakouts,
+    }
+
+
+def stage_report(seconds: float, candles: int, peak_memory: int) -> Dict:
+    return {
+        "seconds": round(seconds, 4),
+        "candles_per_second": round(candles / seconds) if seconds > 0 else None,
+        "peak_memory_mb": round(peak_memory / 1e6, 1),
+    }
+
+
+def run_grid(
+    symbols: List,
+    years: List,
+    base_intervals: List,
+    pipelines: List,
+    repeat: int,
+    seed: int,
+) -> List:
+    """Measures every pipeline on every generated dataset of the grid."""
+    results = []
+    for base_interval in base_intervals:
+        for number_of_years in years:
+            for number_of_symbols in symbols:
+                dataset = {
+                    "key": f"{number_of_symbols}x{number_of_years}y-{base_interval}"
+                    f"-seed{seed}",
+                    "symbols": number_of_symbols,
+                    "years": number_of_years,
+                    "base_interval": base_interval,
+                    "seed": seed,
+                }
+                with tempfile.TemporaryDirectory() as path:
+                    dataset["candles"] = generate_dataset(
+                        path, number_of_symbols, number_of_years, base_interval, seed
+                    )
+                    for pipeline in pipelines:
+                        # a fresh process, so the memory of earlier runs is not
+                        # counted
+                        with ProcessPoolExecutor(
+                            max_workers=1, mp_context=get_context("spawn")
+                        ) as executor:
+                            measured = executor.submit(
+                                measure, pipeline, path, base_interval, repeat
+                            ).result()
+                        results.append(
+                            {
+                                "dataset": dataset,
+                                "pipeline": pipeline,
+                                "breakouts": measured["breakouts"],
+                                "stages": {
+                                    stage: stage_report(
+                                        measured["seconds"][stage],
+                                        dataset["candles"],
+                                        measured["peak_memory"][stage],
+                                    )
+                                    for stage in STAGES
+                                },
+                                "total": stage_report(
+                                    sum(measured["seconds"].values()),
+                                    dataset["candles"],
+                                    max(measured["peak_memory"].values()),
+                                ),
+                            }
+                        )
+                        log_result(results[-1])
+    return results
+
+
+def compare(results: List, baseline: Dict, tolerance: float) -> List:
+    """Compares the duration of every stage with the same stage of the same dataset
+    and pipeline in the baseline report.
+
+    :param results: The results of the current run.
+    :param baseline: An earlier report.
+    :param tolerance: The fraction by which a stage can be slower than in the
+           baseline before it counts as a regression.
+    """
+    baseline_seconds = {
+        (result["dataset"]["key"], result["pipeline"], stage): values["seconds"]
+        for result in baseline["results"]
+        for stage, values in list(result["stages"].items())
+        + [("total", result["total"])]
+    }
+    comparison = []
+    for result in results:
+        for stage, values in list(result["stages"].items()) + [
+            ("total", result["total"])
+        ]:
+            key = (result["dataset"]["key"], result["pipeline"], stage)
+            if not baseline_seconds.get(key):
+                continue
+            ratio = values["seconds"] / baseline_seconds[key]
+            comparison.append(
+                {
+                    "dataset": key[0],
+                    "pipeline": key[1],
+                    "stage": key[2],
+                    "baseline_seconds": baseline_seconds[key],
+                    "seconds": values["seconds"],
+                    "ratio": round(ratio, 3),
+                    "regression": ratio > 1 + tolerance,
+                }
+            )
+    return comparison
+
+
+def log_result(result: Dict) -> None:
+    logger.info(
+        f"{result['dataset']['key']} {result['pipeline']}: "
+        f"{result['dataset']['candles']} candles, {result['breakouts']} breakouts"
+    )
+    for stage, values in list(result["stages"].items()) + [("total", result["total"])]:
+        logger.info(
+            f"  {stage:<10} {values['seconds']:>8.3f}s "
+            f"{values['candles_per_second'] or 0:>12} candles/s "
+            f"{values['peak_memory_mb']:>8.1f}MB"
+        )
+    return
+
+
+def environment() -> Dict:
+    return {
+        "created": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "polars": pl.__version__,
+    }
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--years", type=int, nargs="+", default=[1])
+    parser.add_argument("--base-intervals", nargs="+", default=["5m"])
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_pipelines.json")
+    parser.add_argument("--baseline", help="an earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Returns 1 if any stage regressed compared to the baseline, otherwise 0."""
+    args = parse_arguments()
+    report = {"environment": environment(), "repeat": args.repeat}
+    report["results"] = run_grid(
+        args.symbols,
+        args.years,
+        args.base_intervals,
+        args.pipelines,
+        args.repeat,
+        args.seed,
+    )
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        report["baseline"] = {
+            "path": args.baseline,
+            "created": baseline["environment"]["created"],
+            "tolerance": args.tolerance,
+        }
+        report["comparison"] = compare(report["results"], baseline, args.tolerance)
+        regressions = [entry for entry in report["comparison"] if entry["regression"]]
+        for entry in regressions:
+            logger.warning(
+                f"regression: {entry['dataset']} {entry['pipeline']} "
+                f"{entry['stage']} {entry['baseline_seconds']:.3f}s -> "
+                f"{entry['seconds']:.3f}s"
+            )
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    logger.info(f"report written to {args.output}")
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
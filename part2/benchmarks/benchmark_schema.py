@@ -0,0 +1,59 @@
+"""Compares the size on disk and in memory of the wide and the compact schema.
+
+Run from the root of the repository with:
+python -m part2.benchmarks.benchmark_schema
+"""
+import os
+import tempfile
+
+from part2.benchmarks.benchmark_kline_decoder import generate_klines
+from part2.src.utils.helpers import logger
+from part2.src.utils.kline_decoder import decode_klines
+from part2.src.utils.storage import ParquetStorage
+
+logger = logger("benchmark_schema")
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file))
+        for directory, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def measure(compact_schema: bool, number_of_symbols: int, klines: list) -> tuple:
+    """Stores the klines for every symbol and reads back the whole universe.
+
+    Returns the size on disk and the size in memory in bytes.
+    """
+    with tempfile.TemporaryDirectory() as base_path:
+        storage = ParquetStorage(base_path, compact_schema=compact_schema)
+        for i in range(number_of_symbols):
+            symbol = f"S{i:03d}"
+            df = decode_klines(klines, symbol, compact=compact_schema)
+            storage.append("USDT", symbol, "5m", df)
+
+        disk = directory_size(base_path)
+        memory = storage.scan_universe("USDT", "5m").collect().estimated_size()
+    return disk, memory
+
+
+def main(number_of_symbols: int = 20, number_of_klines: int = 100_000):
+    klines = generate_klines(number_of_klines)
+    wide_disk, wide_memory = measure(False, number_of_symbols, klines)
+    compact_disk, compact_memory = measure(True, number_of_symbols, klines)
+
+    logger.info(f"{number_of_symbols} symbols of {number_of_klines} candles")
+    logger.info(
+        f"disk:   wide {wide_disk / 1e6:.1f}MB, compact {compact_disk / 1e6:.1f}MB, "
+        f"{wide_disk / compact_disk:.1f}x"
+    )
+    logger.info(
+        f"memory: wide {wide_memory / 1e6:.1f}MB, "
+        f"compact {compact_memory / 1e6:.1f}MB, {wide_memory / compact_memory:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
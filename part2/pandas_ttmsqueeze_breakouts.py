@@ -1,26 +1,32 @@
-import os
 import time
 from typing import List
 
 from part2.src.pandas.indicators.ttm_squeeze import TTMSqueeze
 from part2.src.utils.dataloader import DataLoader
 from part2.src.utils.helpers import logger
+from part2.src.utils.storage import ParquetStorage
 
 logger = logger("pandas_ttm_squeeze_breakouts")
 
 
-def run_indicator_for_all_files(
-    path: str, intervals: List, squeeze_indicator: TTMSqueeze
+def run_indicator_for_all_symbols(
+    base_currency: str,
+    window_size: str,
+    intervals: List,
+    squeeze_indicator: TTMSqueeze,
 ):
-    dataloader = DataLoader()
-
-    for file in os.listdir(path):
-        if file.endswith(".csv"):
-            breakout = squeeze_indicator.run(
-                path=path, file=file, intervals=intervals, dataloader=dataloader
-            )
-            if breakout:
-                logger.info(breakout)
+    dataloader = DataLoader(storage=ParquetStorage("data/"))
+
+    for symbol in dataloader.storage.symbols(base_currency, window_size):
+        breakout = squeeze_indicator.run(
+            base_currency=base_currency,
+            symbol=symbol,
+            window_size=window_size,
+            intervals=intervals,
+            dataloader=dataloader,
+        )
+        if breakout:
+            logger.info(breakout)
 
     return
 
@@ -30,8 +36,9 @@ def main():
 
     ttm_squeeze = TTMSqueeze()
     start_time = time.time()
-    run_indicator_for_all_files(
-        path="data/USDT/",
+    run_indicator_for_all_symbols(
+        base_currency="USDT",
+        window_size="5m",
         intervals=["1h", "2h", "4h", "8h", "12h", "1d", "2d", "3d", "7d"],
         squeeze_indicator=ttm_squeeze,
     )
@@ -1,26 +1,33 @@
-import os
 import time
 from typing import List
 
 from part2.src.indicators.ttm_squeeze import TTMSqueeze
 from part2.src.utils.dataloader import DataLoader
 from part2.src.utils.helpers import logger
+from part2.src.utils.storage import ParquetStorage
 
 logger = logger("polars_ttm_squeeze_breakouts")
 
 
-def run_indicator_for_all_files(
-    path: str, intervals: List, squeeze_indicator: TTMSqueeze
+def run_indicator_for_all_symbols(
+    base_currency: str,
+    window_size: str,
+    intervals: List,
+    squeeze_indicator: TTMSqueeze,
 ):
-    dataloader = DataLoader()
-
-    for file in os.listdir(path):
-        if file.endswith(".csv"):
-            breakout = squeeze_indicator.run(
-                path=path, file=file, intervals=intervals, dataloader=dataloader
-            )
-            if breakout:
-                logger.info(breakout)
+    # the closed candles of every interval are kept, so every run only resamples
+    # the candles that were added since the previous run
+    dataloader = DataLoader(storage=ParquetStorage("data/"), cached_intervals=intervals)
+
+    # all symbols are evaluated together, one pass per interval
+    breakouts = squeeze_indicator.scan_universe_for_squeeze_breakouts(
+        base_currency=base_currency,
+        window_size=window_size,
+        intervals=intervals,
+        dataloader=dataloader,
+    )
+    for breakout in breakouts:
+        logger.info(breakout)
 
     return
 
@@ -30,8 +37,9 @@ def main_polars():
 
     ttm_squeeze = TTMSqueeze()
     start_time = time.time()
-    run_indicator_for_all_files(
-        path="data/USDT/",
+    run_indicator_for_all_symbols(
+        base_currency="USDT",
+        window_size="5m",
         intervals=["1h", "2h", "4h", "8h", "12h", "1d", "2d", "3d", "1w"],
         squeeze_indicator=ttm_squeeze,
     )
@@ -28,14 +28,18 @@ class AverageTrueRange(Indicator):
 
         :param df:  Dataframe which contains data to calculate the indicator
         """
-        df = df.select(
-            [
-                pl.col("sma"),
-                (pl.col("high") - pl.col("low")).abs().alias("true_range"),
-                (pl.col("high") - pl.col("low"))
-                .abs()
-                .rolling_mean(self.window)
-                .alias("average_true_range"),
-            ]
-        )
+        df = df.select([pl.col("sma")] + self.expressions())
         return df
+
+    def expressions(self, by: str = None) -> List[pl.Expr]:
+        """Returns the expressions of the true range and the average true range.
+
+        :param by: The column to calculate separately e.g. "symbol".
+        """
+        true_range = (pl.col("high") - pl.col("low")).abs()
+        return [
+            true_range.alias("true_range"),
+            self.over(true_range.rolling_mean(self.window), by).alias(
+                "average_true_range"
+            ),
+        ]
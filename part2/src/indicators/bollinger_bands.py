@@ -30,18 +30,20 @@ class BollingerBands(Indicator):
 
         :param df: Dataframe which contains data to calculate the indicator
         """
-        df = df.select(
-            [
-                pl.col("close").rolling_mean(self.window).alias("sma"),
-                pl.col("close").rolling_std(self.window).alias("std"),
-                (
-                    pl.col("close").rolling_mean(self.window)
-                    + (self.multiplier * pl.col("close").rolling_std(self.window))
-                ).alias("upper_band"),
-                (
-                    pl.col("close").rolling_mean(self.window)
-                    - (self.multiplier * pl.col("close").rolling_std(self.window))
-                ).alias("lower_band"),
-            ]
-        )
+        df = df.select(self.expressions())
         return df
+
+    def expressions(self, by: str = None) -> List[pl.Expr]:
+        """Returns the expressions of the sma, std and the upper and lower bounds, so
+        they can be evaluated on a dataframe or lazily on a scan.
+
+        :param by: The column to calculate separately e.g. "symbol".
+        """
+        sma = self.over(pl.col("close").rolling_mean(self.window), by)
+        std = self.over(pl.col("close").rolling_std(self.window), by)
+        return [
+            sma.alias("sma"),
+            std.alias("std"),
+            (sma + (self.multiplier * std)).alias("upper_band"),
+            (sma - (self.multiplier * std)).alias("lower_band"),
+        ]
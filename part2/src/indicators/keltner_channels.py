@@ -31,17 +31,21 @@ class KeltnerChannels(Indicator):
 
         :param df: Dataframe which contains data to calculate the indicator.
         """
-        average_true_range = AverageTrueRange()
-        df = average_true_range.run(df)
-
-        df = df.select(
-            [
-                (
-                    pl.col("sma") + (pl.col("average_true_range") * self.multiplier)
-                ).alias("upper_keltner"),
-                (
-                    pl.col("sma") - (pl.col("average_true_range") * self.multiplier)
-                ).alias("lower_keltner"),
-            ]
-        )
+        df = df.select(self.expressions())
         return df
+
+    def expressions(self, by: str = None) -> List[pl.Expr]:
+        """Returns the expressions of the upper and lower channel, around the "sma"
+        column of the bollinger bands.
+
+        :param by: The column to calculate separately e.g. "symbol".
+        """
+        _, average_true_range = AverageTrueRange().expressions(by)
+        return [
+            (pl.col("sma") + (average_true_range * self.multiplier)).alias(
+                "upper_keltner"
+            ),
+            (pl.col("sma") - (average_true_range * self.multiplier)).alias(
+                "lower_keltner"
+            ),
+        ]
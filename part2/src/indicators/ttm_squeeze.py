@@ -1,11 +1,17 @@
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Union
 
 import polars as pl
 from polars import col
 
+from part2.src.indicators.average_true_range import AverageTrueRange
 from part2.src.indicators.bollinger_bands import BollingerBands
 from part2.src.indicators.keltner_channels import KeltnerChannels
 from part2.src.utils.indicator import Indicator
+from part2.src.utils.resample import interval_to_timedelta
+
+# the only columns the squeeze needs, the others are not read
+SCAN_COLUMNS = ["timestamp", "open", "high", "low", "close", "symbol"]
 
 
 class TTMSqueeze(Indicator):
@@ -36,58 +42,231 @@ class TTMSqueeze(Indicator):
     def get_window(self):
         return self.window
 
-    def run(self, path: str, file: str, intervals: List, dataloader) -> List:
+    def run(
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
+    ) -> List:
         """Performs calculation to determine if a squeeze is present.
 
         Returns a list that contains all the symbols that are breaking out of a squeeze.
 
-        :param path: Directory that contains the relevant file.
-        :param file: Name of the relevant file.
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
         :param intervals: Interval timeframe that should be checked.
         :param dataloader: Instance of module that contains function wrt data.
         """
         breakouts = self._scan_for_squeeze_breakouts_polars(
-            path=path, file=file, intervals=intervals, dataloader=dataloader
+            base_currency=base_currency,
+            symbol=symbol,
+            window_size=window_size,
+            intervals=intervals,
+            dataloader=dataloader,
         )
         return breakouts
 
     def _scan_for_squeeze_breakouts_polars(
-        self, path: str, file: str, intervals: List, dataloader
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
     ) -> List:
+        newest_timestamp = dataloader.newest_timestamp(
+            base_currency, window_size, symbols=[symbol]
+        )
+        if newest_timestamp is None:
+            return []
+
+        frames = self._scan_intervals(
+            base_currency,
+            window_size,
+            intervals,
+            dataloader,
+            [symbol],
+            newest_timestamp,
+        )
+        frames = dict(zip(intervals, pl.collect_all(list(frames.values()))))
+
         breakouts = []
-        for i, interval in enumerate(intervals):
-            if i == 0:
-                # first iteration read the file and change it to a set interval
-                df = dataloader.read_file_to_interval_polars(path, file, interval)
-
-                # if the file doesn't have row go to the next one
-                if len(df) == 0:
-                    break
-            else:
-                # second iteration no need to read file again but change the df interval
-                df = dataloader.to_interval_polars(df, interval)
-
-            df = self._gather_squeeze_indicators_polars(df)
+        for interval in intervals:
+            df = self._gather_squeeze_indicators_polars(frames[interval])
             is_breaking_out_of_squeeze = self.is_breaking_out_polars(df)
 
             if is_breaking_out_of_squeeze:
-                symbol = file.split("-")[0]
                 breakouts.append(f"{symbol} is breaking out at {interval} interval.")
         return breakouts
 
-    def _gather_squeeze_indicators_polars(self, df: pl.DataFrame) -> pl.DataFrame:
+    def scan_universe_for_squeeze_breakouts(
+        self,
+        base_currency: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
+        symbols: List = None,
+    ) -> List:
+        """Determines which symbols are breaking out of a squeeze, for all symbols at
+        once.
+
+        Gives the same breakouts as running the indicator per symbol, but the data of
+        all symbols is read, resampled and evaluated in a single lazy query. Only the
+        columns the squeeze needs are read, and every interval is resampled from the
+        cached result of a smaller interval, see DataLoader.to_pyramid_polars. When
+        the dataloader caches the intervals, the cache is updated first and only the
+        candles that are not cached yet are resampled, see DataLoader.scan_intervals.
+
+        Only the tail of the history that the last candles depend on is read, see
+        lookback_start, counted back from the newest candle of all the symbols.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param intervals: Interval timeframe that should be checked.
+        :param dataloader: Instance of module that contains function wrt data.
+        :param symbols: The symbols to check, by default all stored symbols.
+        """
+        newest_timestamp = dataloader.newest_timestamp(
+            base_currency, window_size, symbols=symbols
+        )
+        if newest_timestamp is None:
+            return []
+
+        frames = self._scan_intervals(
+            base_currency, window_size, intervals, dataloader, symbols, newest_timestamp
+        )
+
+        breakouts = []
+        for i, interval in enumerate(intervals):
+            breakouts.append(
+                self.breakouts_polars(frames[interval]).with_column(
+                    pl.lit(i).cast(pl.Int32).alias("interval")
+                )
+            )
+        breakouts = pl.concat(breakouts).collect().sort(["symbol", "interval"])
+        return [
+            f"{symbol} is breaking out at {intervals[i]} interval."
+            for symbol, i in breakouts.select(["symbol", "interval"]).rows()
+        ]
+
+    def _scan_intervals(
+        self,
+        base_currency: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
+        symbols: List,
+        newest_timestamp: datetime,
+    ) -> Dict[str, pl.LazyFrame]:
+        """Scans the tail of the candles of every interval that the breakouts depend
+        on, from the cache of the dataloader when it keeps the intervals, otherwise
+        resampled from the stored interval."""
+        if dataloader.is_cached(intervals):
+            dataloader.update_cache(base_currency, window_size, symbols=symbols)
+            return dataloader.scan_intervals(
+                base_currency,
+                window_size,
+                intervals,
+                symbols=symbols,
+                starts=[
+                    self.lookback_start(newest_timestamp, [interval])
+                    for interval in intervals
+                ],
+            )
+
+        df = dataloader.scan_universe(
+            base_currency,
+            window_size,
+            columns=SCAN_COLUMNS,
+            symbols=symbols,
+            start=self.lookback_start(newest_timestamp, intervals),
+        )
+        return dataloader.to_pyramid_polars(df, intervals)
+
+    def lookback_start(self, newest_timestamp: datetime, intervals: List) -> datetime:
+        """Returns the oldest candle that the last two candles of every interval
+        depend on, so the cost of a scan does not grow with the length of the history.
+
+        The rolling windows need window + 1 candles of the largest interval. Two more
+        are read, because the first candle of every interval in the pyramid can be
+        incomplete. The candles are aligned independently of the first timestamp that
+        is read, so the last candles are the same as when the whole history is read.
+
+        :param newest_timestamp: The timestamp of the newest stored candle.
+        :param intervals: Interval timeframe that should be checked.
+        """
+        window = max(
+            BollingerBands(multiplier=self.bb_multiplier).window,
+            AverageTrueRange().window,
+        )
+        largest_interval = max(
+            interval_to_timedelta(interval) for interval in intervals
+        )
+        return newest_timestamp - (window + 3) * largest_interval
+
+    def breaking_out_symbols_polars(self, df: pl.DataFrame) -> List:
+        """Returns the symbols of a dataframe of many symbols that are breaking out of
+        the squeeze at their last timestamp, see is_breaking_out_polars.
+
+        :param df: Dataframe with the candles of many symbols, sorted by symbol and
+               time.
+        """
+        return sorted(self.breakouts_polars(df)["symbol"])
+
+    def breakouts_polars(
+        self, df: Union[pl.DataFrame, pl.LazyFrame]
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Selects the symbols that are breaking out of the squeeze, lazily when given
+        a scan.
+
+        :param df: Dataframe with the candles of many symbols, sorted by symbol and
+               time.
+        """
+        return self.detect_breakouts_polars(
+            self._gather_squeeze_indicators_polars(df, by="symbol")
+        )
+
+    def detect_breakouts_polars(
+        self, df: Union[pl.DataFrame, pl.LazyFrame]
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Selects the symbols that are breaking out of the squeeze from the gathered
+        indicators, see breakouts_polars.
+
+        :param df: Dataframe with the squeeze indicators of many symbols, sorted by
+               symbol and time.
+        """
+        df = df.groupby("symbol").agg(
+            [
+                col("timestamp").count().alias("count"),
+                col("squeeze_off").last(),
+                col("squeeze_on").tail(2).first().alias("previous_squeeze_on"),
+            ]
+        )
+        return df.filter(
+            (col("count") >= 2)
+            & col("squeeze_off").fill_null(False)
+            & col("previous_squeeze_on").fill_null(False)
+        ).select("symbol")
+
+    def _gather_squeeze_indicators_polars(
+        self, df: Union[pl.DataFrame, pl.LazyFrame], by: str = None
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
         """Gathers the data for the different indicators that are needed for
         calculating if a squeeze is present or not.
 
         :param df: Dataframe which contains data to calculate the indicator
+        :param by: The column to calculate separately e.g. "symbol".
         """
 
         bollinger_bands = BollingerBands(multiplier=self.bb_multiplier)
         keltner_channels = KeltnerChannels(multiplier=self.kc_multiplier)
 
-        df = df.hstack(bollinger_bands.run(df))
-        df = df.hstack(keltner_channels.run(df))
-        df = df.hstack(self.calculate_squeeze_polars(df))
+        df = df.with_columns(bollinger_bands.expressions(by))
+        df = df.with_columns(keltner_channels.expressions(by))
+        df = df.with_columns(self.squeeze_expressions())
         return df
 
     def calculate_squeeze_polars(self, df: pl.DataFrame) -> pl.DataFrame:
@@ -95,20 +274,23 @@ class TTMSqueeze(Indicator):
 
         :param df: Dataframe which contains data to calculate the indicator
         """
-        df = df.select(
-            [
-                (
-                    (col("lower_band") > col("lower_keltner"))
-                    & (col("upper_band") < col("upper_keltner"))
-                ).alias("squeeze_on"),
-                (
-                    (col("lower_band") < col("lower_keltner"))
-                    & (col("upper_band") > col("upper_keltner"))
-                ).alias("squeeze_off"),
-            ]
-        )
+        df = df.select(self.squeeze_expressions())
         return df
 
+    def squeeze_expressions(self) -> List[pl.Expr]:
+        """Returns the expressions that determine if a squeeze is on or off, from the
+        bollinger bands and keltner channels."""
+        return [
+            (
+                (col("lower_band") > col("lower_keltner"))
+                & (col("upper_band") < col("upper_keltner"))
+            ).alias("squeeze_on"),
+            (
+                (col("lower_band") < col("lower_keltner"))
+                & (col("upper_band") > col("upper_keltner"))
+            ).alias("squeeze_off"),
+        ]
+
     def is_breaking_out_polars(self, df: pl.DataFrame) -> bool:
         """Checks if the symbol is breaking out of the squeeze at the current
         timestamp.
@@ -35,43 +35,62 @@ class TTMSqueeze(Indicator):
     def get_window(self):
         return self.window
 
-    def run(self, path: str, file: str, intervals: List, dataloader) -> List:
+    def run(
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
+    ) -> List:
         """Performs calculation to determine if a squeeze is present.
 
         Returns a list that contains all the symbols that are breaking out of a squeeze.
 
-        :param path: Directory that contains the relevant file.
-        :param file: Name of the relevant file.
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
         :param intervals: Interval timeframe that should be checked.
         :param dataloader: Instance of module that contains function wrt data.
         """
         breakouts = self._scan_for_squeeze_breakouts_pandas(
-            path=path, file=file, intervals=intervals, dataloader=dataloader
+            base_currency=base_currency,
+            symbol=symbol,
+            window_size=window_size,
+            intervals=intervals,
+            dataloader=dataloader,
         )
         return breakouts
 
     def _scan_for_squeeze_breakouts_pandas(
-        self, path: str, file: str, intervals: List, dataloader
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        intervals: List,
+        dataloader,
     ) -> List:
         breakouts = []
         for i, interval in enumerate(intervals):
             if i == 0:
-                # first iteration read the file and change it to a set interval
-                df = dataloader.read_file_to_interval_pandas(path, file, interval)
+                # first iteration read the symbol and change it to a set interval
+                df = dataloader.read_symbol_to_interval_pandas(
+                    base_currency, symbol, window_size, interval
+                )
 
-                # if the file doesn't have row go to the next one
+                # if the symbol doesn't have rows go to the next one
                 if len(df) == 0:
                     break
 
             else:
-                # second iteration no need to read file again but change the df interval
+                # second iteration no need to read the data again but change the df
+                # interval
                 df = dataloader.to_interval_pandas(df, interval)
 
             df = self._gather_squeeze_indicators_pandas(df)
             is_breaking_out_of_squeeze = self.is_breaking_out_pandas(df)
 
             if is_breaking_out_of_squeeze:
-                symbol = file.split("-")[0]
                 breakouts.append(f"{symbol} is breaking out at {interval} interval.")
         return breakouts
 
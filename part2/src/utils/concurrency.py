@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+
+class AdaptiveConcurrency:
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_tolerance: float = 3.0,
+        weight_threshold: float = 0.9,
+        decrease_factor: float = 0.5,
+        lag_interval: float = 0.01,
+    ):
+        """Limits the number of requests in flight with additive increase,
+        multiplicative decrease (AIMD).
+
+        The limit starts with a slow start: it grows by one for every healthy
+        response, so it doubles every round trip, until it is decreased for the first
+        time. After that it grows by about one for every limit responses. It is
+        halved when the exchange throttles (429), bans (418) or when the latency
+        rises well above the lowest recent latency. On a 429 or 418 no new request
+        is started until its Retry-After has passed.
+
+        A rise of the latency that is less than latency_tolerance times the lag of
+        the event loop is ignored: it is about the time the responses waited for our
+        own work, e.g. decoding other responses, and not a slower exchange.
+
+        :param initial: The limit at the start.
+        :param minimum: The lowest limit.
+        :param maximum: The highest limit.
+        :param latency_tolerance: The factor by which the average latency can exceed
+               the lowest recent latency before the limit is decreased.
+        :param weight_threshold: The fraction of the weight limit of the exchange
+               above which the limit is not increased anymore.
+        :param decrease_factor: The factor by which the limit is decreased.
+        :param lag_interval: The number of seconds between two measurements of the
+               lag of the event loop.
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.weight_threshold = weight_threshold
+        self.decrease_factor = decrease_factor
+        self.lag_interval = lag_interval
+
+        self.in_flight = 0
+        self.slow_start = True
+        self.latency = None
+        self.increases = 0
+        self.decreases = 0
+        self.throttled = 0
+        # the time, the reason and the new limit of every change of the limit
+        self.decisions = deque(maxlen=1000)
+        self._latencies = deque(maxlen=100)
+        self._lags = deque(maxlen=100)
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._start_time = time.monotonic()
+        self._condition = asyncio.Condition()
+        self._lag_monitor = None
+        self._lag_due = None
+
+    @property
+    def baseline_latency(self) -> float:
+        return min(self._latencies) if len(self._latencies) > 0 else None
+
+    @property
+    def loop_lag(self) -> float:
+        # including the lag of a wake up that is still waiting for the loop
+        lag = time.monotonic() - self._lag_due if self._lag_due is not None else 0.0
+        return max([lag, *self._lags])
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "baseline_latency": self.baseline_latency,
+            "loop_lag": self.loop_lag,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "throttled": self.throttled,
+        }
+
+    def __str__(self) -> str:
+        latency = "unknown" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return (
+            f"concurrency {int(self.limit)}, {self.in_flight} in flight, "
+            f"latency {latency}, {self.throttled} throttled"
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits until a request can be started and keeps its place while it runs."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def acquire(self) -> None:
+        if self._lag_monitor is None or self._lag_monitor.done():
+            self._lag_monitor = asyncio.create_task(self._monitor_loop_lag())
+        while True:
+            async with self._condition:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                if pause <= 0:
+                    await self._condition.wait()
+                    continue
+            await asyncio.sleep(pause)
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+        return
+
+    def close(self) -> None:
+        """Stops measuring the lag of the event loop, e.g. once a run is done. The
+        next request starts measuring again."""
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+            self._lag_monitor = None
+        self._lag_due = None
+        return
+
+    def on_response(self, latency: float, used_weight_fraction: float) -> None:
+        """Adapts the limit to a successful response.
+
+        :param latency: The number of seconds the request took.
+        :param used_weight_fraction: The fraction of the weight limit of the exchange
+               that is used in the current window.
+        """
+        self._latencies.append(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+        # a rise that the lag of our own event loop explains is not a slower exchange
+        rise = self.latency - self.baseline_latency
+        if (
+            rise > (self.latency_tolerance - 1) * self.baseline_latency
+            and rise > self.latency_tolerance * self.loop_lag
+        ):
+            self._decrease("latency")
+        elif used_weight_fraction < self.weight_threshold:
+            increase = 1 if self.slow_start else 1 / self.limit
+            limit = min(self.maximum, self.limit + increase)
+            if int(limit) > int(self.limit):
+                self.increases += 1
+                self._record("increase", limit)
+            self.limit = limit
+        return
+
+    def on_throttled(self, status: int, retry_after: float) -> None:
+        """Adapts the limit to a response that is throttled by the exchange.
+
+        :param status: The status of the response, 429 or 418.
+        :param retry_after: The number of seconds after which requests are allowed
+               again.
+        """
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        if status == 418:
+            # banned, start over from the bottom
+            self.slow_start = False
+            self.limit = float(self.minimum)
+            self.decreases += 1
+            self._record("banned", self.limit)
+        else:
+            self._decrease("throttled")
+        return
+
+    def _decrease(self, reason: str) -> None:
+        """Decreases the limit, at most once per round trip so a single burst of bad
+        responses only counts once."""
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 0):
+            return
+        self._last_decrease = now
+        self.slow_start = False
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self.decreases += 1
+        self._record(reason, self.limit)
+        return
+
+    async def _monitor_loop_lag(self) -> None:
+        """Measures how much later than scheduled the event loop wakes up a sleep,
+        which is about how long a response waits before it is handled."""
+        while True:
+            self._lag_due = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self._lags.append(max(0.0, time.monotonic() - self._lag_due))
+
+    def _record(self, reason: str, limit: float) -> None:
+        self.decisions.append((time.monotonic() - self._start_time, reason, int(limit)))
+        return
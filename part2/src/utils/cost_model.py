@@ -0,0 +1,92 @@
+import math
+from datetime import datetime
+
+from binance.helpers import interval_to_milliseconds
+
+# weights of the requests as documented by the exchange
+KLINES_WEIGHT = 2
+ALL_TICKERS_WEIGHT = 4
+EXCHANGE_INFO_WEIGHT = 20
+DEFAULT_WEIGHT = 1
+
+
+class CostModel:
+    def __init__(self, window_size: str, page_limit: int = 1000):
+        """Predicts the api weight of the requests that retrieve the orderbook data.
+
+        :param window_size: The interval of the candles e.g. 5m.
+        :param page_limit: The maximum number of candles the exchange returns per
+               request.
+        """
+        self.window_size = window_size
+        self.page_limit = page_limit
+        self.window_size_ms = interval_to_milliseconds(window_size)
+
+    @staticmethod
+    def request_weight(uri: str, kwargs: dict) -> int:
+        """Gives the weight the exchange assigns to a request.
+
+        :param uri: The uri of the request.
+        :param kwargs: The keyword arguments of the request.
+        """
+        endpoint = uri.rsplit("/", 1)[-1]
+        params = kwargs.get("data") or kwargs.get("params") or {}
+        if endpoint == "klines":
+            return KLINES_WEIGHT
+        elif endpoint == "price" and "symbol" not in params:
+            return ALL_TICKERS_WEIGHT
+        elif endpoint == "exchangeInfo":
+            return EXCHANGE_INFO_WEIGHT
+        return DEFAULT_WEIGHT
+
+    def number_of_candles(
+        self, oldest_data_point: datetime, newest_data_point: datetime
+    ) -> int:
+        """Calculates how many candles lie between two points in time, both included.
+
+        :param oldest_data_point: The oldest data point that is retrieved.
+        :param newest_data_point: The newest data point that is retrieved.
+        """
+        delta = (newest_data_point - oldest_data_point).total_seconds() * 1000
+        return max(0, math.floor(delta / self.window_size_ms) + 1)
+
+    def number_of_pages(
+        self, oldest_data_point: datetime, newest_data_point: datetime
+    ) -> int:
+        """Calculates how many requests are needed to page through a range of candles.
+
+        Even an empty range takes one request to find out there is nothing new.
+
+        :param oldest_data_point: The oldest data point that is retrieved.
+        :param newest_data_point: The newest data point that is retrieved.
+        """
+        number_of_candles = self.number_of_candles(oldest_data_point, newest_data_point)
+        return max(1, math.ceil(number_of_candles / self.page_limit))
+
+    def klines_range_weight(
+        self, oldest_data_point: datetime, newest_data_point: datetime
+    ) -> int:
+        """Predicts the weight of retrieving a range of candles of which the start is
+        known, e.g. a gap between stored candles, so only its pages are requested.
+
+        :param oldest_data_point: The oldest data point that is retrieved.
+        :param newest_data_point: The newest data point that is retrieved.
+        """
+        number_of_pages = self.number_of_pages(oldest_data_point, newest_data_point)
+        return number_of_pages * KLINES_WEIGHT
+
+    def historical_klines_weight(
+        self, oldest_data_point: datetime, newest_data_point: datetime
+    ) -> int:
+        """Predicts the weight of retrieving a range of candles with
+        get_historical_klines.
+
+        Next to the pages of candles, the earliest available candle of the symbol is
+        requested once.
+
+        :param oldest_data_point: The oldest data point that is retrieved.
+        :param newest_data_point: The newest data point that is retrieved.
+        """
+        return KLINES_WEIGHT + self.klines_range_weight(
+            oldest_data_point, newest_data_point
+        )
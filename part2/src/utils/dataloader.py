@@ -1,24 +1,484 @@
+import glob
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
 import pandas as pd
 import polars as pl
 
+from part2.src.utils.resample import IntervalDeriver, build_pyramid, resample_ohlcv
+from part2.src.utils.storage import ParquetStorage, Storage
+
+# the columns of the resampled candles, see to_interval_polars
+INTERVAL_COLUMNS = ["symbol", "timestamp", "open", "high", "low", "close"]
+
 
 class DataLoader:
-    def __init__(self):
+    def __init__(
+        self,
+        storage: Storage = None,
+        cached_intervals: List = None,
+        ipc_path: str = None,
+    ):
+        """Loads the stored orderbook data and brings it into the requested interval.
+
+        :param storage: The backend in which the data is stored, by default parquet
+               files under "data/".
+        :param cached_intervals: The intervals of which the closed candles are kept
+               in the storage, so they are not resampled again on every read, see
+               scan_interval.
+        :param ipc_path: Directory in which uncompressed Arrow IPC copies of the
+               candles of every symbol are kept and read memory mapped, see
+               ipc_files. By default the storage is read.
+        """
         __name__ = "DataLoader"
+        self.storage = storage if storage is not None else ParquetStorage("data/")
+        self.cached_intervals = cached_intervals
+        self.ipc_path = ipc_path
+        self._caches = {}
+
+    def is_cached(self, intervals: List) -> bool:
+        """Returns whether the closed candles of all the intervals are cached.
+
+        :param intervals: The intervals to check e.g. ["1h", "4h"].
+        """
+        return self.cached_intervals is not None and set(intervals) <= set(
+            self.cached_intervals
+        )
+
+    def cache(self, window_size: str) -> IntervalDeriver:
+        """Returns the cache of the resampled candles of the stored interval.
+
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        """
+        if window_size not in self._caches:
+            self._caches[window_size] = IntervalDeriver(
+                self.storage, window_size, self.cached_intervals
+            )
+        return self._caches[window_size]
+
+    def update_cache(
+        self, base_currency: str, window_size: str, symbols: List = None
+    ) -> None:
+        """Adds the candles that closed since the previous update to the cache, see
+        IntervalDeriver.update.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param symbols: The symbols to update, by default all stored symbols.
+        """
+        self.cache(window_size).update(base_currency, symbols=symbols)
+        return
+
+    def newest_timestamp(
+        self, base_currency: str, window_size: str, symbols: List = None
+    ) -> Optional[datetime]:
+        """Returns the timestamp of the newest stored candle of the symbols, without
+        reading any data.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param symbols: The symbols to check, by default all stored symbols.
+        """
+        if symbols is None:
+            symbols = self.storage.symbols(base_currency, window_size)
+        timestamps = [
+            timestamp
+            for timestamp in [
+                self.storage.last_timestamp(base_currency, symbol, window_size)
+                for symbol in symbols
+            ]
+            if timestamp is not None
+        ]
+        return max(timestamps) if len(timestamps) > 0 else None
+
+    def scan_symbol(
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        columns: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans the stored candles of a symbol without reading them, see
+        scan_universe.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param columns: The columns to read, by default all.
+        :param start: The oldest candle to read, by default the first one.
+        :param end: The newest candle to read, by default the last one.
+        """
+        return self.scan_universe(
+            base_currency,
+            window_size,
+            columns=columns,
+            symbols=[symbol],
+            start=start,
+            end=end,
+        )
+
+    def scan_universe(
+        self,
+        base_currency: str,
+        window_size: str,
+        columns: List = None,
+        symbols: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans the stored candles of many symbols without reading them, sorted by
+        symbol and time.
+
+        Only the requested columns and the candles within the time range are read
+        once the scan is collected, so resampling and indicators can be added to the
+        scan and evaluated in a single collect. Given an ipc_path, the IPC copies of
+        the symbols are scanned instead of the storage, see ipc_files.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param columns: The columns to read, by default all.
+        :param symbols: The symbols to read, by default all stored symbols.
+        :param start: The oldest candle to read, by default the first one.
+        :param end: The newest candle to read, by default the last one.
+        """
+        if self.ipc_path is not None:
+            df = self._scan_ipc_files(base_currency, window_size, symbols, start, end)
+        else:
+            df = self.storage.scan_universe(
+                base_currency, window_size, symbols=symbols, start=start, end=end
+            )
+        if columns is not None and len(df.columns) > 0:
+            df = df.select(columns)
+        return df
+
+    def ipc_files(
+        self,
+        base_currency: str,
+        symbol: str,
+        window_size: str,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> List[str]:
+        """Returns the Arrow IPC copies of the stored candles of a symbol, one per
+        partition of the storage, e.g. per month, sorted by time.
+
+        The copies are uncompressed, so they are memory mapped instead of read:
+        processes that read the same symbols share the pages of the files and
+        opening them takes no decoding. Only the copies of the partitions that
+        changed since they were written are written again, so an update usually
+        only rewrites the copy of the current month. Copies of partitions that are
+        not stored anymore are removed.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param start: The oldest candle that is needed, the copies of the months
+               before it are not checked.
+        :param end: The newest candle that is needed, the copies of the months
+               after it are not checked.
+        """
+        versions = self.storage.partition_versions(base_currency, symbol, window_size)
+        path = os.path.join(self.ipc_path, base_currency, f"{symbol}-{window_size}")
+        for file in glob.glob(os.path.join(path, "*.arrow")):
+            if os.path.basename(file)[: -len(".arrow")] not in versions:
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    # removed by another process
+                    pass
+
+        files = []
+        for partition, version in sorted(versions.items()):
+            # the partitions are months, except for a single one of all candles
+            if partition != "all" and (
+                (start is not None and partition < start.strftime("%Y-%m"))
+                or (end is not None and partition > end.strftime("%Y-%m"))
+            ):
+                continue
+
+            file = os.path.join(path, f"{partition}.arrow")
+            files.append(file)
+            # a copy gets the modification time of the partition it holds
+            if os.path.isfile(file) and os.stat(file).st_mtime_ns == version:
+                continue
+
+            os.makedirs(path, exist_ok=True)
+            df = self.storage.scan_partition(
+                base_currency, symbol, window_size, partition
+            ).collect()
+            # the categories of separate files do not match, they are made
+            # categorical again once the copies are combined, see _scan_ipc_files
+            if "symbol" in df.columns:
+                df = df.with_column(pl.col("symbol").cast(pl.Utf8))
+            # other processes can write the same copy at the same time
+            temporary_file = f"{file}.{os.getpid()}.tmp"
+            df.write_ipc(temporary_file, compression="uncompressed")
+            os.utime(temporary_file, ns=(version, version))
+            os.replace(temporary_file, file)
+        return files
+
+    def _scan_ipc_files(
+        self,
+        base_currency: str,
+        window_size: str,
+        symbols: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        if symbols is None:
+            symbols = self.storage.symbols(base_currency, window_size)
+        scans = [
+            pl.scan_ipc(file, memory_map=True)
+            for symbol in sorted(symbols)
+            for file in self.ipc_files(base_currency, symbol, window_size, start, end)
+        ]
+        if len(scans) == 0:
+            return pl.DataFrame().lazy()
+
+        df = pl.concat(scans)
+        if self.storage.compact_schema:
+            df = df.with_column(pl.col("symbol").cast(pl.Categorical))
+        if start is not None:
+            df = df.filter(pl.col("timestamp") >= start)
+        if end is not None:
+            df = df.filter(pl.col("timestamp") <= end)
+        return df
+
+    def scan_file(
+        self,
+        path: str,
+        file: str,
+        columns: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans a csv file without reading it, see scan_universe.
+
+        :param path: Directory that contains the data.
+        :param file: Name of the file.
+        :param columns: The columns to read, by default all.
+        :param start: The oldest candle to read, by default the first one.
+        :param end: The newest candle to read, by default the last one.
+        """
+        df = pl.scan_csv(path + "/" + file, parse_dates=True)
+        if columns is not None:
+            df = df.select(columns)
+        if start is not None:
+            df = df.filter(pl.col("timestamp") >= start)
+        if end is not None:
+            df = df.filter(pl.col("timestamp") <= end)
+        return df
+
+    def scan_interval(
+        self,
+        base_currency: str,
+        window_size: str,
+        interval: str,
+        symbols: List = None,
+        start: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans the candles of many symbols in a cached interval, see
+        scan_intervals.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param interval: Interval the dataframe should have, one of the cached
+               intervals.
+        :param symbols: The symbols to read, by default all stored symbols.
+        :param start: The oldest candle to read, by default the first one.
+        """
+        return self.scan_intervals(
+            base_currency, window_size, [interval], symbols=symbols, starts=[start]
+        )[interval]
+
+    def scan_intervals(
+        self,
+        base_currency: str,
+        window_size: str,
+        intervals: List,
+        symbols: List = None,
+        starts: List = None,
+    ) -> Dict[str, pl.LazyFrame]:
+        """Scans the candles of many symbols in several cached intervals, sorted by
+        symbol and time, with the same columns as to_interval_polars.
+
+        The closed candles are read from the cache. Only the candles that are not
+        cached yet, usually just the last open candle of every interval, are
+        resampled from the stored interval, which is read once for all intervals.
+        Cached candles that were resampled before stored candles were added in
+        between, e.g. by a repair, are removed and resampled again.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param intervals: Intervals the dataframes should have, all cached.
+        :param symbols: The symbols to read, by default all stored symbols.
+        :param starts: The oldest candle to read per interval, by default the first
+               one.
+        """
+        if symbols is None:
+            symbols = self.storage.symbols(base_currency, window_size)
+        if starts is None:
+            starts = [None] * len(intervals)
+        cache = self.cache(window_size)
+        cache.invalidate(base_currency, symbols, intervals)
+        next_candles = {
+            interval: cache.next_candles(base_currency, interval, symbols)
+            for interval in intervals
+        }
+        if len(symbols) == 0:
+            return {interval: pl.DataFrame().lazy() for interval in intervals}
+
+        # every symbol is read from its own oldest candle that is not cached yet
+        tail_starts = cache.watermarks(next_candles)
+        if None not in starts:
+            tail_starts = {
+                symbol: max(start, min(starts)) for symbol, start in tail_starts.items()
+            }
+        tail = cache.scan_from(
+            lambda symbols, start: self.scan_universe(
+                base_currency,
+                window_size,
+                columns=["timestamp", "symbol", "open", "high", "low", "close"],
+                symbols=symbols,
+                start=start,
+            ),
+            tail_starts,
+        )
+        # the candles that are not cached yet are few, they are read once for all
+        # intervals instead of once per interval
+        tail = tail.collect().lazy()
+
+        frames = {}
+        for interval, start in zip(intervals, starts):
+            scans = [
+                self.scan_universe(
+                    base_currency, interval, symbols=symbols, start=start
+                ),
+                tail,
+            ]
+            if len(tail.columns) > 0:
+                if start is not None:
+                    scans[1] = tail.filter(pl.col("timestamp") >= start)
+                scans[1] = self.to_interval_polars(
+                    cache.unstored(scans[1], next_candles[interval]), interval
+                )
+            scans = [
+                df.select(
+                    [
+                        pl.col("symbol").cast(pl.Utf8),
+                        pl.col("timestamp").cast(pl.Datetime("ms")),
+                    ]
+                    + INTERVAL_COLUMNS[2:]
+                )
+                for df in scans
+                if len(df.columns) > 0
+            ]
+            frames[interval] = (
+                pl.concat(scans).sort(["symbol", "timestamp"])
+                if len(scans) > 0
+                else pl.DataFrame().lazy()
+            )
+        return frames
+
+    def read_symbol_to_interval_polars(
+        self, base_currency: str, symbol: str, window_size: str, interval: str
+    ) -> pl.DataFrame:
+        """Creates a Polars dataframe of a stored symbol in a specific time interval.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param interval: Interval the dataframe should have.
+        """
+        df = self.scan_symbol(base_currency, symbol, window_size)
+        if len(df.columns) == 0:
+            return pl.DataFrame()
+        return self.to_interval_polars(df, interval).collect()
+
+    def read_universe_to_interval_polars(
+        self,
+        base_currency: str,
+        window_size: str,
+        interval: str,
+        symbols: List = None,
+        start: datetime = None,
+    ) -> pl.DataFrame:
+        """Creates a single Polars dataframe of many stored symbols in a specific time
+        interval, sorted by symbol and time.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param interval: Interval the dataframe should have.
+        :param symbols: The symbols to read, by default all stored symbols.
+        :param start: The oldest candle to read, by default the first one.
+        """
+        df = self.scan_universe(
+            base_currency, window_size, symbols=symbols, start=start
+        )
+        if len(df.columns) == 0:
+            return pl.DataFrame()
+        return self.to_interval_polars(df, interval).collect()
 
     def read_file_to_interval_polars(
-        self, path: str, file: str, interval: str
+        self, path: str, file: str, interval: str, columns: List = None
     ) -> pl.DataFrame:
         """Creates a Polars dataframe in a specific time interval.
 
         :param path: Directory that contains the data.
         :param file: Name of the file.
         :param interval: Interval the dataframe should have.
+        :param columns: The columns to read, by default all.
         """
-        df = pl.read_csv(path + "/" + file, parse_dates=True)
+        return self.to_interval_polars(
+            self.scan_file(path, file, columns=columns), interval
+        ).collect()
 
+    def read_symbol_pandas(
+        self, base_currency: str, symbol: str, window_size: str
+    ) -> pd.DataFrame:
+        """Reads the stored candles of a symbol into a pandas dataframe indexed by
+        time, or an empty dataframe if there are none.
+
+        Only the columns that are resampled are read. They are converted one by one
+        through numpy, so no pyarrow is needed.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        """
+        df = self.scan_symbol(
+            base_currency,
+            symbol,
+            window_size,
+            columns=["timestamp", "open", "high", "low", "close"],
+        )
+        if len(df.columns) == 0:
+            return pd.DataFrame()
+
+        df = df.collect()
+        df_pandas = pd.DataFrame(
+            {column: df[column].to_numpy() for column in df.columns}
+        )
+        df_pandas["symbol"] = symbol
+        df_pandas.index = pd.DatetimeIndex(df_pandas["timestamp"])
+        return df_pandas
+
+    def read_symbol_to_interval_pandas(
+        self, base_currency: str, symbol: str, window_size: str, interval: str
+    ) -> pd.DataFrame:
+        """Creates a pandas dataframe of a stored symbol in a specific time interval.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param window_size: The interval in which the data is stored e.g. 5m.
+        :param interval: Interval the dataframe should have.
+        """
+        df = self.read_symbol_pandas(base_currency, symbol, window_size)
         if len(df) > 0:
-            df = self.to_interval_polars(df, interval)
+            df = self.to_interval_pandas(df, interval)
         return df
 
     def read_file_to_interval_pandas(
@@ -48,24 +508,46 @@ class DataLoader:
         df_resampled["high"] = df["high"].resample(interval).max()
         df_resampled["low"] = df["low"].resample(interval).min()
         df_resampled["close"] = df["close"].resample(interval).last()
-        df_resampled["symbol"] = df["symbol"][0]
+        df_resampled["symbol"] = df["symbol"].iloc[0]
         return df_resampled
 
-    def to_interval_polars(self, df: pl.DataFrame, interval: str) -> pl.DataFrame:
-        """Resamples the dataframe to the according interval.
+    def to_interval_polars(
+        self, df: Union[pl.DataFrame, pl.LazyFrame], interval: str
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Resamples the dataframe, or lazily the scan, to the according interval.
+
+        The candles are resampled per symbol, so the dataframe can hold many symbols
+        as long as the candles of every symbol are sorted by time. The candles are
+        aligned like the candles of the exchange, whatever the first timestamp of the
+        dataframe is, so resampling a part of the history gives the same candles.
 
         :param df: Dataframe that has to be resampled.
         :param interval: Interval the dataframe should have.
         """
 
-        df_resampled = df.groupby_dynamic("timestamp", every=interval).agg(
-            [
-                pl.col("open").first(),
-                pl.col("high").max(),
-                pl.col("low").min(),
-                pl.col("close").last(),
-                pl.col("symbol").first(),
-            ]
+        df_resampled = resample_ohlcv(
+            df.select(["timestamp", "symbol", "open", "high", "low", "close"]),
+            interval,
+            by="symbol",
         )
 
         return df_resampled
+
+    def to_pyramid_polars(
+        self, df: Union[pl.DataFrame, pl.LazyFrame], intervals: List
+    ) -> Dict[str, Union[pl.DataFrame, pl.LazyFrame]]:
+        """Resamples the dataframe, or lazily the scan, to every interval at once,
+        see to_interval_polars.
+
+        Every interval is aggregated from the largest other interval that it is an
+        exact multiple of, so the base candles are only aggregated once and e.g. the
+        weekly candles follow the calendar weeks.
+
+        :param df: Dataframe that has to be resampled.
+        :param intervals: Intervals the dataframes should have.
+        """
+        return build_pyramid(
+            df.select(["timestamp", "symbol", "open", "high", "low", "close"]),
+            intervals,
+            by="symbol",
+        )
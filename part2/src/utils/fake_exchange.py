@@ -0,0 +1,298 @@
+import asyncio
+import bisect
+import json
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from binance import AsyncClient
+from binance.helpers import interval_to_milliseconds
+
+# first candle of every symbol that has no explicit listing time, 28-03-2022
+DEFAULT_LISTING_TIME = 1648425600000
+# the assets against which the pairs are quoted, to split a pair in its assets
+QUOTE_ASSETS = ["USDT", "BUSD", "BTC", "ETH", "BNB"]
+
+
+class FakeExchange:
+    def __init__(
+        self,
+        symbols: List,
+        listings: Dict = None,
+        statuses: Dict = None,
+        recorded_klines: Dict = None,
+        request_weight: Callable[[str, dict], int] = None,
+        weight_limit: int = 1200,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 42,
+    ):
+        """Stand-in for the rest api of the exchange, to measure and test the
+        ingestion without api keys and without the live exchange.
+
+        The klines of a symbol are either generated from its open times or replayed
+        from a recording. Every response carries the used weight headers of the
+        exchange, and requests that exceed the weight limit of the current minute are
+        rejected with a 429, like the exchange does.
+
+        :param symbols: The pairs that are listed e.g. ["ETHUSDT", "ADABTC"].
+        :param listings: The unix timestamp in ms of the first candle per pair, by
+               default 28-03-2022.
+        :param statuses: The trading status per pair that is not traded, e.g.
+               {"ADABTC": "BREAK"}.
+        :param recorded_klines: The klines to replay per pair, as returned by
+               get_klines. Pairs without a recording get synthetic klines.
+        :param request_weight: Function that gives the weight of a request, given the
+               uri and the keyword arguments of the request.
+        :param weight_limit: The maximum weight that can be used within a minute.
+        :param latency: The number of seconds every request takes.
+        :param throttle_rate: The fraction of requests that is rejected with a 429
+               even though the weight limit is not reached.
+        :param error_rate: The fraction of requests that fails with a 503.
+        :param seed: Seed of the random throttles and errors.
+        """
+        self.symbols = list(symbols)
+        self.listings = listings if listings is not None else {}
+        self.statuses = statuses if statuses is not None else {}
+        self.recorded_klines = recorded_klines if recorded_klines is not None else {}
+        self.request_weight = (
+            request_weight if request_weight is not None else lambda uri, kwargs: 1
+        )
+        self.weight_limit = weight_limit
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.total_weight = 0
+        self.used_weight = 0
+        self._window = self._current_window()
+
+    @classmethod
+    def from_recording(cls, path: str, **kwargs) -> "FakeExchange":
+        """Creates an exchange that replays the klines of a json file that maps every
+        pair to its klines, e.g. {"ETHUSDT": client.get_historical_klines(...)}.
+
+        :param path: The json file with the recorded klines.
+        """
+        with open(path) as file:
+            recorded_klines = json.load(file)
+        return cls(
+            symbols=list(recorded_klines),
+            listings={pair: klines[0][0] for pair, klines in recorded_klines.items()},
+            recorded_klines=recorded_klines,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _current_window() -> int:
+        return int(time.time() // 60)
+
+    async def request(self, uri: str, params: Dict) -> Tuple[int, Dict, str]:
+        """Handles a request and returns the status, headers and body of the response.
+
+        :param uri: The uri of the request.
+        :param params: The query parameters of the request.
+        """
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+
+        window = self._current_window()
+        if window != self._window:
+            self._window = window
+            self.used_weight = 0
+
+        weight = self.request_weight(uri, {"params": params})
+        if (
+            self.used_weight + weight > self.weight_limit
+            or self.rng.random() < self.throttle_rate
+        ):
+            self.rejected += 1
+            retry_after = str(int((self._window + 1) * 60 - time.time()) + 1)
+            return 429, self._headers(retry_after=retry_after), self._error(-1003)
+
+        self.used_weight += weight
+        self.total_weight += weight
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return 503, self._headers(), self._error(-1001)
+
+        endpoint = uri.split("/api/", 1)[-1].split("/", 1)[-1]
+        if endpoint == "time":
+            body = {"serverTime": int(time.time() * 1000)}
+        elif endpoint == "exchangeInfo":
+            body = {"symbols": [self.symbol_info(pair) for pair in self.symbols]}
+        elif endpoint == "ticker/price":
+            body = [{"symbol": pair, "price": "1.00000000"} for pair in self.symbols]
+        elif endpoint == "klines" and params["symbol"] in self.symbols:
+            body = self.klines(
+                pair=params["symbol"],
+                interval=params["interval"],
+                start_time=int(params.get("startTime", 0)),
+                end_time=int(params["endTime"]) if "endTime" in params else None,
+                limit=int(params.get("limit", 500)),
+            )
+        elif endpoint == "klines":
+            return 400, self._headers(), self._error(-1121)
+        else:
+            return 404, self._headers(), ""
+        return 200, self._headers(), json.dumps(body)
+
+    def symbol_info(self, pair: str) -> Dict:
+        """Returns the information of a pair as in the exchange information.
+
+        :param pair: The pair e.g. ETHUSDT.
+        """
+        quote_asset = max(
+            [asset for asset in QUOTE_ASSETS if pair.endswith(asset)], key=len
+        )
+        return {
+            "symbol": pair,
+            "status": self.statuses.get(pair, "TRADING"),
+            "baseAsset": pair[: -len(quote_asset)],
+            "quoteAsset": quote_asset,
+        }
+
+    def klines(
+        self,
+        pair: str,
+        interval: str,
+        start_time: int,
+        end_time: Optional[int],
+        limit: int,
+    ) -> List:
+        """Returns at most limit klines that open between start and end time, the
+        candle that is still open included.
+
+        :param pair: The pair e.g. ETHUSDT.
+        :param interval: The interval of the candles e.g. 5m.
+        :param start_time: The unix timestamp in ms from which klines are returned.
+        :param end_time: The unix timestamp in ms up to which klines are returned.
+        :param limit: The maximum number of klines.
+        """
+        window_size_ms = interval_to_milliseconds(interval)
+        end_time = int(time.time() * 1000) if end_time is None else end_time
+
+        if pair in self.recorded_klines:
+            klines = self.recorded_klines[pair]
+            open_times = [kline[0] for kline in klines]
+            first = bisect.bisect_left(open_times, start_time)
+            last = bisect.bisect_right(open_times, end_time)
+            return klines[first : min(last, first + limit)]
+
+        listing_time = self.listings.get(pair, DEFAULT_LISTING_TIME)
+        start_time = max(start_time, listing_time)
+        # the first candle that opens at or after the start time
+        first = -(-start_time // window_size_ms) * window_size_ms
+        last = min(end_time, int(time.time() * 1000))
+        return [
+            self._synthetic_kline(open_time, window_size_ms)
+            for open_time in range(first, last + 1, window_size_ms)[:limit]
+        ]
+
+    @staticmethod
+    def _synthetic_kline(open_time: int, window_size_ms: int) -> List:
+        price = 100 + (open_time // window_size_ms) % 1000 / 100
+        return [
+            open_time,
+            f"{price:.8f}",
+            f"{price + 0.5:.8f}",
+            f"{price - 0.5:.8f}",
+            f"{price + 0.1:.8f}",
+            "1000.00000000",
+            open_time + window_size_ms - 1,
+            f"{price * 1000:.8f}",
+            100,
+            "500.00000000",
+            f"{price * 500:.8f}",
+            "0",
+        ]
+
+    def _headers(self, retry_after: str = None) -> Dict:
+        headers = {
+            "x-mbx-used-weight": str(self.used_weight),
+            "x-mbx-used-weight-1m": str(self.used_weight),
+        }
+        if retry_after is not None:
+            headers["Retry-After"] = retry_after
+        return headers
+
+    @staticmethod
+    def _error(code: int) -> str:
+        messages = {
+            -1001: "Internal error; unable to process your request.",
+            -1003: "Too much request weight used; please use the websocket.",
+            -1121: "Invalid symbol.",
+        }
+        return json.dumps({"code": code, "msg": messages[code]})
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: Dict, body: str):
+        """The part of an aiohttp response that the AsyncClient uses."""
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def text(self) -> str:
+        return self.body
+
+    async def __aenter__(self) -> "FakeResponse":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        return
+
+
+class FakeSession:
+    def __init__(self, exchange: FakeExchange):
+        """Replaces the aiohttp session of an AsyncClient, sending every request to
+        the fake exchange instead of over the network.
+
+        :param exchange: The exchange that handles the requests.
+        """
+        self.exchange = exchange
+
+    def get(self, uri: str, params: str = None, **kwargs) -> "_PendingResponse":
+        query = {}
+        if params:
+            query = dict(param.split("=", 1) for param in params.split("&"))
+        return _PendingResponse(self.exchange.request(uri, query))
+
+    async def close(self) -> None:
+        return
+
+
+class _PendingResponse:
+    def __init__(self, request):
+        self.request = request
+
+    async def __aenter__(self) -> FakeResponse:
+        return FakeResponse(*await self.request)
+
+    async def __aexit__(self, *args) -> None:
+        return
+
+
+class FakeAsyncClient(AsyncClient):
+    def __init__(self, exchange: FakeExchange):
+        """An AsyncClient of python-binance that talks to a fake exchange.
+
+        Only the session is replaced, so the paging of get_historical_klines, the
+        handling of errors and a rate limiter wrapped around the client behave as
+        they do against the real exchange.
+
+        :param exchange: The exchange that handles the requests.
+        """
+        self.exchange = exchange
+        super().__init__()
+
+    def _init_session(self) -> FakeSession:
+        return FakeSession(self.exchange)
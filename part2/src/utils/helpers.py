@@ -2,7 +2,6 @@ import logging
 import sys
 
 deprecated_coins = [
-    "ETH",
     "AE",
     "AGI",
     "ARN",
@@ -1,6 +1,8 @@
 from abc import ABCMeta, abstractmethod
 from typing import List
 
+import polars as pl
+
 
 class Indicator(metaclass=ABCMeta):
     def __init__(self, name: str, type: List, window: int):
@@ -29,3 +31,13 @@ class Indicator(metaclass=ABCMeta):
     @abstractmethod
     def get_window(self):
         return self.window
+
+    @staticmethod
+    def over(expression: pl.Expr, by: str = None) -> pl.Expr:
+        """Evaluates a rolling expression per value of the by column, e.g. per symbol
+        when a dataframe holds many symbols.
+
+        :param expression: The expression to evaluate.
+        :param by: The column to evaluate separately, by default the whole column.
+        """
+        return expression if by is None else expression.over(by)
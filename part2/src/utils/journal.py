@@ -0,0 +1,106 @@
+import json
+import os
+from typing import Dict, Set
+
+from src.utils.storage import atomic_write
+
+
+class RunJournal:
+    def __init__(self, path: str):
+        """Keeps track of the progress of an ingestion run in a small file, so that a
+        run that crashed or was killed can be resumed where it stopped.
+
+        The journal records which symbols are completed and which are started. A
+        restarted run skips the completed symbols and continues the started ones
+        from their newest stored candle. The file is replaced atomically on every
+        change. Once a run ends without being interrupted only the symbols that were
+        started but not completed are kept, see finish.
+
+        :param path: The file in which the journal is kept.
+        """
+        self.path = path
+        self.action = None
+        self.window_size = None
+        self.completed: Set = set()
+        self.started: Set = set()
+
+    @staticmethod
+    def key(base_currency: str, symbol: str) -> str:
+        return f"{base_currency}/{symbol}"
+
+    def start(self, action: str, window_size: str) -> bool:
+        """Starts a run, resuming the journal of an unfinished run with the same action
+        and window size if there is one. Returns whether a run was resumed.
+
+        :param action: The action of the run. Can be "create", "update", "recreate".
+        :param window_size: The interval of the candles e.g. 5m.
+        """
+        self.action = action
+        self.window_size = window_size
+        self.completed = set()
+        self.started = set()
+
+        if os.path.isfile(self.path):
+            with open(self.path) as file:
+                journal = json.load(file)
+            if journal["action"] == action and journal["window_size"] == window_size:
+                self.completed = set(journal["completed"])
+                self.started = set(journal["started"])
+                return True
+
+        self._save()
+        return False
+
+    def is_completed(self, base_currency: str, symbol: str) -> bool:
+        return self.key(base_currency, symbol) in self.completed
+
+    def is_started(self, base_currency: str, symbol: str) -> bool:
+        return self.key(base_currency, symbol) in self.started
+
+    def mark_started(self, base_currency: str, symbol: str) -> None:
+        self.started.add(self.key(base_currency, symbol))
+        self._save()
+        return
+
+    def mark_completed(self, base_currency: str, symbol: str) -> None:
+        key = self.key(base_currency, symbol)
+        self.started.discard(key)
+        self.completed.add(key)
+        self._save()
+        return
+
+    def finish(self) -> None:
+        """Ends a run that was not interrupted.
+
+        The completed symbols are forgotten, so the next run retrieves every symbol
+        again, also when some symbols failed. The symbols that were started but not
+        completed are kept, so they continue from their newest stored candle instead
+        of starting over. Without those the journal is removed.
+        """
+        self.completed = set()
+        if len(self.started) > 0:
+            self._save()
+        elif os.path.isfile(self.path):
+            os.remove(self.path)
+        return
+
+    def _to_dict(self) -> Dict:
+        return {
+            "action": self.action,
+            "window_size": self.window_size,
+            "completed": sorted(self.completed),
+            "started": sorted(self.started),
+        }
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        def _write(path: str) -> None:
+            with open(path, "w") as file:
+                json.dump(self._to_dict(), file)
+
+        # a crash while writing leaves the previous journal intact
+        atomic_write(self.path, _write)
+        return
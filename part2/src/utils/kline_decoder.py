@@ -0,0 +1,78 @@
+from typing import List
+
+import polars as pl
+
+PRICE_COLUMNS = [
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "quote_av",
+    "tb_base_av",
+    "tb_quote_av",
+]
+COLUMNS = ["timestamp", "close_time"] + PRICE_COLUMNS + ["trades", "symbol"]
+
+# order in which the fields are written to the intermediate csv
+_CSV_COLUMNS = ["timestamp", "close_time", "trades"] + PRICE_COLUMNS
+_CSV_DTYPES = {
+    **{column: pl.Int64 for column in ["timestamp", "close_time", "trades"]},
+    **{column: pl.Float64 for column in PRICE_COLUMNS},
+}
+_COMPACT_CSV_DTYPES = {
+    **_CSV_DTYPES,
+    "trades": pl.Int32,
+    **{column: pl.Float32 for column in PRICE_COLUMNS},
+}
+
+
+def decode_klines(klines: List, symbol: str, compact: bool = False) -> pl.DataFrame:
+    """Decodes the klines as returned by the exchange into a typed dataframe.
+
+    A kline is a list of 12 fields, most of them numbers formatted as strings.
+    Instead of building a dataframe row by row and casting every column afterwards,
+    the fields that are used are joined into a single csv document that is parsed by
+    the (multi-threaded) csv reader of polars straight into typed columns. The unused
+    "ignore" field is dropped while joining.
+
+    :param klines: The klines as returned by the exchange.
+    :param symbol: The tickername without base currency e.g. ETH.
+    :param compact: Whether to decode the prices and volumes as Float32, the trades
+           as Int32 and the symbol as categorical, see storage.COMPACT_DTYPES.
+    """
+    dtypes = _COMPACT_CSV_DTYPES if compact else _CSV_DTYPES
+    symbol_dtype = pl.Categorical if compact else pl.Utf8
+    if len(klines) == 0:
+        return pl.DataFrame(
+            [
+                pl.Series(column, [], dtype=dtypes.get(column, pl.Utf8))
+                for column in COLUMNS
+            ]
+        ).with_columns(
+            [
+                pl.col(["timestamp", "close_time"]).cast(pl.Datetime("ms")),
+                pl.col("symbol").cast(symbol_dtype),
+            ]
+        )
+
+    document = "\n".join(
+        [
+            f"{k[0]},{k[6]},{k[8]},{k[1]},{k[2]},{k[3]},{k[4]},{k[5]},{k[7]},{k[9]},{k[10]}"
+            for k in klines
+        ]
+    )
+    df = pl.read_csv(
+        document.encode(),
+        has_header=False,
+        new_columns=_CSV_COLUMNS,
+        dtypes=dtypes,
+    )
+    return df.select(
+        [
+            pl.col(["timestamp", "close_time"]).cast(pl.Datetime("ms")),
+            pl.col(PRICE_COLUMNS),
+            pl.col("trades"),
+            pl.lit(symbol).cast(symbol_dtype).alias("symbol"),
+        ]
+    )
@@ -0,0 +1,296 @@
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import polars as pl
+import websockets
+from src.utils.helpers import logger
+from src.utils.kline_decoder import PRICE_COLUMNS
+from src.utils.writer import AsyncWriter
+
+logger = logger("live_klines")
+
+# fields of a kline in a websocket message, in the order of PRICE_COLUMNS
+PRICE_FIELDS = ["o", "h", "l", "c", "v", "q", "V", "Q"]
+
+
+class KlineRingBuffer:
+    def __init__(self, capacity: int = 1024):
+        """Fixed-size buffer of closed candles of a single symbol, backed by arrays.
+
+        When the buffer is full the oldest candle is overwritten, so memory usage stays
+        constant when flushing falls behind.
+
+        :param capacity: The maximum number of candles the buffer holds.
+        """
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.close_times = np.zeros(capacity, dtype=np.int64)
+        self.trades = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.zeros((capacity, len(PRICE_COLUMNS)), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, kline: Dict) -> None:
+        """Adds a candle as sent in the "k" field of a kline stream message.
+
+        :param kline: The kline of the websocket message.
+        """
+        if self.size == self.capacity:
+            # overwrite the oldest candle
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+            self.dropped += 1
+
+        index = (self.start + self.size) % self.capacity
+        self.timestamps[index] = kline["t"]
+        self.close_times[index] = kline["T"]
+        self.trades[index] = kline["n"]
+        self.prices[index] = [float(kline[field]) for field in PRICE_FIELDS]
+        self.size += 1
+        return
+
+    def drain(self, symbol: str) -> pl.DataFrame:
+        """Returns the buffered candles, oldest first, and empties the buffer.
+
+        :param symbol: The tickername without base currency e.g. ETH.
+        """
+        indices = (self.start + np.arange(self.size)) % self.capacity
+        df = pl.DataFrame(
+            [
+                pl.Series("timestamp", self.timestamps[indices]),
+                pl.Series("close_time", self.close_times[indices]),
+            ]
+            + [
+                pl.Series(column, self.prices[indices, i])
+                for i, column in enumerate(PRICE_COLUMNS)
+            ]
+            + [pl.Series("trades", self.trades[indices])]
+        ).with_columns(
+            [
+                pl.col(["timestamp", "close_time"]).cast(pl.Datetime("ms")),
+                pl.lit(symbol).alias("symbol"),
+            ]
+        )
+        self.start = 0
+        self.size = 0
+        return df
+
+    def restore(self, df: pl.DataFrame) -> None:
+        """Puts drained candles back in front of the buffered ones, e.g. after their
+        write failed. When they do not all fit, the oldest candles are dropped.
+
+        :param df: The candles as returned by drain.
+        """
+        df = df.sort("timestamp")
+        indices = (self.start + np.arange(self.size)) % self.capacity
+        timestamps = np.concatenate(
+            [df["timestamp"].dt.epoch("ms").to_numpy(), self.timestamps[indices]]
+        )
+        close_times = np.concatenate(
+            [df["close_time"].dt.epoch("ms").to_numpy(), self.close_times[indices]]
+        )
+        trades = np.concatenate([df["trades"].to_numpy(), self.trades[indices]])
+        prices = np.concatenate(
+            [
+                np.column_stack([df[column].to_numpy() for column in PRICE_COLUMNS]),
+                self.prices[indices],
+            ]
+        )
+
+        size = min(len(timestamps), self.capacity)
+        self.dropped += len(timestamps) - size
+        self.timestamps[:size] = timestamps[-size:]
+        self.close_times[:size] = close_times[-size:]
+        self.trades[:size] = trades[-size:]
+        self.prices[:size] = prices[-size:]
+        self.start = 0
+        self.size = size
+        return
+
+
+class LiveKlineStream:
+    def __init__(
+        self,
+        base_currencies: Dict,
+        window_size: str,
+        storage,
+        url: str = "wss://stream.binance.com:9443",
+        streams_per_connection: int = 200,
+        capacity: int = 1024,
+        flush_interval: float = 60,
+        compact_files: int = 24,
+    ):
+        """Subscribes to the kline streams of the exchange and stores the closed
+        candles.
+
+        The streams of all symbols are multiplexed over a few connections. Closed
+        candles are kept in a ring buffer per symbol, which a background task flushes
+        to the storage in batches. The writes run on the thread of a writer, so the
+        event loop keeps reading the streams while they are written.
+
+        :param base_currencies: The symbols per base currency e.g. {"USDT": ["ETH"]},
+               as filtered by Orderbook.get_available_pairs.
+        :param window_size: The interval of the candles e.g. 5m.
+        :param storage: The backend in which the data is stored.
+        :param url: The base url of the websocket api of the exchange.
+        :param streams_per_connection: The number of streams combined on a single
+               connection.
+        :param capacity: The number of candles that are buffered per symbol.
+        :param flush_interval: The number of seconds between flushes to the storage.
+        :param compact_files: The number of files a month of a symbol can hold before
+               they are merged into one. Every flush adds a file for every symbol
+               that received candles.
+        """
+        self.window_size = window_size
+        self.storage = storage
+        self.url = url
+        self.streams_per_connection = streams_per_connection
+        self.flush_interval = flush_interval
+        self.compact_files = compact_files
+        self.pairs = {
+            f"{symbol}{base_currency}".upper(): (base_currency, symbol)
+            for base_currency, symbols in base_currencies.items()
+            for symbol in symbols
+        }
+        self.buffers = {pair: KlineRingBuffer(capacity) for pair in self.pairs}
+        self.reconnects = 0
+        self.writer = None
+        self._stopped = None
+
+    def stream_urls(self) -> List:
+        """Returns the urls of the combined streams, one per connection."""
+        streams = [f"{pair.lower()}@kline_{self.window_size}" for pair in self.pairs]
+        return [
+            f"{self.url}/stream?streams="
+            + "/".join(streams[i : i + self.streams_per_connection])
+            for i in range(0, len(streams), self.streams_per_connection)
+        ]
+
+    def handle_message(self, message: str) -> None:
+        """Buffers the candle of a stream message if it is closed.
+
+        :param message: A message of a combined kline stream.
+        """
+        kline = json.loads(message)["data"]["k"]
+        if kline["x"] and kline["s"] in self.buffers:
+            self.buffers[kline["s"]].push(kline)
+        return
+
+    async def flush(self) -> None:
+        """Hands the buffered candles of every symbol to the writer and waits until
+        they are written.
+
+        Only emptying the buffers runs on the event loop, the writes run on the
+        thread of the writer. When the write fails the candles are put back in the
+        buffers, so the next flush writes them again.
+        """
+        frames = {}
+        for pair, buffer in self.buffers.items():
+            if len(buffer) == 0:
+                continue
+
+            base_currency, symbol = self.pairs[pair]
+            # a candle can be received twice after a reconnect
+            frames[pair] = buffer.drain(symbol).unique(subset="timestamp", keep="last")
+        if len(frames) == 0:
+            return
+        try:
+            await self.writer.call(self._write, frames)
+        except Exception as e:
+            logger.error(f"Failed writing the candles of {len(frames)} pairs: {e!r}")
+            # the candles that were written are skipped when they are written again
+            for pair, df in frames.items():
+                self.buffers[pair].restore(df)
+        return
+
+    def _write(self, frames: Dict) -> None:
+        """Appends the drained candles of every symbol to the storage, and merges the
+        files of the months they fall in once there are compact_files of them.
+
+        :param frames: The candles per pair e.g. ETHUSDT.
+        """
+        for pair, df in frames.items():
+            base_currency, symbol = self.pairs[pair]
+            last_timestamp = self.storage.last_timestamp(
+                base_currency, symbol, self.window_size
+            )
+            if last_timestamp is not None:
+                df = df.filter(pl.col("timestamp") > last_timestamp)
+            if len(df) == 0:
+                continue
+
+            self.storage.append(base_currency, symbol, self.window_size, df)
+            self.storage.compact(
+                base_currency,
+                symbol,
+                self.window_size,
+                months=df["timestamp"].dt.strftime("%Y-%m").unique().to_list(),
+                min_files=self.compact_files,
+            )
+        return
+
+    async def _consume(self, url: str) -> None:
+        attempt = 0
+        while not self._stopped.is_set():
+            try:
+                async with websockets.connect(url) as connection:
+                    attempt = 0
+                    async for message in connection:
+                        self.handle_message(message)
+            except (OSError, websockets.exceptions.WebSocketException):
+                attempt += 1
+
+            if not self._stopped.is_set():
+                # the exchange closes connections after 24 hours, reconnect
+                self.reconnects += 1
+                await asyncio.sleep(min(60, 2**attempt - 1))
+        return
+
+    async def _flush_periodically(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+        return
+
+    async def run(self, duration: Optional[float] = None) -> None:
+        """Consumes the streams until stop is called or the duration has passed.
+
+        The buffers are flushed a final time before returning.
+
+        :param duration: The number of seconds to run, by default until stopped.
+        """
+        self._stopped = asyncio.Event()
+        self.writer = AsyncWriter(storage=self.storage)
+        self.writer.start()
+        consumers = [
+            asyncio.create_task(self._consume(url)) for url in self.stream_urls()
+        ]
+        flusher = asyncio.create_task(self._flush_periodically())
+
+        try:
+            if duration is not None:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), duration)
+                except asyncio.TimeoutError:
+                    self.stop()
+            await flusher
+        finally:
+            self.stop()
+            for task in consumers + [flusher]:
+                task.cancel()
+            await asyncio.gather(*consumers, flusher, return_exceptions=True)
+            await self.writer.close()
+        return
+
+    def stop(self) -> None:
+        self._stopped.set()
+        return
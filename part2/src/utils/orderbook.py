@@ -1,14 +1,23 @@
 import asyncio
-import os.path
-import time
-from datetime import datetime
-from typing import List
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
 
 import backoff
 import polars as pl
 from binance import AsyncClient
 from binance.exceptions import BinanceAPIException
+from src.utils.concurrency import AdaptiveConcurrency
+from src.utils.cost_model import CostModel
 from src.utils.helpers import deprecated_coins, logger
+from src.utils.journal import RunJournal
+from src.utils.kline_decoder import decode_klines
+from src.utils.rate_limiter import RateLimiter
+from src.utils.resample import IntervalDeriver
+from src.utils.storage import ParquetStorage, Storage
+from src.utils.symbol_registry import SymbolRegistry
+from src.utils.worker_pool import Progress, WorkerPool
+from src.utils.writer import AsyncWriter
 
 logger = logger("orderbook")
 
@@ -21,6 +30,12 @@ class Orderbook:
         base_path: str,
         # dd-mm-yyyy
         start_date: str = "28-03-2022",
+        storage: Storage = None,
+        backfill_concurrency: int = 8,
+        checkpoint_pages: int = 100,
+        journal: RunJournal = None,
+        registry: SymbolRegistry = None,
+        derived_intervals: List = None,
     ):
         """Retrieves all the orderbook data from a crypto-exhange and stores it in a
         predefined location.
@@ -31,219 +46,241 @@ class Orderbook:
         :param base_currencies: symbols against which data can be fetched such as BTC
                ETH, DOT
         :param start_date: The date from which the data should be retrieved.
+        :param storage: The backend in which the data is stored, by default parquet
+               files under the base_path.
+        :param backfill_concurrency: The number of pages of a single symbol that are
+               retrieved concurrently, 1 retrieves them one after the other.
+        :param checkpoint_pages: The number of pages of a backfill that are retrieved
+               before they are written, a resumed run continues after the last
+               written pages.
+        :param journal: Keeps track of the progress of a run, by default a file
+               under the base_path.
+        :param registry: The pairs of the exchange, by default cached in a file
+               under the base_path for a day.
+        :param derived_intervals: The coarser intervals e.g. ["1h", "1d"] that are
+               built from the stored candles of the window_size, instead of retrieved
+               from the exchange. They are updated after every written pair.
         """
         self.base_currencies = base_currencies
         self.window_size = window_size
         self.start_date = start_date
         self.base_path = base_path
-        self.current_currency = None
-        self.current_path = None
+        self.storage = storage if storage is not None else ParquetStorage(base_path)
+        self.backfill_concurrency = backfill_concurrency
+        self.checkpoint_pages = checkpoint_pages
+        self.journal = (
+            journal
+            if journal is not None
+            else RunJournal(os.path.join(base_path, f"_journal-{window_size}.json"))
+        )
+        self.newest_data_point = None
+        self.gaps = {}
+        self.listing_times = {}
+        self.writer = None
+        self._completions = []
         self.deprecated_coins = deprecated_coins
+        self.registry = (
+            registry
+            if registry is not None
+            else SymbolRegistry(
+                os.path.join(base_path, "_symbols.json"),
+                deprecated_coins=self.deprecated_coins,
+            )
+        )
+        self.deriver = (
+            IntervalDeriver(
+                storage=self.storage,
+                base_interval=window_size,
+                intervals=derived_intervals,
+            )
+            if derived_intervals
+            else None
+        )
+        self.rate_limiter = RateLimiter(limit=1200)
+        self.concurrency = AdaptiveConcurrency()
+        self.cost_model = CostModel(window_size=window_size)
 
     async def get_available_pairs(self) -> None:
-        """Returns information about which pairs are available on binance.
+        """Determines which pairs are available on binance.
+
+        The pairs come from the symbol registry, which only asks the exchange for
+        them when its cached copy is older than its ttl. Pairs that are no longer
+        traded are not retrieved anymore.
 
         Note: This will only return pairs that match the given base_currencies.
         """
+        added, delisted = await self.registry.refresh(client=self.client)
+        if len(added) > 0 or len(delisted) > 0:
+            logger.info(f"Pairs added: {added}, delisted: {delisted}")
 
-        all_possible_pairs = await self.retrieve_all_possible_pairs()
-
-        self.filter_possible_pairs(all_possible_pairs=all_possible_pairs)
-        return
-
-    async def retrieve_all_possible_pairs(self) -> List:
-        """Retrieves the names all possible pairs from the exchange."""
-        all_possible_pairs = []
-
-        all_tickers_information = await self.client.get_all_tickers()
-        for ticker in range(len(all_tickers_information)):
-            all_possible_pairs.append(all_tickers_information[ticker]["symbol"])
-
-        return all_possible_pairs
-
-    def filter_possible_pairs(self, all_possible_pairs: List) -> None:
-        """Removes all pairing that have nothing to do with the given base_currencies.
-
-        :param all_possible_pairs: List containing all possible pairs on the exchange.
-        """
         self.base_currencies = {
-            base_currency: [] for base_currency in self.base_currencies
+            base_currency: self.registry.symbols(base_currency)
+            for base_currency in self.base_currencies
         }
-
-        for base_currency in self.base_currencies:
-            self.base_currencies[
-                base_currency
-            ] = self.available_symbol_per_base_currency(
-                base_currency=base_currency, all_possible_pairs=all_possible_pairs
-            )
-
         return
 
-    def available_symbol_per_base_currency(
-        self, base_currency: str, all_possible_pairs: List
-    ) -> List:
-        """Processes all available pairs to give back only the relevant ones.
-
-        Filters a list of possible pairs, given 3 filters:
-        1: Out of all pairs, only get the ones that end with the base_currency
-        2: Remove some noise from the list
-        3: Remove the coins that are no longer active, but are given back by the api.
-
-        :param base_currency: The base currency against which the data is retrieved.
-        :param all_possible_pairs: List of all the possible pairs given a base currency
-                                   for a given exchange.
-        """
-        available_symbols_for_base_currency = [
-            pair.rsplit(base_currency)[0]
-            for pair in all_possible_pairs
-            if pair.endswith(base_currency)
-        ]
-        available_symbols_for_base_currency = [
-            i for i in available_symbols_for_base_currency if len(i) >= 2
-        ]
-        available_symbols_for_base_currency = [
-            ticker
-            for ticker in available_symbols_for_base_currency
-            if ticker not in self.deprecated_coins
-        ]
-        if base_currency != "BTC":
-            available_symbols_for_base_currency = available_symbols_for_base_currency
-        return available_symbols_for_base_currency
-
     async def get_orderbook(
         self,
         action: str,
         to_write: bool,
+        on_complete: Callable[[Tuple, Optional[BaseException], Progress], None] = None,
     ) -> None:
         """Initialized the retrievement of the orderbook data for every available
         ticker of requested base currency.
         For the function "_get_orderbook_binance", it is required that the string
         provided, is the tickername with BTC appended without spaces such e.g. ETHBTC.
 
-        :param action: The action to perform. Can be "create", "update", "retrieve".
+        The (base currency, symbol) pairs of all base currencies are fetched by one
+        pool of concurrent workers that share the same rate limit, each worker picks
+        up the next pair as soon as it is done with its previous one.
+
+        The action "repair" only retrieves the candles that are missing between the
+        stored candles of every pair, and merges them into the storage.
+
+        When writing, the progress is kept in the run journal. If the previous run
+        with the same action was interrupted, the pairs it completed are skipped and
+        the pairs it started continue from their newest stored candle. A run that
+        ends normally, even with failed pairs, only leaves the started pairs behind,
+        so the next run retrieves every pair again.
+
+        :param action: The action to perform. Can be "create", "update", "recreate",
+               "repair".
         :param to_write: Whether the data has to be written to a file or not.
+        :param on_complete: Called after every pair with the (base currency, symbol),
+               the exception that occurred (or None) and the progress of the run.
         """
 
         logger.info("Get available pairs")
         await self.get_available_pairs()
 
-        tasks = []
+        self.newest_data_point = await self.determine_newest_data_point()
+        logger.info(f"Retrieving data up to {self.newest_data_point}")
+        self.gaps = {}
 
-        for i, base_currency in enumerate(list(self.base_currencies)):
-            self.current_currency = base_currency
-            self.current_path = self.base_path + self.current_currency
-
-            logger.info("Calculating single api call")
-            single_api_call_cost = await self.calculate_single_api_call_cost(
-                action=action,
-                to_write=to_write,
+        pairs = [
+            (base_currency, symbol)
+            for base_currency, symbols in self.base_currencies.items()
+            for symbol in symbols
+        ]
+        if to_write and self.journal.start(action=action, window_size=self.window_size):
+            logger.info(
+                f"Resuming the previous run, {len(self.journal.completed)} pairs are "
+                "already done"
             )
-            if i == 0:
-                single_api_call_cost = single_api_call_cost - 2
-            logger.info("Determine number of concurrent calls")
-            maximum_concurrent_calls = self.determine_number_of_concurrent_calls(
-                single_api_call_cost=single_api_call_cost, base_currency=base_currency
+
+        logger.info("Estimating api call costs")
+        job_costs = {
+            (base_currency, symbol): self.estimate_symbol_cost(
+                base_currency=base_currency, symbol=symbol, action=action
             )
-            # start at 1 to prevent zerodivison when using modulo
-            for n, symbol in enumerate(
-                iterable=self.base_currencies[base_currency], start=1
-            ):
-                tasks.append(
-                    asyncio.create_task(
-                        self._get_orderbook_binance(
-                            symbol=symbol, action=action, to_write=to_write
-                        )
-                    )
-                )
-                if n % maximum_concurrent_calls == 0:
-                    await asyncio.gather(*tasks)
+            for base_currency, symbol in pairs
+            if not (to_write and self.journal.is_completed(base_currency, symbol))
+        }
+        logger.info(f"Retrieving all pairs will cost {sum(job_costs.values())}")
+        logger.info("Determine number of concurrent calls")
+        maximum_concurrent_calls = self.determine_number_of_concurrent_calls(
+            symbol_costs=list(job_costs.values())
+        )
 
-                    logger.info("Maximum calls reached for the minute.")
-                    time.sleep(self.determine_sleep_period())
-                    tasks = []
+        def _on_complete(
+            job: Tuple, error: Optional[BaseException], progress: Progress
+        ) -> None:
+            base_currency, symbol = job
+            if error is not None:
+                logger.error(f"Failed {symbol}/{base_currency}: {error!r}")
+            logger.info(f"Progress: {progress}, {self.concurrency}")
+            if on_complete is not None:
+                on_complete(job, error, progress)
 
-            if len(tasks) > 0:
-                logger.info("Gathering lasts tasks")
-                await asyncio.gather(*tasks)
+        if to_write:
+            self.writer = AsyncWriter(storage=self.storage)
+            self.writer.start()
+            self._completions = []
 
-            logger.info("Done")
+        worker_pool = WorkerPool(
+            number_of_workers=maximum_concurrent_calls, on_complete=_on_complete
+        )
+        try:
+            # the most expensive pairs first, the cheap ones fill up the gaps
+            progress = await worker_pool.run(
+                jobs=sorted(job_costs, key=job_costs.get, reverse=True),
+                worker=lambda job: self._get_orderbook_binance(
+                    base_currency=job[0],
+                    symbol=job[1],
+                    action=action,
+                    to_write=to_write,
+                ),
+            )
+        finally:
+            self.concurrency.close()
+
+        if to_write:
+            logger.info("Waiting for the last writes")
+            await asyncio.gather(*self._completions, return_exceptions=True)
+            await self.writer.close()
+            logger.info(f"Written in {self.writer.batches} batches")
+
+            if len(self.journal.started) > 0:
+                logger.info(
+                    f"{len(self.journal.started)} pairs are not done, the next run "
+                    "continues them from their newest stored candle"
+                )
+            self.journal.finish()
 
+        logger.info(f"Concurrency: {self.concurrency.metrics}")
+        logger.info(f"Done, failed: {progress.failed}")
         return
 
-    def determine_number_of_concurrent_calls(
-        self, single_api_call_cost: int, base_currency: str
-    ) -> int:
-        """Determines how many concurrent calls are possible within a minute.
+    def determine_number_of_concurrent_calls(self, symbol_costs: List) -> int:
+        """Determines how many pairs are retrieved concurrently.
 
-        Checks how many concurrent calls to the api can be made within a minute for the
-        given base_currency.
-        The percentage that is used, is to give a margin to be sure that you stay within
-        the limit, since sometimes a retry can occur, thus increasing the cost.
-        If the actual_number_of_total_calls are less than the max limit, it can be done
-        within one minute, else, it has to be divided into smaller chunks.
+        Every pair gets a worker, up to the maximum of the concurrency controller.
+        The number of requests that are actually in flight is adapted by the
+        controller to the latency and the throttles of the exchange, and the rate
+        limiter keeps their weight within the full limit of the exchange.
 
-        :param single_api_call_cost: value representing how much a single api call costs.
-        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol_costs: The predicted cost of retrieving every symbol.
         """
-        API_LIMIT = 1200
-        API_CALL_USAGE_PERCENTAGE = 0.80
-        actual_number_of_total_calls = len(self.base_currencies[base_currency])
-
-        maximum_number_of_possible_calls = (
-            API_LIMIT / single_api_call_cost
-        ) * API_CALL_USAGE_PERCENTAGE
-
-        if actual_number_of_total_calls < maximum_number_of_possible_calls:
-            return actual_number_of_total_calls
-        else:
-            return round(maximum_number_of_possible_calls)
+        return min(len(symbol_costs), self.concurrency.maximum)
 
-    async def calculate_single_api_call_cost(
-        self,
-        action: str,
-        to_write: bool,
-    ) -> int:
-        """Calculate the cost of a single api call.
+    def estimate_symbol_cost(self, base_currency: str, symbol: str, action: str) -> int:
+        """Predicts the cost of retrieving the new data of a symbol.
 
-        Performs a single call to the api, to check how much it costs to call that api
-        giving the start date. The older the given start date is, the higher the cost.
-        This is later used to make sure when retrieving all the data, we stay within the
-        limits of the api.
-
-        We can ask from the client how much of the limit of the api we have already
-        used. But we need to subtract the costs of the creation of the client which
-        already costs something.
+        The cost follows from the number of pages of candles between the newest stored
+        candle of the symbol, or the start date, and now. A symbol that is almost up to
+        date costs next to nothing.
 
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
         :param action: The action to perform. Can be "create", "update", "retrieve".
-        :param to_write: Whether the data has to be written to a file or not.
         """
-        single_api_call_cost_test_symbol = self.get_single_api_call_cost_test_symbol()
-        await self._get_orderbook_binance(
-            symbol=single_api_call_cost_test_symbol,
-            action=action,
-            to_write=to_write,
-        )
+        if action == "repair":
+            # the gaps lie between stored candles, their start is known
+            return sum(
+                self.cost_model.klines_range_weight(
+                    oldest_data_point=first, newest_data_point=last
+                )
+                for first, last in self.find_gaps(base_currency, symbol)
+            )
 
-        single_api_call_cost = int(self.client.response.headers["x-mbx-used-weight"])
-        logger.info(f"A single api call will cost: {single_api_call_cost}")
-        return single_api_call_cost
-
-    def get_single_api_call_cost_test_symbol(self) -> str:
-        """A single call to get information on how much a call will cost to prevent
-        rate limits."""
-        if self.current_currency.upper() == "BTC":
-            symbol = "ETH"
-        elif self.current_currency.upper() == "USDT":
-            symbol = "ETH"
-        else:
-            raise ValueError(
-                f"Current base_currency {self.current_currency} is not "
-                f"accounted for yet."
+        last_timestamp = None
+        if action != "recreate" or self.journal.is_started(base_currency, symbol):
+            last_timestamp = self.storage.last_timestamp(
+                base_currency, symbol, self.window_size
             )
-        return symbol
+        if last_timestamp is not None:
+            oldest_data_point = last_timestamp
+        else:
+            oldest_data_point = datetime.strptime(self.start_date, "%d-%m-%Y")
+
+        return self.cost_model.historical_klines_weight(
+            oldest_data_point=oldest_data_point,
+            newest_data_point=self.newest_data_point,
+        )
 
     async def _get_orderbook_binance(
         self,
+        base_currency: str,
         symbol: str,
         action: str,
         to_write: bool,
@@ -251,35 +288,180 @@ class Orderbook:
         """This functions gathers all the information needed for retrieving the
         orderbook data.
 
+        A long range is retrieved and written in checkpoints of checkpoint_pages
+        pages. When recreating, the existing data is only removed once the first
+        checkpoint of its replacement is retrieved.
+
+        :param base_currency: The base currency against which the data is retrieved.
         :param symbol: The tickername + BTC e.g. USDT/BTC
         :param action: The action to perform. Can be "initial load", "update", "retrieve".
+        :param to_write: Whether the data has to be written to a file or not.
         """
+        if action == "repair":
+            return await self._repair_gaps(
+                base_currency=base_currency, symbol=symbol, to_write=to_write
+            )
 
-        existing_data, filename = self._retrieve_existing_data(
-            symbol=symbol, action=action
+        last_timestamp = self._retrieve_last_timestamp(
+            base_currency=base_currency, symbol=symbol, action=action
         )
 
         (
             oldest_data_point,
             newest_data_point,
-        ) = await self.calculate_delta_old_and_new_delta(
-            symbol=symbol, start_date=self.start_date, existing_data=existing_data
+        ) = self.calculate_delta_old_and_new_delta(
+            start_date=self.start_date, last_timestamp=last_timestamp
         )
 
-        orderbook_data = await self._retrieve_orderbook_data(
-            symbol=symbol,
-            oldest_data_point=oldest_data_point,
-            newest_data_point=newest_data_point,
-        )
+        written = []
+        for checkpoint_oldest, checkpoint_newest in self.checkpoint_ranges(
+            oldest_data_point=oldest_data_point, newest_data_point=newest_data_point
+        ):
+            orderbook_data = await self._retrieve_orderbook_data(
+                base_currency=base_currency,
+                symbol=symbol,
+                oldest_data_point=checkpoint_oldest,
+                newest_data_point=checkpoint_newest,
+            )
+            if not to_write:
+                continue
+
+            if not self.journal.is_started(base_currency, symbol):
+                if action == "recreate":
+                    self.storage.remove(base_currency, symbol, self.window_size)
+                    if self.deriver is not None:
+                        self.deriver.remove(base_currency, symbol)
+                self.journal.mark_started(base_currency, symbol)
+
+            logger.info(f"Writing {symbol}/{base_currency} up to {checkpoint_newest}")
+            written.append(
+                await self.write_orderbook_data(
+                    base_currency=base_currency,
+                    symbol=symbol,
+                    orderbook_data=orderbook_data,
+                    last_timestamp=last_timestamp,
+                )
+            )
+
+        if to_write:
+            self._completions.append(
+                asyncio.create_task(
+                    self._complete_when_written(base_currency, symbol, written)
+                )
+            )
+        return
+
+    async def _repair_gaps(
+        self, base_currency: str, symbol: str, to_write: bool
+    ) -> None:
+        """Retrieves only the candles that are missing between the stored candles and
+        merges them into the storage, so the cost of a repair follows from the size
+        of the gaps instead of the length of the history.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param to_write: Whether the data has to be written to a file or not.
+        """
+        written = []
+        for first, last in self.find_gaps(base_currency, symbol):
+            klines = await self._get_klines_range(
+                base_currency=base_currency,
+                symbol=symbol,
+                start_time=self.datetime_to_milliseconds(first),
+                end_time=self.datetime_to_milliseconds(last),
+            )
+            if len(klines) == 0:
+                # the exchange itself has no candles e.g. during its own outage
+                logger.info(f"No candles of {symbol}/{base_currency} from {first}")
+                continue
+            if not to_write:
+                continue
+
+            logger.info(f"Filling {symbol}/{base_currency} from {first} up to {last}")
+            written.append(
+                await self.write_orderbook_data(
+                    base_currency=base_currency,
+                    symbol=symbol,
+                    orderbook_data=decode_klines(
+                        klines=klines,
+                        symbol=symbol,
+                        compact=self.storage.compact_schema,
+                    ),
+                    last_timestamp=None,
+                    merge=True,
+                )
+            )
+
         if to_write:
-            logger.info(f"Writing {symbol}/{self.current_currency}")
-            self.write_orderbook_data(
-                orderbook_data=orderbook_data,
-                existing_data_df=existing_data,
-                filename=filename,
+            # the derived candles around the gaps are derived again once written,
+            # see IntervalDeriver.invalidate
+            self._completions.append(
+                asyncio.create_task(
+                    self._complete_when_written(base_currency, symbol, written)
+                )
             )
         return
 
+    def find_gaps(self, base_currency: str, symbol: str) -> List:
+        """Returns the ranges of candles that are missing in the storage, they are
+        only looked up once per run.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        """
+        pair = (base_currency, symbol)
+        if pair not in self.gaps:
+            self.gaps[pair] = self.storage.gaps(base_currency, symbol, self.window_size)
+        return self.gaps[pair]
+
+    async def _complete_when_written(
+        self, base_currency: str, symbol: str, written: List
+    ) -> None:
+        """Marks a pair as completed in the journal once all its data is written, and
+        the derived intervals are updated.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param written: The futures of the writes of the pair.
+        """
+        await asyncio.gather(*written)
+        if self.deriver is not None:
+            try:
+                await self.writer.call(self.deriver.derive, base_currency, symbol)
+            except Exception as e:
+                logger.error(f"Failed deriving {symbol}/{base_currency}: {e!r}")
+                return
+        self.journal.mark_completed(base_currency, symbol)
+        return
+
+    def checkpoint_ranges(
+        self, oldest_data_point: datetime, newest_data_point: datetime
+    ) -> List:
+        """Splits a range of candles into consecutive ranges of at most
+        checkpoint_pages pages.
+
+        :param oldest_data_point: The oldest data point that is retrieved.
+        :param newest_data_point: The newest data point that is retrieved.
+        """
+        window = timedelta(milliseconds=self.cost_model.window_size_ms)
+        checkpoint = self.checkpoint_pages * self.cost_model.page_limit * window
+
+        ranges = [
+            (
+                oldest_data_point,
+                min(oldest_data_point + checkpoint - window, newest_data_point),
+            )
+        ]
+        while ranges[-1][1] + window <= newest_data_point:
+            checkpoint_oldest = ranges[-1][1] + window
+            ranges.append(
+                (
+                    checkpoint_oldest,
+                    min(checkpoint_oldest + checkpoint - window, newest_data_point),
+                )
+            )
+        return ranges
+
     async def set_client(self, key: str, secret: str) -> AsyncClient:
         """Creates a connection to the desired crypto exchange api.
 
@@ -288,39 +470,90 @@ class Orderbook:
         """
         self.key = key
         self.secret = secret
-        self.client = await AsyncClient.create(api_key=self.key, api_secret=self.secret)
+        client = await AsyncClient.create(api_key=self.key, api_secret=self.secret)
+        return self.use_client(client)
+
+    def use_client(self, client: AsyncClient) -> AsyncClient:
+        """Uses the given client, e.g. one connected to a fake exchange, with all its
+        requests routed through the rate limiter.
+
+        :param client: The client of the exchange.
+        """
+        self.client = client
+        self.rate_limiter.wrap_client(
+            client=self.client,
+            request_weight=self.cost_model.request_weight,
+            controller=self.concurrency,
+        )
         return self.client
 
     @backoff.on_exception(backoff.expo, asyncio.TimeoutError, max_tries=3)
-    async def _minutes_of_new_data(self, symbol: str) -> int:
-        """Retrieves the latest unix timestamp that data is available for given pair
+    async def determine_newest_data_point(self) -> datetime:
+        """Retrieves the opening time of the newest candle that is closed.
 
-        :param symbol: The tickername + BTC e.g. USDT/BTC
+        This is derived from the time of the exchange, so it only takes a single
+        request per run instead of one per symbol.
         """
+        server_time = await self.client.get_server_time()
+        window_size_ms = self.cost_model.window_size_ms
+        current_candle_timestamp = (
+            server_time["serverTime"] // window_size_ms * window_size_ms
+        )
+        return datetime.utcfromtimestamp(
+            (current_candle_timestamp - window_size_ms) / 1000
+        )
+
+    async def _get_klines_data(
+        self,
+        base_currency: str,
+        symbol: str,
+        oldest_data_point: datetime,
+        newest_data_point: datetime,
+    ) -> List:
+        """Retrieves the specified data from the exchange.
 
-        data = await self.client.get_klines(
-            symbol=symbol + self.current_currency.upper(), interval=self.window_size
+        When backfill_concurrency allows it, the pages are retrieved concurrently
+        instead of one after the other.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param oldest_data_point: The oldest available data point from the given startdate.
+        :param newest_data_point: The newest available data point.
+        """
+        if self.backfill_concurrency > 1:
+            return await self._get_klines_data_sharded(
+                base_currency=base_currency,
+                symbol=symbol,
+                oldest_data_point=oldest_data_point,
+                newest_data_point=newest_data_point,
+            )
+        return await self._get_historical_klines(
+            base_currency=base_currency,
+            symbol=symbol,
+            oldest_data_point=oldest_data_point,
+            newest_data_point=newest_data_point,
         )
-        return data[-1][0]
 
     @backoff.on_exception(
         backoff.expo, (asyncio.TimeoutError, BinanceAPIException), max_tries=5
     )
-    async def _get_klines_data(
+    async def _get_historical_klines(
         self,
+        base_currency: str,
         symbol: str,
         oldest_data_point: datetime,
         newest_data_point: datetime,
     ) -> List:
-        """Retrieves the specified data from the exchange.
+        """Retrieves the specified data from the exchange, one page after the other.
 
+        :param base_currency: The base currency against which the data is retrieved.
         :param symbol: The tickername + BTC e.g. USDT/BTC
         :param oldest_data_point: The oldest available data point from the given startdate.
         :param newest_data_point: The newest available data point.
         """
 
         # set correct symbol
-        symbol = symbol + self.current_currency.upper()
+        symbol = symbol + base_currency.upper()
         klines = await self.client.get_historical_klines(
             symbol,
             self.window_size,
@@ -329,153 +562,248 @@ class Orderbook:
         )
         return klines
 
-    async def calculate_delta_old_and_new_delta(
-        self, symbol: str, start_date: str, existing_data: pl.DataFrame
+    async def _get_klines_data_sharded(
+        self,
+        base_currency: str,
+        symbol: str,
+        oldest_data_point: datetime,
+        newest_data_point: datetime,
+    ) -> List:
+        """Retrieves the specified data from the exchange in concurrent shards.
+
+        No shards are retrieved from before the symbol was listed, see
+        get_listing_time.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param oldest_data_point: The oldest available data point from the given startdate.
+        :param newest_data_point: The newest available data point.
+        """
+        listing_time = await self.get_listing_time(
+            base_currency=base_currency, symbol=symbol
+        )
+        if listing_time is None:
+            return []
+
+        return await self._get_klines_range(
+            base_currency=base_currency,
+            symbol=symbol,
+            start_time=max(
+                self.datetime_to_milliseconds(oldest_data_point), listing_time
+            ),
+            end_time=self.datetime_to_milliseconds(newest_data_point),
+        )
+
+    async def get_listing_time(self, base_currency: str, symbol: str) -> Optional[int]:
+        """Returns the unix timestamp in ms of the first candle of a symbol, or None
+        if it has no candles.
+
+        It is requested once per pair and kept, so the checkpoints of a long
+        backfill do not request it again, as the cost model assumes.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        """
+        pair = (base_currency, symbol)
+        if pair not in self.listing_times:
+            earliest_candle = await self._get_klines_page(
+                base_currency=base_currency,
+                symbol=symbol,
+                start_time=0,
+                end_time=None,
+                limit=1,
+            )
+            self.listing_times[pair] = (
+                earliest_candle[0][0] if len(earliest_candle) > 0 else None
+            )
+        return self.listing_times[pair]
+
+    async def _get_klines_range(
+        self, base_currency: str, symbol: str, start_time: int, end_time: int
+    ) -> List:
+        """Retrieves the candles between two timestamps in shards of exactly one
+        page, which are retrieved concurrently and stitched back together in order.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param start_time: The unix timestamp in ms of the first candle.
+        :param end_time: The unix timestamp in ms of the last candle.
+        """
+        shard_size = self.cost_model.page_limit * self.cost_model.window_size_ms
+
+        semaphore = asyncio.Semaphore(self.backfill_concurrency)
+
+        async def _get_shard(shard_start_time: int) -> List:
+            async with semaphore:
+                return await self._get_klines_page(
+                    base_currency=base_currency,
+                    symbol=symbol,
+                    start_time=shard_start_time,
+                    end_time=min(shard_start_time + shard_size - 1, end_time),
+                    limit=self.cost_model.page_limit,
+                )
+
+        shards = await asyncio.gather(
+            *[
+                _get_shard(shard_start_time)
+                for shard_start_time in range(start_time, end_time + 1, shard_size)
+            ]
+        )
+
+        klines = []
+        for shard in shards:
+            for kline in shard:
+                # the shards should not overlap, but never store a candle twice
+                if len(klines) == 0 or kline[0] > klines[-1][0]:
+                    klines.append(kline)
+        return klines
+
+    @backoff.on_exception(
+        backoff.expo, (asyncio.TimeoutError, BinanceAPIException), max_tries=5
+    )
+    async def _get_klines_page(
+        self,
+        base_currency: str,
+        symbol: str,
+        start_time: int,
+        end_time: Optional[int],
+        limit: int,
+    ) -> List:
+        """Retrieves a single page of data from the exchange.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC
+        :param start_time: The unix timestamp in ms of the first candle of the page.
+        :param end_time: The unix timestamp in ms of the last candle of the page.
+        :param limit: The maximum number of candles in the page.
+        """
+        params = {
+            "symbol": symbol + base_currency.upper(),
+            "interval": self.window_size,
+            "startTime": start_time,
+            "limit": limit,
+        }
+        if end_time is not None:
+            params["endTime"] = end_time
+        return await self.client.get_klines(**params)
+
+    @staticmethod
+    def datetime_to_milliseconds(date: datetime) -> int:
+        """Converts a naive datetime in UTC to a unix timestamp in ms."""
+        return int(date.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+    def calculate_delta_old_and_new_delta(
+        self, start_date: str, last_timestamp: Optional[datetime]
     ) -> tuple[datetime, datetime]:
         """Calculates how much time is between the newest data and given starting point.
 
-        :param symbol: The tickername + BTC e.g. USDT/BTC
-        :param existing_data: If applicable, this contains previously saved data of the orderbooks.
+        :param start_date: The date from which the data should be retrieved.
+        :param last_timestamp: If applicable, the timestamp of the newest previously
+        saved data of the orderbooks.
         """
-        if len(existing_data) > 0:
-            oldest_data_point = existing_data["timestamp"][-1]
+        if last_timestamp is not None:
+            oldest_data_point = last_timestamp
         else:
             oldest_data_point = datetime.strptime(start_date, "%d-%m-%Y")
 
-        newest_data_point_timestamp = await self._minutes_of_new_data(symbol=symbol)
+        return oldest_data_point, self.newest_data_point
 
-        newest_data_point = datetime.fromtimestamp(newest_data_point_timestamp / 1000)
-        return oldest_data_point, newest_data_point
+    def _retrieve_last_timestamp(
+        self, base_currency: str, symbol: str, action: str
+    ) -> Optional[datetime]:
+        """Retrieves the timestamp of the newest existing data from the storage.
 
-    @staticmethod
-    def determine_sleep_period() -> int:
-        """Calculates the time until the start of the next minute"""
-        minute = 60
-        safety_margin = 2
-        current_time = datetime.now()
-        sleep_period = (minute - current_time.second) + safety_margin
-        return sleep_period
-
-    def _retrieve_existing_data(
-        self, symbol: str, action: str
-    ) -> tuple[pl.DataFrame, str]:
-        """Retrieves existing data from the destination directory or creates empty dataframe
+        Only the watermark of the storage is read, the existing data itself is not
+        loaded. A pair that is already stored continues from its newest stored
+        candle, also when creating, so running create twice does not store the history
+        twice. When recreating, the existing data is ignored here, it is removed once
+        its replacement is retrieved, unless the pair was started by an unfinished
+        run.
 
+        :param base_currency: The base currency against which the data is retrieved.
         :param symbol: The tickername + BTC e.g. USDT/BTC.
         :param action: The action to perform. Can be "create", "update", "retrieve".
         """
-        filename = "%s/%s-%s-orderbook.csv" % (
-            self.current_path,
-            symbol,
-            self.window_size,
-        )
-        file_exists = os.path.isfile(filename)
-
-        if file_exists and action == "recreate":
-            os.remove(filename)
-            df = pl.DataFrame()
-        elif file_exists and action == "update":
-            df = pl.read_csv(
-                file=filename,
-                dtypes=[
-                    pl.Datetime,
-                    pl.Datetime,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Float64,
-                    pl.datatypes.Int64,
-                ],
-            )
-            df = df.with_columns(
-                [
-                    pl.col("timestamp").dt.cast_time_unit("ms"),
-                    pl.col("close_time").dt.cast_time_unit("ms"),
-                ]
+        data_exists = self.storage.exists(base_currency, symbol, self.window_size)
+
+        if data_exists and (
+            action != "recreate" or self.journal.is_started(base_currency, symbol)
+        ):
+            last_timestamp = self.storage.last_timestamp(
+                base_currency, symbol, self.window_size
             )
         else:
             # initial load
-            df = pl.DataFrame()
-        return df, filename
+            last_timestamp = None
+        return last_timestamp
 
     async def _retrieve_orderbook_data(
-        self, symbol: str, oldest_data_point: datetime, newest_data_point: datetime
+        self,
+        base_currency: str,
+        symbol: str,
+        oldest_data_point: datetime,
+        newest_data_point: datetime,
     ) -> pl.DataFrame:
         """Retrieves new data from the exchange and transforms it into the desired
         configuration.
 
+        :param base_currency: The base currency against which the data is retrieved.
         :param symbol: The tickername + BTC e.g. USDT/BTC.
         :param oldest_data_point: The oldest available data point from the given startdate.
         :param newest_data_point: The newest available data point.
         """
-        columns = [
-            "timestamp",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "close_time",
-            "quote_av",
-            "trades",
-            "tb_base_av",
-            "tb_quote_av",
-            "ignore",
-        ]
-
         klines = await self._get_klines_data(
+            base_currency=base_currency,
             symbol=symbol,
             oldest_data_point=oldest_data_point,
             newest_data_point=newest_data_point,
         )
 
-        orderbook_data = pl.DataFrame(klines, columns=columns)
-        orderbook_data = orderbook_data.select(
-            [
-                pl.col(["timestamp", "close_time"]).cast(pl.Datetime("ms")),
-                pl.col(
-                    [
-                        "open",
-                        "high",
-                        "low",
-                        "close",
-                        "volume",
-                        "quote_av",
-                        "tb_base_av",
-                        "tb_quote_av",
-                    ]
-                ).cast(pl.Float64),
-                pl.col("trades"),
-                pl.lit(symbol).alias("symbol"),
-            ]
+        orderbook_data = decode_klines(
+            klines=klines, symbol=symbol, compact=self.storage.compact_schema
         )
 
         return orderbook_data
 
-    @staticmethod
-    def write_orderbook_data(
-        orderbook_data: pl.DataFrame, existing_data_df: pl.DataFrame, filename: str
-    ) -> None:
-        """Writes the retrieved data to disk.
+    async def write_orderbook_data(
+        self,
+        base_currency: str,
+        symbol: str,
+        orderbook_data: pl.DataFrame,
+        last_timestamp: Optional[datetime],
+        merge: bool = False,
+    ) -> asyncio.Future:
+        """Hands the retrieved data to the writer, that writes it to the storage.
+
+        Only the candles that are newer than the previously saved data are written,
+        the existing data itself is never rewritten. This only waits when the queue
+        of the writer is full, not for the write itself, it returns a future that is
+        done once the data is written.
 
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername + BTC e.g. USDT/BTC.
         :param orderbook_data: The newly retrieved orderbook data.
-        :param existing_data_df: The dataframe that contains the (if applicable)
-        previous saved data that will be appended to.
-        :param filename: The name of the file to be saved.
+        :param last_timestamp: The timestamp of the (if applicable) previous saved
+        data that will be appended to.
+        :param merge: Whether the data fills a gap in the history, candles of which
+        the timestamp is already stored are then skipped.
         """
-        file_exists = len(existing_data_df) > 0
-        if file_exists:
-            # drop first row to prevent duplicates when concatenating dataframes
-            orderbook_data = orderbook_data[1:]
-            orderbook_data = existing_data_df.vstack(orderbook_data)
-
-        # necessary otherwise the record with be written with a "T" between date and time
-        orderbook_data = orderbook_data.with_column(
-            pl.col("timestamp").dt.strftime("%Y-%m-%d %H:%M:%S")
+        if last_timestamp is not None:
+            # drop the overlapping candles to prevent duplicates
+            orderbook_data = orderbook_data.filter(pl.col("timestamp") > last_timestamp)
+
+        written = await self.writer.put(
+            base_currency, symbol, self.window_size, orderbook_data, merge=merge
+        )
+        written.add_done_callback(
+            lambda future: self._on_written(base_currency, symbol, future)
         )
-        orderbook_data.write_csv(file=filename)
+        return written
+
+    @staticmethod
+    def _on_written(base_currency: str, symbol: str, written: asyncio.Future) -> None:
+        if written.exception() is not None:
+            logger.error(
+                f"Failed writing {symbol}/{base_currency}: {written.exception()!r}"
+            )
         return
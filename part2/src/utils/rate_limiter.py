@@ -0,0 +1,148 @@
+import asyncio
+import time
+from typing import Callable, Mapping
+
+USED_WEIGHT_HEADERS = ["x-mbx-used-weight-1m", "x-mbx-used-weight"]
+# statuses with which the exchange rejects requests that exceed the limits
+THROTTLED_STATUSES = [429, 418]
+
+
+class RateLimiter:
+    def __init__(self, limit: int = 1200, period: int = 60):
+        """Asynchronous token bucket that keeps the requests within the weight limit
+        of the exchange.
+
+        Tokens flow back continuously at limit / period per second, so a request is
+        let through the moment there is budget for it. Next to that the weight the
+        exchange reports as used in its current window is tracked, which accounts for
+        requests made outside of this limiter and for weights that were estimated
+        too low.
+
+        :param limit: The maximum weight that can be used within a period.
+        :param period: The length of the window of the exchange in seconds.
+        """
+        self.limit = limit
+        self.period = period
+        self.rate = limit / period
+        self.used_weight = 0
+        self._tokens = float(limit)
+        self._last_refill = time.monotonic()
+        self._window = self._current_window()
+        self._lock = asyncio.Lock()
+
+    def _current_window(self) -> int:
+        return int(time.time() // self.period)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.limit, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+        window = self._current_window()
+        if window != self._window:
+            self._window = window
+            self.used_weight = 0
+        return
+
+    def _wait_time(self, weight: int) -> float:
+        """Calculates how long it takes before the given weight fits in the budget."""
+        wait_time = 0.0
+        if self._tokens < weight:
+            wait_time = (weight - self._tokens) / self.rate
+        if self.used_weight + weight > self.limit:
+            window_end = (self._window + 1) * self.period
+            wait_time = max(wait_time, window_end - time.time())
+        return max(wait_time, 0.01)
+
+    async def acquire(self, weight: int = 1) -> int:
+        """Waits until the given weight fits in the budget and reserves it.
+
+        Returns the window of the exchange in which the weight is reserved.
+
+        :param weight: The weight of the request that is about to be made.
+        """
+        weight = min(weight, self.limit)
+        async with self._lock:
+            while True:
+                self._refill()
+                if weight <= self._tokens and self.used_weight + weight <= self.limit:
+                    self._tokens -= weight
+                    self.used_weight += weight
+                    return self._window
+                await asyncio.sleep(self._wait_time(weight))
+
+    def update(self, headers: Mapping, window: int = None) -> None:
+        """Synchronizes the used weight with the weight reported by the exchange.
+
+        :param headers: The headers of a response of the exchange.
+        :param window: The window in which the request was made, the update is
+               ignored when the window of the exchange has passed since.
+        """
+        self._refill()
+        if window is not None and window != self._window:
+            return
+
+        for header in USED_WEIGHT_HEADERS:
+            if header in headers:
+                self.used_weight = max(self.used_weight, int(headers[header]))
+                break
+        return
+
+    def block(self, seconds: float) -> None:
+        """Lets no request through for the given number of seconds, e.g. after the
+        exchange answered with a Retry-After.
+
+        :param seconds: The number of seconds to block.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+        return
+
+    def wrap_client(
+        self,
+        client,
+        request_weight: Callable[[str, dict], int] = None,
+        controller=None,
+    ) -> None:
+        """Routes all the requests of a python-binance AsyncClient through the rate
+        limiter.
+
+        :param client: The AsyncClient of which the requests should be limited.
+        :param request_weight: Function that gives the weight of a request, given the
+               uri and the keyword arguments of the request.
+        :param controller: An AdaptiveConcurrency that limits the number of requests
+               in flight, it is told the latency and the throttles of the responses.
+        """
+        if request_weight is None:
+            request_weight = lambda uri, kwargs: 1
+
+        async def _send(method, uri, signed, force_params=False, **kwargs):
+            window = await self.acquire(request_weight(uri, kwargs))
+            kwargs = client._get_request_kwargs(method, signed, force_params, **kwargs)
+            start_time = time.monotonic()
+            async with getattr(client.session, method)(uri, **kwargs) as response:
+                client.response = response
+                self.update(response.headers, window)
+
+                if response.status in THROTTLED_STATUSES:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                    self.block(retry_after)
+                    if controller is not None:
+                        controller.on_throttled(response.status, retry_after)
+                elif controller is not None:
+                    controller.on_response(
+                        latency=time.monotonic() - start_time,
+                        used_weight_fraction=self.used_weight / self.limit,
+                    )
+                return await client._handle_response(response)
+
+        async def _request(method, uri, signed, force_params=False, **kwargs):
+            if controller is None:
+                return await _send(method, uri, signed, force_params, **kwargs)
+            async with controller.slot():
+                return await _send(method, uri, signed, force_params, **kwargs)
+
+        client._request = _request
+        return
@@ -0,0 +1,403 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import polars as pl
+from binance.helpers import interval_to_milliseconds
+
+# the exchange starts its weekly candles on monday, 4 days after the unix epoch
+EPOCH = datetime(1970, 1, 1)
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+OHLCV_AGGREGATIONS = {
+    "open": pl.col("open").first(),
+    "high": pl.col("high").max(),
+    "low": pl.col("low").min(),
+    "close": pl.col("close").last(),
+    "volume": pl.col("volume").sum(),
+    "quote_av": pl.col("quote_av").sum(),
+    "tb_base_av": pl.col("tb_base_av").sum(),
+    "tb_quote_av": pl.col("tb_quote_av").sum(),
+    "trades": pl.col("trades").sum(),
+}
+
+
+def interval_to_timedelta(interval: str) -> timedelta:
+    """Converts an interval of the exchange e.g. 5m to a timedelta.
+
+    :param interval: The interval of the candles e.g. 5m.
+    """
+    interval_ms = interval_to_milliseconds(interval)
+    if interval_ms is None:
+        raise ValueError(f"Unsupported interval {interval}")
+    return timedelta(milliseconds=interval_ms)
+
+
+def alignment(interval: str) -> Tuple[int, int]:
+    """Returns the length of the candles of an interval and the offset of their
+    opening times from the unix epoch, both in ms.
+
+    :param interval: The interval of the candles e.g. 1h.
+    """
+    interval_ms = interval_to_timedelta(interval) // timedelta(milliseconds=1)
+    offset = WEEK_OFFSET_MS if interval.endswith("w") else 0
+    return interval_ms, offset
+
+
+def bucket_start(interval: str) -> pl.Expr:
+    """Returns the opening time of the candle of the interval that every timestamp
+    falls in, aligned like the candles of the exchange.
+
+    :param interval: The interval of the candles e.g. 1h.
+    """
+    interval_ms, offset = alignment(interval)
+    epoch = pl.col("timestamp").dt.epoch("ms")
+    return ((epoch - offset) // interval_ms * interval_ms + offset).cast(
+        pl.Datetime("ms")
+    )
+
+
+def resample_ohlcv(
+    df: Union[pl.DataFrame, pl.LazyFrame], interval: str, by: str = None
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """Aggregates candles into the candles of a coarser interval, exactly as the
+    exchange does: the first open, the highest high, the lowest low, the last close
+    and the summed volumes and trades.
+
+    Only the columns that are present are aggregated. The candles have to be sorted
+    by time, per value of the by column.
+
+    :param df: The candles to aggregate.
+    :param interval: The interval of the aggregated candles e.g. 1h.
+    :param by: The column to aggregate separately, e.g. "symbol".
+    """
+    keys = ([] if by is None else [by]) + ["timestamp"]
+    return (
+        df.with_column(bucket_start(interval).alias("timestamp"))
+        .groupby(keys, maintain_order=True)
+        .agg(
+            [
+                aggregation
+                for column, aggregation in OHLCV_AGGREGATIONS.items()
+                if column in df.columns
+            ]
+        )
+    )
+
+
+def pyramid_sources(intervals: List) -> Dict[str, Optional[str]]:
+    """Determines from which of the other intervals every interval is aggregated.
+
+    An interval is aggregated from the largest interval of which every candle falls
+    within a single candle of the interval, e.g. 1w from 1d but not from 3d. Without
+    such an interval, None, it is aggregated from the base candles.
+
+    :param intervals: The intervals of the pyramid e.g. ["1h", "4h", "1d", "1w"].
+    """
+    sources: Dict[str, Optional[str]] = {}
+    for interval in sorted(set(intervals), key=lambda interval: alignment(interval)):
+        interval_ms, offset = alignment(interval)
+        divisors = [
+            source
+            for source in sources
+            if interval_ms % alignment(source)[0] == 0
+            and (offset - alignment(source)[1]) % alignment(source)[0] == 0
+        ]
+        sources[interval] = max(divisors, key=alignment, default=None)
+    return sources
+
+
+def build_pyramid(
+    df: Union[pl.DataFrame, pl.LazyFrame], intervals: List, by: str = None
+) -> Dict[str, Union[pl.DataFrame, pl.LazyFrame]]:
+    """Aggregates the base candles into the candles of every interval, each interval
+    from the largest other interval that it is an exact multiple of, see
+    pyramid_sources.
+
+    The base candles are only aggregated once, into the smallest intervals. Given a
+    scan, the intervals are cached scans, so a query that combines several of them
+    computes every interval once.
+
+    :param df: The base candles, sorted by time per value of the by column.
+    :param intervals: The intervals to build e.g. ["1h", "4h", "1d", "1w"].
+    :param by: The column to aggregate separately, e.g. "symbol".
+    """
+    pyramid = {}
+    for interval, source in pyramid_sources(intervals).items():
+        pyramid[interval] = resample_ohlcv(
+            df if source is None else pyramid[source], interval, by=by
+        )
+        if isinstance(pyramid[interval], pl.LazyFrame):
+            pyramid[interval] = pyramid[interval].cache()
+    return {interval: pyramid[interval] for interval in intervals}
+
+
+class IntervalDeriver:
+    def __init__(self, storage, base_interval: str, intervals: List):
+        """Builds the candles of coarser intervals from the stored candles of the base
+        interval, so only the base interval has to be retrieved from the exchange.
+
+        Only closed candles are stored. Every derivation continues after the newest
+        stored candle of an interval, so it only reads the base candles that were
+        added since. When base candles are added in between the stored ones, e.g. by
+        a repair, the intervals derived before then are derived again, see
+        invalidate.
+
+        :param storage: The backend in which the data is stored.
+        :param base_interval: The interval that is retrieved e.g. 5m.
+        :param intervals: The intervals to derive e.g. ["1h", "4h", "1d"], each a
+               multiple of the base interval.
+        """
+        base = interval_to_timedelta(base_interval)
+        for interval in intervals:
+            if interval_to_timedelta(interval) % base or interval == base_interval:
+                raise ValueError(
+                    f"{interval} can not be derived from {base_interval} candles"
+                )
+
+        self.storage = storage
+        self.base_interval = base_interval
+        self.intervals = intervals
+
+    def derive(self, base_currency: str, symbol: str) -> None:
+        """Adds the candles of every interval that closed since the previous
+        derivation.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        """
+        self.update(base_currency, symbols=[symbol])
+        return
+
+    def update(self, base_currency: str, symbols: List = None) -> None:
+        """Adds the candles of every interval that closed since the previous
+        derivation, for many symbols at once.
+
+        The base candles of every symbol are read from its own oldest candle that is
+        not stored yet in any of the intervals, so usually only the candles of the
+        last open candle of the largest interval. A symbol that stopped trading, or
+        a new one, does not make the other symbols read further back. Symbols of
+        which no candle closed since the previous derivation are not read at all.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbols: The symbols to update, by default all stored symbols.
+        """
+        if symbols is None:
+            symbols = self.storage.symbols(base_currency, self.base_interval)
+        if len(symbols) == 0:
+            return
+        self.invalidate(base_currency, symbols)
+        next_candles = {
+            interval: self.next_candles(base_currency, interval, symbols)
+            for interval in self.intervals
+        }
+
+        # the base candles up to the newest one close the candles that start at
+        # least an interval before it
+        base_ms = interval_to_timedelta(self.base_interval) // timedelta(milliseconds=1)
+        newest_closes = {}
+        for symbol in symbols:
+            last_timestamp = self.storage.last_timestamp(
+                base_currency, symbol, self.base_interval
+            )
+            if last_timestamp is not None:
+                newest_closes[symbol] = (last_timestamp - EPOCH) // timedelta(
+                    milliseconds=1
+                ) + base_ms
+        closed = set()
+        for interval, df in next_candles.items():
+            window_ms = interval_to_timedelta(interval) // timedelta(milliseconds=1)
+            closed |= {
+                symbol
+                for symbol, next_candle in zip(df["symbol"], df["next_candle"])
+                if newest_closes.get(symbol, -1) >= next_candle + window_ms
+            }
+        starts = {
+            symbol: start
+            for symbol, start in self.watermarks(next_candles).items()
+            if symbol in closed
+        }
+        if len(starts) == 0:
+            return
+        df = self.scan_from(
+            lambda symbols, start: self.storage.scan_universe(
+                base_currency, self.base_interval, symbols=symbols, start=start
+            ),
+            starts,
+        ).collect()
+        if len(df) == 0:
+            return
+
+        # a candle is closed once the base candle that closes it is stored
+        newest_close = df.groupby("symbol").agg(
+            (
+                pl.col("timestamp").max().cast(pl.Datetime("ms"))
+                + interval_to_timedelta(self.base_interval)
+            ).alias("newest_close")
+        )
+        for interval, df_next in next_candles.items():
+            window = interval_to_timedelta(interval)
+            candles = (
+                resample_ohlcv(self.unstored(df, df_next), interval, by="symbol")
+                .join(newest_close, on="symbol", how="left")
+                .filter(pl.col("timestamp") + window <= pl.col("newest_close"))
+                .with_column(
+                    (pl.col("timestamp") + window - timedelta(milliseconds=1)).alias(
+                        "close_time"
+                    )
+                )
+                .select(df.columns)
+            )
+            for symbol_candles in candles.partition_by("symbol"):
+                self.storage.append(
+                    base_currency,
+                    symbol_candles["symbol"][0],
+                    interval,
+                    symbol_candles,
+                )
+        return
+
+    def next_candles(
+        self, base_currency: str, interval: str, symbols: List
+    ) -> pl.DataFrame:
+        """Returns per symbol the opening time, in ms, of the first candle of the
+        interval that is not stored yet, without reading any data.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param interval: The interval of the candles e.g. 1h.
+        :param symbols: The symbols to check.
+        """
+        window_ms = interval_to_timedelta(interval) // timedelta(milliseconds=1)
+        last_timestamps = [
+            self.storage.last_timestamp(base_currency, symbol, interval)
+            for symbol in symbols
+        ]
+        return pl.DataFrame(
+            {
+                "symbol": list(symbols),
+                "next_candle": [
+                    0
+                    if last_timestamp is None
+                    else (last_timestamp - EPOCH) // timedelta(milliseconds=1)
+                    + window_ms
+                    for last_timestamp in last_timestamps
+                ],
+            }
+        )
+
+    @staticmethod
+    def watermarks(next_candles: Dict[str, pl.DataFrame]) -> Dict[str, datetime]:
+        """Returns per symbol the oldest candle that is not stored yet in any of the
+        intervals, from which its base candles have to be read.
+
+        :param next_candles: Per interval the result of next_candles.
+        """
+        df = (
+            pl.concat(list(next_candles.values()))
+            .groupby("symbol")
+            .agg(pl.col("next_candle").min())
+        )
+        return {
+            symbol: EPOCH + timedelta(milliseconds=next_candle)
+            for symbol, next_candle in zip(df["symbol"], df["next_candle"])
+        }
+
+    @staticmethod
+    def scan_from(
+        scan: Callable[[List, datetime], pl.LazyFrame], starts: Dict[str, datetime]
+    ) -> pl.LazyFrame:
+        """Scans every symbol from its own start. The symbols with the same start,
+        usually nearly all of them, are scanned together.
+
+        :param scan: Scans the given symbols from the given start.
+        :param starts: The oldest candle to scan per symbol.
+        """
+        symbols_per_start = {}
+        for symbol, start in starts.items():
+            symbols_per_start.setdefault(start, []).append(symbol)
+        scans = [
+            scan(sorted(symbols), start)
+            for start, symbols in sorted(symbols_per_start.items())
+        ]
+        # the symbols are categorical in a compact storage, separate scans only
+        # combine as strings
+        scans = [
+            df.with_column(pl.col("symbol").cast(pl.Utf8))
+            for df in scans
+            if len(df.columns) > 0
+        ]
+        if len(scans) == 0:
+            return pl.DataFrame().lazy()
+        return pl.concat(scans).sort(["symbol", "timestamp"])
+
+    @staticmethod
+    def unstored(
+        df: Union[pl.DataFrame, pl.LazyFrame], next_candles: pl.DataFrame
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Selects the base candles that fall in candles that are not stored yet.
+
+        :param df: The base candles of many symbols.
+        :param next_candles: The first candle that is not stored yet per symbol, see
+               next_candles.
+        """
+        if isinstance(df, pl.LazyFrame):
+            next_candles = next_candles.lazy()
+        return (
+            df.with_column(pl.col("symbol").cast(pl.Utf8))
+            .join(next_candles, on="symbol", how="left")
+            .filter(pl.col("timestamp").dt.epoch("ms") >= pl.col("next_candle"))
+            .drop("next_candle")
+        )
+
+    def invalidate(
+        self, base_currency: str, symbols: List, intervals: List = None
+    ) -> None:
+        """Removes the candles of the intervals that were derived before base candles
+        were added in between the stored ones, e.g. by a repair, so they are derived
+        again. Only the manifests are read, see Storage.rewritten_from.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbols: The symbols to check.
+        :param intervals: The intervals to check, by default all derived intervals.
+        """
+        if intervals is None:
+            intervals = self.intervals
+        for symbol in symbols:
+            modified_times = {
+                interval: self.storage.modified_time(base_currency, symbol, interval)
+                for interval in intervals
+            }
+            modified_times = {
+                interval: modified_time
+                for interval, modified_time in modified_times.items()
+                if modified_time is not None
+            }
+            # usually no interval is older than the newest rewrite
+            if len(modified_times) == 0 or (
+                self.storage.rewritten_from(
+                    base_currency,
+                    symbol,
+                    self.base_interval,
+                    since=min(modified_times.values()),
+                )
+                is None
+            ):
+                continue
+
+            for interval, modified_time in modified_times.items():
+                if (
+                    self.storage.rewritten_from(
+                        base_currency, symbol, self.base_interval, since=modified_time
+                    )
+                    is not None
+                ):
+                    self.storage.remove(base_currency, symbol, interval)
+        return
+
+    def remove(self, base_currency: str, symbol: str) -> None:
+        """Removes the candles of every derived interval, e.g. to rebuild them.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        """
+        for interval in self.intervals:
+            self.storage.remove(base_currency, symbol, interval)
+        return
@@ -0,0 +1,864 @@
+import glob
+import json
+import os
+import shutil
+import time
+from abc import ABCMeta, abstractmethod
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import polars as pl
+from binance.helpers import interval_to_milliseconds
+
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CSV_DTYPES = {
+    "timestamp": pl.Datetime,
+    "close_time": pl.Datetime,
+    "open": pl.Float64,
+    "high": pl.Float64,
+    "low": pl.Float64,
+    "close": pl.Float64,
+    "volume": pl.Float64,
+    "quote_av": pl.Float64,
+    "tb_base_av": pl.Float64,
+    "tb_quote_av": pl.Float64,
+    "trades": pl.Int64,
+}
+# the compact schema stores prices and volumes as Float32 (about 7 significant
+# digits), the symbol is derived from the partition when scanning and the close time
+# from the timestamp when reading
+COMPACT_DTYPES = {
+    "timestamp": pl.Datetime("ms"),
+    "open": pl.Float32,
+    "high": pl.Float32,
+    "low": pl.Float32,
+    "close": pl.Float32,
+    "volume": pl.Float32,
+    "quote_av": pl.Float32,
+    "tb_base_av": pl.Float32,
+    "tb_quote_av": pl.Float32,
+    "trades": pl.Int32,
+}
+# the number of rewrites kept in a manifest, older ones are folded together
+MAX_REWRITES = 100
+
+
+def atomic_write(path: str, write: Callable[[str], None]) -> None:
+    """Writes a file via a temporary file that is renamed once it is complete, so a
+    crash never leaves a truncated file behind.
+
+    :param path: The file to write.
+    :param write: Writes the content to the path it is given.
+    """
+    temporary_file = f"{path}.tmp"
+    write(temporary_file)
+    os.replace(temporary_file, path)
+    return
+
+
+class Storage(metaclass=ABCMeta):
+    def __init__(self, base_path: str):
+        """Base class for the backends that persist the orderbook data.
+
+        Every backend stores the candles of one symbol, quoted in one base currency,
+        at one interval and only ever has to be given the newly retrieved candles.
+
+        :param base_path: Directory under which all the data is stored.
+        """
+        self.base_path = base_path
+        self.compact_schema = False
+
+    @abstractmethod
+    def exists(self, base_currency: str, symbol: str, interval: str) -> bool:
+        pass
+
+    @abstractmethod
+    def remove(self, base_currency: str, symbol: str, interval: str) -> None:
+        pass
+
+    @abstractmethod
+    def symbols(self, base_currency: str, interval: str) -> List:
+        pass
+
+    @abstractmethod
+    def scan(self, base_currency: str, symbol: str, interval: str) -> pl.LazyFrame:
+        pass
+
+    @abstractmethod
+    def append(
+        self, base_currency: str, symbol: str, interval: str, df: pl.DataFrame
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def last_timestamp(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[datetime]:
+        pass
+
+    @abstractmethod
+    def modified_time(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[int]:
+        pass
+
+    def compact(
+        self,
+        base_currency: str,
+        symbol: str,
+        interval: str,
+        months: List = None,
+        min_files: int = 2,
+    ) -> None:
+        """Merges the files that appends added, for backends that write a file per
+        append. By default there is nothing to merge."""
+        return
+
+    def rewritten_from(
+        self, base_currency: str, symbol: str, interval: str, since: int
+    ) -> Optional[datetime]:
+        """Returns the oldest candle that was added in between the stored candles
+        since the given time, e.g. by merge, or None if there is none. Candles that
+        were derived from the stored ones before then may be wrong from there on.
+
+        By default this is not kept track of and None is returned.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param since: The time in ns, as returned by modified_time.
+        """
+        return None
+
+    def partition_versions(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Dict[str, int]:
+        """Returns per partition of the stored candles when it last changed, in ns,
+        without reading any data. Partitions are months e.g. "2022-04", by default
+        the whole history is a single partition "all".
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        modified_time = self.modified_time(base_currency, symbol, interval)
+        return {} if modified_time is None else {"all": modified_time}
+
+    def scan_partition(
+        self, base_currency: str, symbol: str, interval: str, partition: str
+    ) -> pl.LazyFrame:
+        """Scans the candles of a single partition, see partition_versions.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param partition: The partition to scan.
+        """
+        return self.scan(base_currency, symbol, interval)
+
+    def read(self, base_currency: str, symbol: str, interval: str) -> pl.DataFrame:
+        """Reads all stored candles of a symbol, or an empty dataframe if there are
+        none.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        if not self.exists(base_currency, symbol, interval):
+            return pl.DataFrame()
+        return self.scan(base_currency, symbol, interval).collect()
+
+    def scan_universe(
+        self,
+        base_currency: str,
+        interval: str,
+        symbols: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans the candles of many symbols as a single frame, sorted by symbol and
+        time, so they can be processed in one query instead of per symbol.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param interval: The interval of the candles e.g. 5m.
+        :param symbols: The symbols to scan, by default all stored symbols.
+        :param start: The oldest candle to scan, by default the first one.
+        :param end: The newest candle to scan, by default the last one.
+        """
+        if symbols is None:
+            symbols = self.symbols(base_currency, interval)
+        scans = [
+            self.scan(base_currency, symbol, interval)
+            for symbol in sorted(symbols)
+            if self.exists(base_currency, symbol, interval)
+        ]
+        if len(scans) == 0:
+            return pl.DataFrame().lazy()
+        return self._between(pl.concat(scans), start, end)
+
+    def gaps(
+        self,
+        base_currency: str,
+        symbol: str,
+        interval: str,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> List:
+        """Finds the candles that are missing between the stored candles, e.g. after
+        an outage of the exchange or a page that failed.
+
+        Only the timestamps are read. Every gap is returned as the timestamps of its
+        first and last missing candle, so a long history with a few holes gives a
+        short list of ranges to retrieve.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param start: The oldest candle to check, by default the first one.
+        :param end: The newest candle to check, by default the last one.
+        """
+        if not self.exists(base_currency, symbol, interval):
+            return []
+
+        window = timedelta(milliseconds=interval_to_milliseconds(interval))
+        timestamps = self._between(
+            self.scan(base_currency, symbol, interval).select("timestamp"), start, end
+        )
+        gaps = (
+            timestamps.select(pl.col("timestamp").unique().sort())
+            .select(
+                [
+                    (pl.col("timestamp").shift(1) + window).alias("first"),
+                    (pl.col("timestamp") - window).alias("last"),
+                ]
+            )
+            .filter(pl.col("last") >= pl.col("first"))
+            .collect()
+        )
+        return list(zip(gaps["first"].to_list(), gaps["last"].to_list()))
+
+    def merge(
+        self, base_currency: str, symbol: str, interval: str, df: pl.DataFrame
+    ) -> None:
+        """Adds candles anywhere in the history, e.g. to fill a gap. Candles of which
+        the timestamp is already stored are skipped, the stored candle is kept.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param df: The candles to add.
+        """
+        if len(df) == 0:
+            return
+        if self.exists(base_currency, symbol, interval):
+            stored = self._between(
+                self.scan(base_currency, symbol, interval).select("timestamp"),
+                df["timestamp"].min(),
+                df["timestamp"].max(),
+            ).collect()
+            df = df.join(stored, on="timestamp", how="anti")
+        self.append(base_currency, symbol, interval, df)
+        return
+
+    @staticmethod
+    def _between(df: pl.LazyFrame, start: datetime, end: datetime) -> pl.LazyFrame:
+        if start is not None:
+            df = df.filter(pl.col("timestamp") >= start)
+        if end is not None:
+            df = df.filter(pl.col("timestamp") <= end)
+        return df
+
+
+class ParquetStorage(Storage):
+    def __init__(
+        self, base_path: str, compression: str = "zstd", compact_schema: bool = False
+    ):
+        """Stores the candles as parquet files, partitioned per symbol and month.
+
+        The layout is <base_path>/base=<BASE>/symbol=<SYMBOL>/interval=<INTERVAL>/
+        month=<YYYY-MM>/<first timestamp>-<last timestamp>.parquet. An update only
+        adds a new file with the new candles to the partition(s) it falls in, so the
+        cost of an update does not depend on the length of the history.
+
+        :param base_path: Directory under which all the data is stored.
+        :param compression: Compression codec of the parquet files.
+        :param compact_schema: Whether to store the candles in the compact schema,
+               see COMPACT_DTYPES, and scan them with a categorical symbol and
+               without close time. This reduces the size on disk and in memory at
+               the cost of precision. The categories of frames of separate scans
+               only match when they are created and combined within a
+               pl.StringCache().
+        """
+        super().__init__(base_path)
+        self.compression = compression
+        self.compact_schema = compact_schema
+
+    def symbol_path(self, base_currency: str, symbol: str, interval: str) -> str:
+        return os.path.join(
+            self.base_path,
+            f"base={base_currency}",
+            f"symbol={symbol}",
+            f"interval={interval}",
+        )
+
+    def manifest_file(self, base_currency: str, symbol: str, interval: str) -> str:
+        return os.path.join(
+            self.symbol_path(base_currency, symbol, interval), "_manifest.json"
+        )
+
+    def catalog(
+        self, base_currency: str = "*", interval: str = "*", start: datetime = None
+    ) -> pl.DataFrame:
+        """Lists every file of the dataset with its partition keys and the time range
+        of its candles, all derived from the paths so no data is read.
+
+        :param base_currency: The base currency of the files, by default all.
+        :param interval: The interval of the files, by default all.
+        :param start: The oldest candle of interest, the files of the months before
+               it are not listed.
+        """
+        pattern = os.path.join(
+            self.base_path,
+            f"base={base_currency}",
+            "symbol=*",
+            f"interval={interval}",
+            "month=*",
+        )
+        month_paths = glob.glob(pattern)
+        if start is not None:
+            month_paths = [
+                month_path
+                for month_path in month_paths
+                if month_path.split("month=")[-1] >= start.strftime("%Y-%m")
+            ]
+        files = [
+            file
+            for month_path in month_paths
+            for file in glob.glob(os.path.join(month_path, "*.parquet"))
+        ]
+
+        rows = []
+        for file in files:
+            *keys, name = os.path.normpath(file).split(os.sep)[-5:]
+            first, last = name.split(".")[0].split("-")
+            rows.append([key.split("=", 1)[1] for key in keys] + [first, last, file])
+
+        columns = ["base_currency", "symbol", "interval", "month", "first", "last"]
+        return pl.DataFrame(
+            rows, columns=columns + ["path"], orient="row"
+        ).with_columns(
+            [pl.col(["first", "last"]).cast(pl.Int64).cast(pl.Datetime("ms"))]
+        )
+
+    def scan_universe(
+        self,
+        base_currency: str,
+        interval: str,
+        symbols: List = None,
+        start: datetime = None,
+        end: datetime = None,
+    ) -> pl.LazyFrame:
+        """Scans the candles of many symbols as a single frame, sorted by symbol and
+        time.
+
+        The files are pruned with the catalog: only the files of the requested
+        symbols whose candles overlap with the requested time range are scanned.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param interval: The interval of the candles e.g. 5m.
+        :param symbols: The symbols to scan, by default all stored symbols.
+        :param start: The oldest candle to scan, by default the first one.
+        :param end: The newest candle to scan, by default the last one.
+        """
+        catalog = self.catalog(base_currency, interval, start=start)
+        if symbols is not None:
+            catalog = catalog.filter(pl.col("symbol").is_in(list(symbols)))
+        if start is not None:
+            catalog = catalog.filter(pl.col("last") >= start)
+        if end is not None:
+            catalog = catalog.filter(pl.col("first") <= end)
+        if len(catalog) == 0:
+            return pl.DataFrame().lazy()
+
+        catalog = catalog.sort(["symbol", "first"])
+        scans = [
+            self._scan_file(file, symbol, interval)
+            for file, symbol in zip(catalog["path"], catalog["symbol"])
+        ]
+        return self._between(self._categorical_symbol(pl.concat(scans)), start, end)
+
+    def partitions(self, base_currency: str, symbol: str, interval: str) -> List:
+        """Returns the paths of all the files of a symbol, sorted by time."""
+        pattern = os.path.join(
+            self.symbol_path(base_currency, symbol, interval), "month=*", "*.parquet"
+        )
+        return sorted(
+            glob.glob(pattern),
+            key=lambda file: int(os.path.basename(file).split("-")[0]),
+        )
+
+    def exists(self, base_currency: str, symbol: str, interval: str) -> bool:
+        return len(self.partitions(base_currency, symbol, interval)) > 0
+
+    def remove(self, base_currency: str, symbol: str, interval: str) -> None:
+        path = self.symbol_path(base_currency, symbol, interval)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        return
+
+    def symbols(self, base_currency: str, interval: str) -> List:
+        pattern = os.path.join(
+            self.base_path, f"base={base_currency}", "symbol=*", f"interval={interval}"
+        )
+        return sorted(
+            os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+            for path in glob.glob(pattern)
+        )
+
+    def scan(self, base_currency: str, symbol: str, interval: str) -> pl.LazyFrame:
+        return self._categorical_symbol(
+            pl.concat(
+                [
+                    self._scan_file(file, symbol, interval)
+                    for file in self.partitions(base_currency, symbol, interval)
+                ]
+            )
+        )
+
+    def read(self, base_currency: str, symbol: str, interval: str) -> pl.DataFrame:
+        """Reads all stored candles of a symbol, or an empty dataframe if there are
+        none. In the compact schema the close time, which scans leave out, is
+        derived from the timestamp.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        df = super().read(base_currency, symbol, interval)
+        if not self.compact_schema or len(df) == 0:
+            return df
+
+        window_size_ms = interval_to_milliseconds(interval)
+        return df.select(
+            [
+                "timestamp",
+                (pl.col("timestamp").dt.epoch("ms") + window_size_ms - 1)
+                .cast(pl.Datetime("ms"))
+                .alias("close_time"),
+            ]
+            + df.columns[1:]
+        )
+
+    def partition_versions(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Dict[str, int]:
+        """Returns per month when its candles last changed, in ns, without reading
+        any data.
+
+        Files are only ever added to or removed from the directory of a month, which
+        both change its modification time.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        path = self.symbol_path(base_currency, symbol, interval)
+        return {
+            month_path.split("month=")[-1]: os.stat(month_path).st_mtime_ns
+            for month_path in glob.glob(os.path.join(path, "month=*"))
+            if len(glob.glob(os.path.join(month_path, "*.parquet"))) > 0
+        }
+
+    def scan_partition(
+        self, base_currency: str, symbol: str, interval: str, partition: str
+    ) -> pl.LazyFrame:
+        month_path = os.path.join(
+            self.symbol_path(base_currency, symbol, interval), f"month={partition}"
+        )
+        files = sorted(
+            glob.glob(os.path.join(month_path, "*.parquet")),
+            key=lambda file: int(os.path.basename(file).split("-")[0]),
+        )
+        if len(files) == 0:
+            return pl.DataFrame().lazy()
+        return self._categorical_symbol(
+            pl.concat([self._scan_file(file, symbol, interval) for file in files])
+        )
+
+    def _scan_file(self, file: str, symbol: str, interval: str) -> pl.LazyFrame:
+        """Scans a single file, in the compact schema if that is used, whatever the
+        schema the file was written in."""
+        df = pl.scan_parquet(file)
+        if not self.compact_schema:
+            return df
+
+        return df.select(
+            [pl.col(column).cast(dtype) for column, dtype in COMPACT_DTYPES.items()]
+            + [pl.lit(symbol).alias("symbol")]
+        )
+
+    def _categorical_symbol(self, df: pl.LazyFrame) -> pl.LazyFrame:
+        """Makes the symbol categorical in the compact schema.
+
+        The symbols of all the files are cast at once after they are combined, so
+        they share one set of categories without a global string cache.
+        """
+        if not self.compact_schema:
+            return df
+        return df.with_column(pl.col("symbol").cast(pl.Categorical))
+
+    def append(
+        self, base_currency: str, symbol: str, interval: str, df: pl.DataFrame
+    ) -> None:
+        """Writes the given candles as new files, one per month they fall in.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param df: The candles that are not stored yet.
+        """
+        if len(df) == 0:
+            return
+        if self.compact_schema:
+            df = df.select(
+                [pl.col(column).cast(dtype) for column, dtype in COMPACT_DTYPES.items()]
+            )
+
+        path = self.symbol_path(base_currency, symbol, interval)
+        df = df.with_column(pl.col("timestamp").dt.strftime("%Y-%m").alias("month"))
+        for month in df["month"].unique().sort():
+            partition = df.filter(pl.col("month") == month).drop("month")
+            month_path = os.path.join(path, f"month={month}")
+
+            os.makedirs(month_path, exist_ok=True)
+            atomic_write(
+                self.partition_file(month_path, partition),
+                lambda file: partition.write_parquet(
+                    file, compression=self.compression
+                ),
+            )
+
+        self._write_manifest(
+            base_currency, symbol, interval, df["timestamp"].dt.epoch("ms").max()
+        )
+        return
+
+    def merge(
+        self, base_currency: str, symbol: str, interval: str, df: pl.DataFrame
+    ) -> None:
+        """Adds candles anywhere in the history, skipping the stored timestamps.
+
+        The months the candles fall in are compacted afterwards, so the files of a
+        month never overlap and a scan stays sorted by time. Only those months are
+        rewritten, not the whole history.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param df: The candles to add.
+        """
+        super().merge(base_currency, symbol, interval, df)
+        if len(df) > 0:
+            months = df["timestamp"].dt.strftime("%Y-%m").unique().to_list()
+            self.compact(base_currency, symbol, interval, months=months)
+            timestamps = df["timestamp"].dt.epoch("ms")
+            self._write_manifest(
+                base_currency,
+                symbol,
+                interval,
+                timestamps.max(),
+                rewritten_from=timestamps.min(),
+            )
+        return
+
+    def last_timestamp(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[datetime]:
+        """Returns the timestamp of the newest stored candle without reading any data.
+
+        The timestamp is kept in a small manifest next to the partitions. The files
+        are written before the manifest, so the names of the files of the newest
+        month are checked as well, in case a crash left the manifest behind.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        last_timestamps = []
+        manifest_file = self.manifest_file(base_currency, symbol, interval)
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as file:
+                last_timestamps.append(json.load(file)["last_timestamp"])
+
+        path = self.symbol_path(base_currency, symbol, interval)
+        for month_path in sorted(
+            glob.glob(os.path.join(path, "month=*")), reverse=True
+        ):
+            files = glob.glob(os.path.join(month_path, "*.parquet"))
+            if len(files) > 0:
+                last_timestamps.append(
+                    max(
+                        int(os.path.basename(file).split(".")[0].split("-")[1])
+                        for file in files
+                    )
+                )
+                break
+
+        if len(last_timestamps) == 0:
+            return None
+        return datetime.utcfromtimestamp(max(last_timestamps) / 1000)
+
+    def modified_time(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[int]:
+        """Returns when the candles of a symbol last changed, in ns, without reading
+        any data.
+
+        Every write rewrites the manifest, so that is when it was last written. If
+        it is missing it is the newest file.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        manifest_file = self.manifest_file(base_currency, symbol, interval)
+        if os.path.isfile(manifest_file):
+            return os.stat(manifest_file).st_mtime_ns
+        partitions = self.partitions(base_currency, symbol, interval)
+        if len(partitions) == 0:
+            return None
+        return max(os.stat(file).st_mtime_ns for file in partitions)
+
+    def rewritten_from(
+        self, base_currency: str, symbol: str, interval: str, since: int
+    ) -> Optional[datetime]:
+        """Returns the oldest candle that was added in between the stored candles
+        since the given time, or None if there is none, without reading any data.
+
+        Every merge is kept in the manifest as a rewrite, with the time it was
+        written and its oldest candle. A history that is written anew, e.g. after
+        remove, counts as rewritten from its first candle.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param since: The time in ns, as returned by modified_time.
+        """
+        manifest_file = self.manifest_file(base_currency, symbol, interval)
+        if not os.path.isfile(manifest_file):
+            return None
+        with open(manifest_file) as file:
+            rewrites = json.load(file).get("rewrites", [])
+
+        oldest = [first for time_ns, first in rewrites if time_ns >= since]
+        if len(oldest) == 0:
+            return None
+        return datetime.utcfromtimestamp(min(oldest) / 1000)
+
+    def _write_manifest(
+        self,
+        base_currency: str,
+        symbol: str,
+        interval: str,
+        last_timestamp: int,
+        rewritten_from: int = None,
+    ) -> None:
+        manifest_file = self.manifest_file(base_currency, symbol, interval)
+        # a new history is rewritten from its first candle
+        rewrites = [[time.time_ns(), 0]]
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as file:
+                manifest = json.load(file)
+            last_timestamp = max(last_timestamp, manifest["last_timestamp"])
+            rewrites = manifest.get("rewrites", [])
+        if rewritten_from is not None:
+            rewrites.append([time.time_ns(), rewritten_from])
+        while len(rewrites) > MAX_REWRITES:
+            # a reader from before the two oldest rewrites sees the older candle
+            (_, first), (time_ns, second) = rewrites[:2]
+            rewrites[:2] = [[time_ns, min(first, second)]]
+
+        def _write(file: str) -> None:
+            with open(file, "w") as f:
+                json.dump({"last_timestamp": last_timestamp, "rewrites": rewrites}, f)
+
+        atomic_write(manifest_file, _write)
+        return
+
+    def compact(
+        self,
+        base_currency: str,
+        symbol: str,
+        interval: str,
+        months: List = None,
+        min_files: int = 2,
+    ) -> None:
+        """Merges all the files within every month of a symbol into a single file.
+
+        Frequent updates create many small files, which makes reading them slower.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param months: The months to compact e.g. ["2022-04"], by default all.
+        :param min_files: The number of files a month needs to be compacted, months
+               with fewer files are left as they are.
+        """
+        path = self.symbol_path(base_currency, symbol, interval)
+        for month_path in sorted(glob.glob(os.path.join(path, "month=*"))):
+            if months is not None and month_path.split("month=")[-1] not in months:
+                continue
+            files = sorted(glob.glob(os.path.join(month_path, "*.parquet")))
+            if len(files) < max(2, min_files):
+                continue
+
+            # the files can be in either schema, e.g. after switching to the
+            # compact one, they are combined in the schema that is used
+            df = pl.concat(
+                [self._scan_file(file, symbol, interval) for file in files]
+            ).collect()
+            df = df.sort("timestamp").unique(subset="timestamp")
+            # write the merged file before removing the parts, so no data is lost
+            self.append(base_currency, symbol, interval, df)
+            merged_file = self.partition_file(month_path, df)
+            for file in files:
+                if file != merged_file:
+                    os.remove(file)
+        return
+
+    @staticmethod
+    def partition_file(month_path: str, df: pl.DataFrame) -> str:
+        """Returns the path of the file that holds the given candles of a month."""
+        first = df["timestamp"].dt.epoch("ms")[0]
+        last = df["timestamp"].dt.epoch("ms")[-1]
+        return os.path.join(month_path, f"{first}-{last}.parquet")
+
+
+class CsvStorage(Storage):
+    def __init__(self, base_path: str):
+        """Stores the candles in a single csv file per symbol.
+
+        This is the legacy format with the layout
+        <base_path>/<BASE>/<SYMBOL>-<INTERVAL>-orderbook.csv. Appending rewrites the
+        whole file, so it is only kept to import existing data and to export data
+        for tools that expect csv files.
+
+        :param base_path: Directory under which all the data is stored.
+        """
+        super().__init__(base_path)
+
+    def filename(self, base_currency: str, symbol: str, interval: str) -> str:
+        return "%s/%s-%s-orderbook.csv" % (
+            os.path.join(self.base_path, base_currency),
+            symbol,
+            interval,
+        )
+
+    def exists(self, base_currency: str, symbol: str, interval: str) -> bool:
+        return os.path.isfile(self.filename(base_currency, symbol, interval))
+
+    def remove(self, base_currency: str, symbol: str, interval: str) -> None:
+        if self.exists(base_currency, symbol, interval):
+            os.remove(self.filename(base_currency, symbol, interval))
+        return
+
+    def symbols(self, base_currency: str, interval: str) -> List:
+        suffix = f"-{interval}-orderbook.csv"
+        return sorted(
+            file[: -len(suffix)]
+            for file in os.listdir(os.path.join(self.base_path, base_currency))
+            if file.endswith(suffix)
+        )
+
+    def scan(self, base_currency: str, symbol: str, interval: str) -> pl.LazyFrame:
+        return pl.scan_csv(
+            self.filename(base_currency, symbol, interval), dtypes=CSV_DTYPES
+        ).with_columns(
+            [
+                pl.col("timestamp").dt.cast_time_unit("ms"),
+                pl.col("close_time").dt.cast_time_unit("ms"),
+            ]
+        )
+
+    def append(
+        self, base_currency: str, symbol: str, interval: str, df: pl.DataFrame
+    ) -> None:
+        if self.exists(base_currency, symbol, interval):
+            # merged candles can lie before the stored ones
+            df = self.read(base_currency, symbol, interval).vstack(df).sort("timestamp")
+
+        # necessary otherwise the record with be written with a "T" between date and time
+        df = df.with_column(pl.col("timestamp").dt.strftime(CSV_TIMESTAMP_FORMAT))
+        atomic_write(
+            self.filename(base_currency, symbol, interval),
+            lambda file: df.write_csv(file=file),
+        )
+        return
+
+    def last_timestamp(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[datetime]:
+        """Returns the timestamp of the newest stored candle by only reading the last
+        line of the file.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        """
+        if not self.exists(base_currency, symbol, interval):
+            return None
+
+        with open(self.filename(base_currency, symbol, interval), "rb") as file:
+            file.seek(0, os.SEEK_END)
+            position = file.tell()
+            tail = b""
+            # read backwards until the complete last line is in the tail
+            while position > 0 and tail.rstrip(b"\n").count(b"\n") == 0:
+                chunk_size = min(1024, position)
+                position -= chunk_size
+                file.seek(position)
+                tail = file.read(chunk_size) + tail
+
+        lines = tail.rstrip(b"\n").split(b"\n")
+        if position == 0 and len(lines) <= 1:
+            # only a header is present
+            return None
+        timestamp = lines[-1].split(b",")[0].decode()
+        return datetime.strptime(timestamp, CSV_TIMESTAMP_FORMAT)
+
+    def modified_time(
+        self, base_currency: str, symbol: str, interval: str
+    ) -> Optional[int]:
+        if not self.exists(base_currency, symbol, interval):
+            return None
+        return os.stat(self.filename(base_currency, symbol, interval)).st_mtime_ns
+
+
+def copy_symbols(
+    source: Storage,
+    destination: Storage,
+    base_currency: str,
+    interval: str,
+    symbols: List = None,
+) -> None:
+    """Copies the stored candles from one backend to another, e.g. to import the
+    legacy csv files into parquet or to export parquet data to csv.
+
+    :param source: The backend to read from.
+    :param destination: The backend to write to, existing data is replaced.
+    :param base_currency: The base currency against which the data is retrieved.
+    :param interval: The interval of the candles e.g. 5m.
+    :param symbols: The symbols to copy, by default all symbols in the source.
+    """
+    if symbols is None:
+        symbols = source.symbols(base_currency, interval)
+
+    for symbol in symbols:
+        destination.remove(base_currency, symbol, interval)
+        destination.append(
+            base_currency,
+            symbol,
+            interval,
+            source.read(base_currency, symbol, interval),
+        )
+    return
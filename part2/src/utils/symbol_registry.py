@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from src.utils.storage import atomic_write
+
+TRADING = "TRADING"
+DELISTED = "DELISTED"
+
+
+class SymbolRegistry:
+    def __init__(
+        self, path: str, ttl: float = 24 * 60 * 60, deprecated_coins: Iterable = ()
+    ):
+        """Keeps the pairs of the exchange, with their status, in a file, so that a
+        run only asks the exchange for them when the file is older than the ttl.
+
+        Every pair is stored with its symbol (the base asset of the exchange), its
+        base currency (the quote asset of the exchange), its trading status and the
+        time it was first seen. The exchange does not publish listing dates, so the
+        first time a pair was seen is kept instead.
+
+        :param path: The file in which the registry is kept.
+        :param ttl: The number of seconds the pairs are used before they are
+               refreshed.
+        :param deprecated_coins: The symbols that are never retrieved.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.deprecated_coins = frozenset(deprecated_coins)
+        self.updated_at = None
+        self.pairs: Dict = {}
+        self._symbols: Dict = {}
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.updated_at is not None and time.time() - self.updated_at < self.ttl
+
+    def load(self) -> None:
+        """Loads the registry from its file, if it exists."""
+        if os.path.isfile(self.path):
+            with open(self.path) as file:
+                registry = json.load(file)
+            self.updated_at = registry["updated_at"]
+            self.pairs = registry["pairs"]
+            self._index()
+        return
+
+    async def refresh(self, client, force: bool = False) -> Tuple[List, List]:
+        """Retrieves the pairs from the exchange, unless the registry is fresh.
+
+        Returns the pairs that were added and the pairs that were delisted since the
+        previous refresh.
+
+        :param client: The client of the exchange.
+        :param force: Whether to refresh even though the registry is fresh.
+        """
+        if self.updated_at is None:
+            self.load()
+        if self.is_fresh and not force:
+            return [], []
+
+        exchange_info = await client.get_exchange_info()
+        changes = self.update(exchange_info["symbols"])
+        self.save()
+        return changes
+
+    def update(self, exchange_symbols: List) -> Tuple[List, List]:
+        """Updates the pairs with the symbols of the exchange information.
+
+        Returns the pairs that can be traded now but could not before, and the pairs
+        that could be traded before but cannot anymore. A pair that is missing from
+        the exchange information is marked as delisted.
+
+        :param exchange_symbols: The "symbols" of the exchange information.
+        """
+        now = int(time.time() * 1000)
+        added, delisted = [], []
+        seen = set()
+        for exchange_symbol in exchange_symbols:
+            pair = exchange_symbol["symbol"]
+            seen.add(pair)
+            previous = self.pairs.get(pair)
+            self.pairs[pair] = {
+                "symbol": exchange_symbol["baseAsset"],
+                "base_currency": exchange_symbol["quoteAsset"],
+                "status": exchange_symbol["status"],
+                "first_seen": now if previous is None else previous["first_seen"],
+            }
+            was_trading = previous is not None and previous["status"] == TRADING
+            is_trading = exchange_symbol["status"] == TRADING
+            if is_trading and not was_trading:
+                added.append(pair)
+            elif was_trading and not is_trading:
+                delisted.append(pair)
+
+        for pair in self.pairs.keys() - seen:
+            if self.pairs[pair]["status"] == TRADING:
+                delisted.append(pair)
+            self.pairs[pair]["status"] = DELISTED
+
+        self.updated_at = time.time()
+        self._index()
+        return sorted(added), sorted(delisted)
+
+    def symbols(self, base_currency: str) -> List:
+        """Returns the symbols that are traded against the base currency.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        """
+        return sorted(self._symbols.get(base_currency, frozenset()))
+
+    def is_trading(self, base_currency: str, symbol: str) -> bool:
+        """Whether a pair is traded and should be retrieved.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        """
+        return symbol in self._symbols.get(base_currency, frozenset())
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        def _write(path: str) -> None:
+            with open(path, "w") as file:
+                json.dump({"updated_at": self.updated_at, "pairs": self.pairs}, file)
+
+        atomic_write(self.path, _write)
+        return
+
+    def _index(self) -> None:
+        """Builds the sets of traded symbols per base currency."""
+        traded: Dict = {}
+        for pair in self.pairs.values():
+            if (
+                pair["status"] == TRADING
+                and pair["symbol"] not in self.deprecated_coins
+            ):
+                traded.setdefault(pair["base_currency"], set()).add(pair["symbol"])
+        self._symbols = {
+            base_currency: frozenset(symbols)
+            for base_currency, symbols in traded.items()
+        }
+        return
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+
+class Progress:
+    def __init__(self, total: int):
+        """Keeps track of how many jobs of a run are done.
+
+        :param total: The total number of jobs in the run.
+        """
+        self.total = total
+        self.completed = 0
+        self.failed = []
+        self.start_time = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated number of seconds until all the jobs are done."""
+        if self.completed == 0:
+            return None
+        return self.elapsed / self.completed * (self.total - self.completed)
+
+    def update(self, job: Any, error: Optional[BaseException]) -> None:
+        self.completed += 1
+        if error is not None:
+            self.failed.append(job)
+        return
+
+    def __str__(self) -> str:
+        eta = "unknown" if self.eta is None else f"{self.eta:.0f}s"
+        return (
+            f"{self.completed}/{self.total} done, {len(self.failed)} failed, "
+            f"elapsed {self.elapsed:.0f}s, eta {eta}"
+        )
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        number_of_workers: int,
+        on_complete: Callable[[Any, Optional[BaseException], Progress], None] = None,
+    ):
+        """Runs jobs with a fixed number of concurrent workers.
+
+        Every worker takes the next job from a shared queue as soon as its previous
+        job is done, so a single slow job only occupies one worker instead of
+        holding back a whole batch.
+
+        :param number_of_workers: The maximum number of jobs that run concurrently.
+        :param on_complete: Called after every job with the job, the exception it
+               raised (or None) and the progress of the run.
+        """
+        self.number_of_workers = max(1, number_of_workers)
+        self.on_complete = on_complete
+
+    async def run(self, jobs: Iterable, worker: Callable[[Any], Awaitable]) -> Progress:
+        """Processes all the jobs and returns the progress once all are done.
+
+        An exception raised by a job is passed to on_complete and recorded in the
+        progress, it does not stop the other jobs.
+
+        :param jobs: The jobs to process.
+        :param worker: Coroutine function that processes a single job.
+        """
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        progress = Progress(total=queue.qsize())
+
+        async def _work() -> None:
+            while not queue.empty():
+                job = queue.get_nowait()
+                try:
+                    await worker(job)
+                    error = None
+                except Exception as e:
+                    error = e
+
+                progress.update(job, error)
+                if self.on_complete is not None:
+                    self.on_complete(job, error, progress)
+            return
+
+        workers: List = [
+            _work() for _ in range(min(self.number_of_workers, progress.total))
+        ]
+        await asyncio.gather(*workers)
+        return progress
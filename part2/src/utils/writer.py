@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import polars as pl
+
+
+class AsyncWriter:
+    def __init__(self, storage, max_queue_size: int = 64, max_batch_size: int = 32):
+        """Writes data to the storage on a separate thread, so that disk I/O never
+        blocks the event loop that retrieves the data.
+
+        Writes are queued in a bounded queue: when the disk cannot keep up, adding a
+        write waits until there is room again. All writes that are waiting when the
+        writer thread becomes available are committed together as one batch, with a
+        single append per symbol.
+
+        :param storage: The backend in which the data is stored.
+        :param max_queue_size: The maximum number of writes that can be waiting.
+        :param max_batch_size: The maximum number of writes committed together.
+        """
+        self.storage = storage
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self._drainer = None
+
+    def start(self) -> None:
+        self._drainer = asyncio.create_task(self._drain())
+        return
+
+    async def put(
+        self,
+        base_currency: str,
+        symbol: str,
+        interval: str,
+        df: pl.DataFrame,
+        merge: bool = False,
+    ) -> asyncio.Future:
+        """Queues the given candles to be appended to the storage.
+
+        Waits while the queue is full. Returns a future that is done once the candles
+        are written, or holds the exception when writing failed.
+
+        :param base_currency: The base currency against which the data is retrieved.
+        :param symbol: The tickername without base currency e.g. ETH.
+        :param interval: The interval of the candles e.g. 5m.
+        :param df: The candles that are not stored yet.
+        :param merge: Whether the candles can lie anywhere in the history, e.g. to
+               fill a gap, instead of after the stored candles.
+        """
+        written = asyncio.get_running_loop().create_future()
+        await self.queue.put(((base_currency, symbol, interval, merge), df, written))
+        return written
+
+    def call(self, function: Callable, *args) -> asyncio.Future:
+        """Runs a function on the writer thread, e.g. one that reads the written data
+        and writes something derived from it, so it never runs alongside a write.
+
+        :param function: The function to run.
+        :param args: The arguments of the function.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+    async def close(self) -> None:
+        """Waits until all queued writes are done and stops the writer."""
+        await self.queue.join()
+        self._drainer.cancel()
+        self.executor.shutdown(wait=True)
+        return
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                await loop.run_in_executor(self.executor, self._write_batch, batch)
+                error = None
+            except Exception as e:
+                error = e
+
+            for _, _, written in batch:
+                if error is None:
+                    written.set_result(None)
+                else:
+                    written.set_exception(error)
+                self.queue.task_done()
+            self.batches += 1
+
+    def _write_batch(self, batch: List) -> None:
+        """Appends the candles of a batch, combining the writes per symbol."""
+        frames: Dict = {}
+        for key, df, _ in batch:
+            if len(df) > 0:
+                frames.setdefault(key, []).append(df)
+
+        for (base_currency, symbol, interval, merge), dfs in frames.items():
+            write = self.storage.merge if merge else self.storage.append
+            write(base_currency, symbol, interval, pl.concat(dfs))
+        return
@@ -0,0 +1,36 @@
+import asyncio
+import configparser
+
+from src.utils.helpers import logger
+from src.utils.live_klines import LiveKlineStream
+from src.utils.orderbook import Orderbook
+
+logger = logger("stream")
+config = configparser.ConfigParser()
+config.read("config.ini")
+
+
+async def main():
+    logger.info("Started main.")
+    orderbook = Orderbook(base_currencies=["USDT"], window_size="5m", base_path="data/")
+
+    logger.info("Initializing Binance exchange client.")
+    client = await orderbook.set_client(
+        key=config["BINANCE"]["API_KEY"], secret=config["BINANCE"]["API_SECRET"]
+    )
+
+    logger.info("Catching up on the data that was missed.")
+    await orderbook.get_orderbook(action="update", to_write=True)
+    await client.close_connection()
+
+    logger.info("Start streaming the closed candles.")
+    stream = LiveKlineStream(
+        base_currencies=orderbook.base_currencies,
+        window_size=orderbook.window_size,
+        storage=orderbook.storage,
+    )
+    await stream.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,12 @@
+import os
+import sys
+
 import polars as pl
 import pytest
 
+# the ingestion modules import each other as src.utils, as when run from part2
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
 
 @pytest.fixture()
 def mock_dataframe():
@@ -1,6 +1,11 @@
+from datetime import datetime
+
+import numpy as np
 import polars as pl
 
 from part2.src.indicators.ttm_squeeze import TTMSqueeze
+from part2.src.utils.dataloader import DataLoader
+from part2.src.utils.storage import ParquetStorage
 
 
 def test_initialize_TTMSqueeze():
@@ -30,3 +35,93 @@ def test_calculate_squeeze_polars(mock_dataframe):
     ttm_squeeze = TTMSqueeze()
     output = ttm_squeeze.calculate_squeeze_polars(mock_dataframe)
     assert output.columns == ["squeeze_on", "squeeze_off"]
+
+
+def make_universe(storage: ParquetStorage) -> list:
+    rng = np.random.default_rng(1)
+    n = 12 * 24 * 30
+    symbols = [f"S{i}" for i in range(10)]
+    for symbol in symbols:
+        # volatility regimes make squeezes and breakouts appear
+        volatility = np.repeat(rng.uniform(0.2, 2, n // 500 + 1), 500)[:n]
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n) * volatility))
+        storage.append(
+            "USDT",
+            symbol,
+            "5m",
+            pl.DataFrame(
+                {
+                    "timestamp": pl.date_range(
+                        datetime(2022, 1, 1), datetime(2022, 1, 31), "5m"
+                    )[:n],
+                    "open": close,
+                    "high": close * 1.002,
+                    "low": close * 0.998,
+                    "close": close,
+                    "symbol": [symbol] * n,
+                }
+            ).with_column(pl.col("timestamp").dt.cast_time_unit("ms")),
+        )
+    return symbols
+
+
+def test_universe_scan_matches_scan_per_symbol(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    symbols = make_universe(storage)
+
+    ttm_squeeze = TTMSqueeze()
+    dataloader = DataLoader(storage=storage)
+    intervals = ["1h", "2h", "4h", "8h"]
+    per_symbol = []
+    for symbol in symbols:
+        per_symbol += ttm_squeeze.run("USDT", symbol, "5m", intervals, dataloader)
+
+    universe = ttm_squeeze.scan_universe_for_squeeze_breakouts(
+        "USDT", "5m", intervals, dataloader
+    )
+    assert len(universe) > 0
+    assert universe == per_symbol
+
+
+def test_scan_of_the_tail_matches_scan_of_the_whole_history(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    make_universe(storage)
+    ttm_squeeze = TTMSqueeze()
+    dataloader = DataLoader(storage=storage)
+    intervals = ["1h", "2h", "4h", "8h"]
+
+    start = ttm_squeeze.lookback_start(datetime(2022, 1, 30, 23, 55), intervals)
+    # 23 candles of 8h
+    assert start == datetime(2022, 1, 23, 7, 55)
+
+    full_history = []
+    df = dataloader.scan_universe("USDT", "5m").collect()
+    for interval in intervals:
+        df = dataloader.to_interval_polars(df, interval)
+        for symbol in ttm_squeeze.breaking_out_symbols_polars(df):
+            full_history.append(f"{symbol} is breaking out at {interval} interval.")
+
+    tail = ttm_squeeze.scan_universe_for_squeeze_breakouts(
+        "USDT", "5m", intervals, dataloader
+    )
+    assert len(tail) > 0
+    assert sorted(tail) == sorted(full_history)
+
+
+def test_cached_scan_matches_uncached_scan(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    symbols = make_universe(storage)
+    ttm_squeeze = TTMSqueeze()
+    intervals = ["1h", "2h", "4h", "8h"]
+
+    cached = ttm_squeeze.scan_universe_for_squeeze_breakouts(
+        "USDT", "5m", intervals, DataLoader(storage, cached_intervals=intervals)
+    )
+    assert storage.symbols("USDT", "8h") == sorted(symbols)
+    assert len(cached) > 0
+    assert cached == ttm_squeeze.scan_universe_for_squeeze_breakouts(
+        "USDT", "5m", intervals, DataLoader(storage)
+    )
+    assert ttm_squeeze.run(
+        "USDT", symbols[0], "5m", intervals, DataLoader(storage, intervals)
+    ) == ttm_squeeze.run("USDT", symbols[0], "5m", intervals, DataLoader(storage))
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from part2.src.utils.concurrency import AdaptiveConcurrency
+
+
+def test_limit_increases_while_responses_are_healthy():
+    controller = AdaptiveConcurrency(initial=2, maximum=4)
+    for _ in range(100):
+        controller.on_response(latency=0.1, used_weight_fraction=0.5)
+
+    assert controller.limit == 4
+    assert controller.increases == 2
+    assert controller.decreases == 0
+
+
+def test_limit_does_not_increase_close_to_the_weight_limit():
+    controller = AdaptiveConcurrency(initial=2, weight_threshold=0.9)
+    for _ in range(10):
+        controller.on_response(latency=0.1, used_weight_fraction=0.95)
+
+    assert controller.limit == 2
+
+
+def test_limit_decreases_when_latency_rises():
+    controller = AdaptiveConcurrency(initial=16, latency_tolerance=3.0)
+    for _ in range(10):
+        controller.on_response(latency=0.1, used_weight_fraction=0.5)
+    for _ in range(10):
+        controller.on_response(latency=2.0, used_weight_fraction=0.5)
+
+    assert controller.limit < 16
+    assert controller.decisions[-1][1] == "latency"
+
+
+def test_throttle_halves_limit_and_pauses_requests():
+    async def acquire_after_throttle():
+        controller = AdaptiveConcurrency(initial=8)
+        controller.on_throttled(status=429, retry_after=0.2)
+        start_time = time.monotonic()
+        async with controller.slot():
+            pass
+        return controller, time.monotonic() - start_time
+
+    controller, duration = asyncio.run(acquire_after_throttle())
+    assert controller.limit == 4
+    assert controller.throttled == 1
+    assert duration >= 0.2
+
+
+def test_ban_drops_limit_to_minimum():
+    controller = AdaptiveConcurrency(initial=32, minimum=2)
+    controller.on_throttled(status=418, retry_after=0)
+
+    assert controller.limit == 2
+    assert controller.metrics["decreases"] == 1
+
+
+def test_slot_caps_requests_in_flight():
+    async def run_requests():
+        controller = AdaptiveConcurrency(initial=3)
+        most_in_flight = 0
+
+        async def request():
+            nonlocal most_in_flight
+            async with controller.slot():
+                most_in_flight = max(most_in_flight, controller.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[request() for _ in range(20)])
+        return most_in_flight, controller.in_flight
+
+    assert asyncio.run(run_requests()) == (3, 0)
+
+
+def test_slow_start_doubles_the_limit_every_round_trip():
+    controller = AdaptiveConcurrency(initial=4, maximum=64)
+    for _ in range(4 + 8):
+        controller.on_response(latency=0.1, used_weight_fraction=0.5)
+
+    assert controller.limit == 16
+
+    controller.on_throttled(status=429, retry_after=0)
+    for _ in range(8):
+        controller.on_response(latency=0.1, used_weight_fraction=0.5)
+
+    # after the first decrease the limit grows by about one per round trip
+    assert 8 < controller.limit < 9
+
+
+def test_lag_of_the_event_loop_does_not_decrease_the_limit():
+    async def respond_during_a_busy_loop():
+        controller = AdaptiveConcurrency(initial=16, lag_interval=0.01)
+        async with controller.slot():
+            for _ in range(10):
+                controller.on_response(latency=0.01, used_weight_fraction=0.5)
+            await asyncio.sleep(0.05)
+            # our own work keeps the loop busy while the responses wait
+            time.sleep(0.5)
+            for _ in range(10):
+                controller.on_response(latency=0.5, used_weight_fraction=0.5)
+            loop_lag = controller.loop_lag
+        return controller, loop_lag
+
+    controller, loop_lag = asyncio.run(respond_during_a_busy_loop())
+    assert loop_lag >= 0.4
+    assert controller.decreases == 0
+
+
+def test_close_stops_measuring_the_lag_of_the_event_loop():
+    async def request_and_close():
+        controller = AdaptiveConcurrency(lag_interval=0.01)
+        async with controller.slot():
+            await asyncio.sleep(0.05)
+        monitor = controller._lag_monitor
+        controller.close()
+        await asyncio.sleep(0.05)
+        return controller, monitor
+
+    controller, monitor = asyncio.run(request_and_close())
+    assert monitor.cancelled()
+    assert controller.loop_lag < 0.05
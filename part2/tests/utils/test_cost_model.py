@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from part2.src.utils.cost_model import KLINES_WEIGHT, CostModel
+
+
+def test_number_of_candles():
+    cost_model = CostModel(window_size="5m")
+    oldest_data_point = datetime(2022, 3, 28)
+    assert cost_model.number_of_candles(oldest_data_point, oldest_data_point) == 1
+    assert (
+        cost_model.number_of_candles(
+            oldest_data_point, oldest_data_point + timedelta(days=1)
+        )
+        == 289
+    )
+
+
+def test_historical_klines_weight_follows_pages():
+    cost_model = CostModel(window_size="1m", page_limit=1000)
+    oldest_data_point = datetime(2022, 3, 28)
+
+    # an up to date symbol only costs the earliest timestamp and a single page
+    assert (
+        cost_model.historical_klines_weight(oldest_data_point, oldest_data_point)
+        == 2 * KLINES_WEIGHT
+    )
+    # 1440 candles take two pages
+    assert (
+        cost_model.historical_klines_weight(
+            oldest_data_point, oldest_data_point + timedelta(days=1)
+        )
+        == 3 * KLINES_WEIGHT
+    )
+
+
+def test_request_weight():
+    assert CostModel.request_weight("https://api.binance.com/api/v3/klines", {}) == 2
+    assert CostModel.request_weight("https://api.binance.com/api/v3/time", {}) == 1
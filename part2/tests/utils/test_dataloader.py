@@ -0,0 +1,182 @@
+import os
+from datetime import datetime
+
+import polars as pl
+
+from part2.src.utils.dataloader import DataLoader
+from part2.src.utils.storage import ParquetStorage
+from part2.tests.utils.test_resample import record_scans
+from part2.tests.utils.test_storage import make_candles
+
+
+def test_scan_universe_reads_requested_columns_and_range(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 24))
+    storage.append("USDT", "ADA", "5m", make_candles(datetime(2022, 4, 1), 24, "ADA"))
+
+    df = DataLoader(storage).scan_universe(
+        "USDT",
+        "5m",
+        columns=["timestamp", "close", "symbol"],
+        start=datetime(2022, 4, 1, 1),
+    )
+    assert isinstance(df, pl.LazyFrame)
+    df = df.collect()
+    assert df.columns == ["timestamp", "close", "symbol"]
+    assert df["symbol"].to_list() == ["ADA"] * 12 + ["ETH"] * 12
+
+
+def test_read_file_to_interval_polars(tmp_path):
+    make_candles(datetime(2022, 4, 1), 24).with_column(
+        pl.col("timestamp").dt.strftime("%Y-%m-%d %H:%M:%S")
+    ).write_csv(str(tmp_path / "ETH-5m-orderbook.csv"))
+
+    df = DataLoader().read_file_to_interval_polars(
+        str(tmp_path),
+        "ETH-5m-orderbook.csv",
+        "1h",
+        columns=["timestamp", "open", "high", "low", "close", "symbol"],
+    )
+    assert df["open"].to_list() == [0.0, 12.0]
+    assert df["close"].to_list() == [11.0, 23.0]
+
+
+def test_read_symbol_to_interval_pandas_reads_the_storage(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 24))
+
+    dataloader = DataLoader(storage)
+    df = dataloader.read_symbol_to_interval_pandas("USDT", "ETH", "5m", "1h")
+    assert df["open"].to_list() == [0.0, 12.0]
+    assert df["close"].to_list() == [11.0, 23.0]
+    assert df["symbol"].to_list() == ["ETH"] * 2
+    assert len(dataloader.read_symbol_pandas("USDT", "ADA", "5m")) == 0
+
+
+def test_scan_interval_serves_closed_candles_from_the_cache(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    dataloader = DataLoader(storage, cached_intervals=["15m", "1h"])
+    candles = make_candles(datetime(2022, 4, 1), 40)
+
+    storage.append("USDT", "ETH", "5m", candles[:20])
+    dataloader.update_cache("USDT", "5m")
+    storage.append("USDT", "ETH", "5m", candles[20:])
+
+    # the candles after the cached ones are resampled when reading
+    assert storage.last_timestamp("USDT", "ETH", "1h") == datetime(2022, 4, 1)
+    for interval in ["15m", "1h"]:
+        expected = dataloader.to_interval_polars(candles, interval)
+        df = dataloader.scan_interval("USDT", "5m", interval).collect()
+        assert df.frame_equal(expected)
+
+    dataloader.update_cache("USDT", "5m")
+    assert storage.last_timestamp("USDT", "ETH", "1h") == datetime(2022, 4, 1, 2)
+    df = dataloader.scan_interval(
+        "USDT", "5m", "1h", start=datetime(2022, 4, 1, 1)
+    ).collect()
+    assert df["timestamp"].to_list() == [
+        datetime(2022, 4, 1, 1),
+        datetime(2022, 4, 1, 2),
+        datetime(2022, 4, 1, 3),
+    ]
+    assert df["close"].to_list() == [23.0, 35.0, 39.0]
+
+
+def test_cached_candles_are_resampled_again_after_a_repair(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    dataloader = DataLoader(storage, cached_intervals=["15m", "1h"])
+    candles = make_candles(datetime(2022, 4, 1), 40)
+    storage.append("USDT", "ETH", "5m", candles[:18].vstack(candles[24:]))
+    dataloader.update_cache("USDT", "5m")
+    assert storage.read("USDT", "ETH", "1h")["close"].to_list() == [11.0, 17.0, 35.0]
+
+    storage.merge("USDT", "ETH", "5m", candles[18:24])
+
+    for interval in ["15m", "1h"]:
+        expected = dataloader.to_interval_polars(candles, interval)
+        df = dataloader.scan_interval("USDT", "5m", interval).collect()
+        assert df.frame_equal(expected)
+    dataloader.update_cache("USDT", "5m")
+    df = storage.read("USDT", "ETH", "1h")
+    assert df["timestamp"].to_list() == [
+        datetime(2022, 4, 1, 0),
+        datetime(2022, 4, 1, 1),
+        datetime(2022, 4, 1, 2),
+    ]
+    assert df["close"].to_list() == [11.0, 23.0, 35.0]
+
+
+def test_scan_intervals_reads_every_symbol_from_its_own_watermark(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    dataloader = DataLoader(storage, cached_intervals=["1h"])
+    ada = make_candles(datetime(2022, 4, 1), 40, "ADA")
+    eth = make_candles(datetime(2022, 3, 1), 30)
+    storage.append("USDT", "ADA", "5m", ada)
+    storage.append("USDT", "ETH", "5m", eth)
+    dataloader.update_cache("USDT", "5m")
+
+    scans = record_scans(storage)
+    df = dataloader.scan_interval("USDT", "5m", "1h").collect()
+
+    # the tail of every symbol after its own newest cached candle
+    assert [scan for scan in scans if scan[0] == "5m"] == [
+        ("5m", ["ETH"], datetime(2022, 3, 1, 2)),
+        ("5m", ["ADA"], datetime(2022, 4, 1, 3)),
+    ]
+    expected = pl.concat(
+        [dataloader.to_interval_polars(candles, "1h") for candles in [ada, eth]]
+    )
+    assert df.frame_equal(expected)
+
+
+def test_scan_universe_reads_ipc_copies_that_follow_the_storage(tmp_path):
+    storage = ParquetStorage(str(tmp_path / "parquet"))
+    # half in march, half in april
+    candles = make_candles(datetime(2022, 3, 31, 23), 36)
+    storage.append("USDT", "ETH", "5m", candles[:24])
+    storage.append("USDT", "ADA", "5m", make_candles(datetime(2022, 4, 1), 24, "ADA"))
+    dataloader = DataLoader(storage, ipc_path=str(tmp_path / "ipc"))
+
+    expected = DataLoader(storage).scan_universe("USDT", "5m").collect()
+    assert dataloader.scan_universe("USDT", "5m").collect().frame_equal(expected)
+
+    # a copy per month, only written again once the stored candles of it change
+    path = tmp_path / "ipc" / "USDT" / "ETH-5m"
+    files = dataloader.ipc_files("USDT", "ETH", "5m")
+    assert files == [str(path / "2022-03.arrow"), str(path / "2022-04.arrow")]
+    written = {file: os.stat(file).st_ino for file in files}
+    assert dataloader.ipc_files("USDT", "ETH", "5m") == files
+    assert {file: os.stat(file).st_ino for file in files} == written
+
+    storage.append("USDT", "ETH", "5m", candles[24:])
+    df = dataloader.scan_symbol(
+        "USDT", "ETH", "5m", columns=["timestamp", "close"], start=candles[18, 0]
+    ).collect()
+    assert df["close"].to_list() == candles["close"][18:].to_list()
+    # march is not needed from april on, and did not change anyway
+    assert os.stat(files[0]).st_ino == written[files[0]]
+    assert os.stat(files[1]).st_ino != written[files[1]]
+    assert dataloader.ipc_files("USDT", "BTC", "5m") == []
+
+    # the copies of months that are not stored anymore are removed
+    storage.remove("USDT", "ETH", "5m")
+    storage.append("USDT", "ETH", "5m", candles[12:])
+    assert dataloader.ipc_files("USDT", "ETH", "5m") == [files[1]]
+    assert not os.path.exists(files[0])
+
+
+def test_ipc_copies_of_a_compact_storage_keep_the_symbols_apart(tmp_path):
+    storage = ParquetStorage(str(tmp_path / "parquet"), compact_schema=True)
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 3, 31, 23), 24))
+    storage.append("USDT", "ADA", "5m", make_candles(datetime(2022, 4, 1), 24, "ADA"))
+    dataloader = DataLoader(storage, ipc_path=str(tmp_path / "ipc"))
+
+    expected = DataLoader(storage).scan_universe("USDT", "5m").collect()
+    df = dataloader.scan_universe("USDT", "5m").collect()
+    assert df["symbol"].dtype == pl.Categorical
+    # categories of separate queries only compare as strings
+    df, expected = [
+        frame.with_column(pl.col("symbol").cast(pl.Utf8)) for frame in [df, expected]
+    ]
+    assert df.frame_equal(expected)
+    assert df["symbol"].to_list() == ["ADA"] * 24 + ["ETH"] * 24
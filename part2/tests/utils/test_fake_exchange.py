@@ -0,0 +1,65 @@
+import asyncio
+import json
+import time
+
+import pytest
+from binance.exceptions import BinanceAPIException
+
+from part2.src.utils.fake_exchange import FakeAsyncClient, FakeExchange
+
+WINDOW_SIZE_MS = 5 * 60 * 1000
+
+
+def test_historical_klines_are_paged_from_the_listing():
+    now = int(time.time() * 1000)
+    listing_time = (now - 2500 * WINDOW_SIZE_MS) // WINDOW_SIZE_MS * WINDOW_SIZE_MS
+    exchange = FakeExchange(symbols=["ETHUSDT"], listings={"ETHUSDT": listing_time})
+
+    async def run():
+        client = FakeAsyncClient(exchange)
+        return await client.get_historical_klines(
+            "ETHUSDT", "5m", start_str=0, end_str=listing_time + 1999 * WINDOW_SIZE_MS
+        )
+
+    klines = asyncio.run(run())
+    assert len(klines) == 2000
+    assert klines[0][0] == listing_time
+    assert all(b[0] - a[0] == WINDOW_SIZE_MS for a, b in zip(klines, klines[1:]))
+    # the earliest candle and two pages
+    assert exchange.requests == 3
+
+
+def test_exceeding_the_weight_limit_is_rejected():
+    exchange = FakeExchange(
+        symbols=["ETHUSDT"], request_weight=lambda uri, kwargs: 2, weight_limit=3
+    )
+
+    async def run():
+        client = FakeAsyncClient(exchange)
+        await client.get_klines(symbol="ETHUSDT", interval="5m", limit=1)
+        assert client.response.headers["x-mbx-used-weight-1m"] == "2"
+        await client.get_klines(symbol="ETHUSDT", interval="5m", limit=1)
+
+    with pytest.raises(BinanceAPIException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 429
+    assert int(error.value.response.headers["Retry-After"]) > 0
+    assert exchange.rejected == 1
+
+
+def test_recorded_klines_are_replayed(tmp_path):
+    klines = [
+        [i * WINDOW_SIZE_MS, "1", "2", "0", "1", "5", 0, "5", 1, "2", "2", "0"]
+        for i in range(3)
+    ]
+    path = tmp_path / "recording.json"
+    path.write_text(json.dumps({"ADABTC": klines}))
+    exchange = FakeExchange.from_recording(str(path))
+
+    async def run():
+        client = FakeAsyncClient(exchange)
+        return await client.get_klines(
+            symbol="ADABTC", interval="5m", startTime=WINDOW_SIZE_MS, limit=10
+        )
+
+    assert asyncio.run(run()) == klines[1:]
@@ -0,0 +1,66 @@
+import os
+
+import polars as pl
+
+from part2.src.utils.journal import RunJournal
+from part2.src.utils.storage import atomic_write
+
+
+def test_unfinished_run_is_resumed(tmp_path):
+    path = str(tmp_path / "_journal-5m.json")
+    journal = RunJournal(path)
+    assert not journal.start(action="update", window_size="5m")
+    journal.mark_started("USDT", "ETH")
+    journal.mark_started("USDT", "ADA")
+    journal.mark_completed("USDT", "ETH")
+
+    resumed = RunJournal(path)
+    assert resumed.start(action="update", window_size="5m")
+    assert resumed.is_completed("USDT", "ETH")
+    assert resumed.is_started("USDT", "ADA")
+    assert not resumed.is_started("USDT", "ETH")
+
+    resumed.mark_completed("USDT", "ADA")
+    resumed.finish()
+    assert not os.path.exists(path)
+
+
+def test_finished_run_only_keeps_the_started_pairs(tmp_path):
+    path = str(tmp_path / "_journal-5m.json")
+    journal = RunJournal(path)
+    journal.start(action="update", window_size="5m")
+    journal.mark_started("USDT", "ADA")
+    journal.mark_completed("USDT", "ETH")
+    journal.finish()
+
+    next_run = RunJournal(path)
+    assert next_run.start(action="update", window_size="5m")
+    assert not next_run.is_completed("USDT", "ETH")
+    assert next_run.is_started("USDT", "ADA")
+
+
+def test_journal_of_another_action_is_not_resumed(tmp_path):
+    path = str(tmp_path / "_journal-5m.json")
+    journal = RunJournal(path)
+    journal.start(action="update", window_size="5m")
+    journal.mark_completed("USDT", "ETH")
+
+    fresh = RunJournal(path)
+    assert not fresh.start(action="recreate", window_size="5m")
+    assert not fresh.is_completed("USDT", "ETH")
+
+
+def test_failed_atomic_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / "ETH.parquet")
+    pl.DataFrame({"close": [1.0, 2.0]}).write_parquet(path)
+
+    def _crash(file):
+        with open(file, "wb") as f:
+            f.write(b"PAR1")
+        raise KeyboardInterrupt
+
+    try:
+        atomic_write(path, _crash)
+    except KeyboardInterrupt:
+        pass
+    assert len(pl.read_parquet(path)) == 2
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import polars as pl
+
+from part2.src.utils.kline_decoder import COLUMNS, decode_klines
+
+
+def test_decode_klines():
+    klines = [
+        [1648425600000, "1.5", "2.0", "1.0", "1.75", "10.0"]
+        + [1648425899999, "15.0", 7, "5.0", "7.5", "0"],
+        [1648425900000, "1.75", "2.5", "1.5", "2.25", "20.0"]
+        + [1648426199999, "30.0", 9, "10.0", "15.0", "0"],
+    ]
+    df = decode_klines(klines, "ETH")
+
+    assert df.columns == COLUMNS
+    assert df["timestamp"].to_list() == [
+        datetime(2022, 3, 28, 0, 0),
+        datetime(2022, 3, 28, 0, 5),
+    ]
+    assert df["close"].to_list() == [1.75, 2.25]
+    assert df["trades"].to_list() == [7, 9]
+    assert df["symbol"].to_list() == ["ETH", "ETH"]
+
+
+def test_decode_no_klines():
+    df = decode_klines([], "ETH")
+    assert len(df) == 0
+    assert df.columns == COLUMNS
+    assert df["timestamp"].dtype == pl.Datetime("ms")
+
+
+def test_decode_klines_compact():
+    klines = [[1648425600000, "1.5", "2.0", "1.0", "1.75", "10.0"]]
+    klines[0] += [1648425899999, "15.0", 7, "5.0", "7.5", "0"]
+    df = decode_klines(klines, "ETH", compact=True)
+
+    assert df.columns == COLUMNS
+    assert df.schema["close"] == pl.Float32
+    assert df.schema["trades"] == pl.Int32
+    assert df.schema["symbol"] == pl.Categorical
+    assert df["close"].to_list() == [1.75]
+    assert decode_klines([], "ETH", compact=True).schema == df.schema
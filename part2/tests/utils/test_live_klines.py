@@ -0,0 +1,185 @@
+import asyncio
+import json
+from datetime import datetime
+
+import websockets
+
+from part2.src.utils.live_klines import KlineRingBuffer, LiveKlineStream
+from part2.src.utils.storage import ParquetStorage
+
+
+def make_kline(pair: str, open_time: int, closed: bool = True) -> dict:
+    return {
+        "t": open_time,
+        "T": open_time + 299999,
+        "s": pair,
+        "i": "5m",
+        "o": "1.5",
+        "c": "1.75",
+        "h": "2.0",
+        "l": "1.0",
+        "v": "10.0",
+        "n": 7,
+        "x": closed,
+        "q": "15.0",
+        "V": "5.0",
+        "Q": "7.5",
+    }
+
+
+def test_ring_buffer_overwrites_oldest_candles():
+    buffer = KlineRingBuffer(capacity=3)
+    for i in range(5):
+        buffer.push(make_kline("ETHUSDT", 1648425600000 + i * 300000))
+
+    df = buffer.drain("ETH")
+    assert buffer.dropped == 2
+    assert len(buffer) == 0
+    assert df["timestamp"].to_list() == [
+        datetime(2022, 3, 28, 0, 10),
+        datetime(2022, 3, 28, 0, 15),
+        datetime(2022, 3, 28, 0, 20),
+    ]
+    assert df["close"].to_list() == [1.75] * 3
+
+
+def test_stream_urls_are_multiplexed():
+    stream = LiveKlineStream(
+        base_currencies={"USDT": ["ETH", "ADA", "XRP"]},
+        window_size="5m",
+        storage=None,
+        url="ws://localhost",
+        streams_per_connection=2,
+    )
+    assert stream.stream_urls() == [
+        "ws://localhost/stream?streams=ethusdt@kline_5m/adausdt@kline_5m",
+        "ws://localhost/stream?streams=xrpusdt@kline_5m",
+    ]
+
+
+def test_stream_stores_closed_candles_from_local_server(tmp_path):
+    messages = [
+        make_kline("ETHUSDT", 1648425600000),
+        make_kline("ETHUSDT", 1648425900000, closed=False),
+        make_kline("ADAUSDT", 1648425600000),
+        make_kline("ETHUSDT", 1648425900000),
+    ]
+
+    async def handler(connection, *args):
+        for kline in messages:
+            stream = f"{kline['s'].lower()}@kline_5m"
+            await connection.send(json.dumps({"stream": stream, "data": {"k": kline}}))
+        await asyncio.sleep(1)
+
+    async def run():
+        async with websockets.serve(handler, "localhost", 0) as server:
+            port = list(server.sockets)[0].getsockname()[1]
+            stream = LiveKlineStream(
+                base_currencies={"USDT": ["ETH", "ADA"]},
+                window_size="5m",
+                storage=ParquetStorage(str(tmp_path)),
+                url=f"ws://localhost:{port}",
+                flush_interval=0.1,
+            )
+            await stream.run(duration=0.5)
+            return stream
+
+    stream = asyncio.run(run())
+    eth = stream.storage.read("USDT", "ETH", "5m")
+    assert eth["timestamp"].to_list() == [
+        datetime(2022, 3, 28, 0, 0),
+        datetime(2022, 3, 28, 0, 5),
+    ]
+    assert len(stream.storage.read("USDT", "ADA", "5m")) == 1
+
+
+def test_stream_compacts_the_files_of_every_flush(tmp_path):
+    open_times = [1648425600000 + i * 300000 for i in range(6)]
+
+    async def handler(connection, *args):
+        for open_time in open_times:
+            kline = make_kline("ETHUSDT", open_time)
+            message = {"stream": "ethusdt@kline_5m", "data": {"k": kline}}
+            await connection.send(json.dumps(message))
+            # every candle is written by a flush of its own
+            await asyncio.sleep(0.2)
+        await asyncio.sleep(1)
+
+    async def run():
+        async with websockets.serve(handler, "localhost", 0) as server:
+            port = list(server.sockets)[0].getsockname()[1]
+            stream = LiveKlineStream(
+                base_currencies={"USDT": ["ETH"]},
+                window_size="5m",
+                storage=ParquetStorage(str(tmp_path)),
+                url=f"ws://localhost:{port}",
+                flush_interval=0.05,
+                compact_files=3,
+            )
+            await stream.run(duration=1.5)
+            return stream
+
+    stream = asyncio.run(run())
+    assert len(stream.storage.partitions("USDT", "ETH", "5m")) < 3
+    eth = stream.storage.read("USDT", "ETH", "5m")
+    assert eth["timestamp"].to_list() == [
+        datetime.utcfromtimestamp(open_time / 1000) for open_time in open_times
+    ]
+
+
+def test_ring_buffer_restores_drained_candles_in_front():
+    buffer = KlineRingBuffer(capacity=3)
+    buffer.push(make_kline("ETHUSDT", 1648425600000))
+    buffer.push(make_kline("ETHUSDT", 1648425900000))
+    df = buffer.drain("ETH")
+    buffer.push(make_kline("ETHUSDT", 1648426200000))
+    buffer.push(make_kline("ETHUSDT", 1648426500000))
+
+    # the oldest candle no longer fits
+    buffer.restore(df)
+    assert buffer.dropped == 1
+    assert buffer.drain("ETH")["timestamp"].to_list() == [
+        datetime(2022, 3, 28, 0, 5),
+        datetime(2022, 3, 28, 0, 10),
+        datetime(2022, 3, 28, 0, 15),
+    ]
+
+
+class FailingStorage(ParquetStorage):
+    def __init__(self, path: str, failures: int):
+        super().__init__(path)
+        self.failures = failures
+
+    def append(self, *args, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("disk full")
+        return super().append(*args, **kwargs)
+
+
+def test_stream_writes_the_candles_of_a_failed_flush_again(tmp_path):
+    async def run():
+        stream = LiveKlineStream(
+            base_currencies={"USDT": ["ETH"]},
+            window_size="5m",
+            storage=FailingStorage(str(tmp_path), failures=1),
+            url="ws://localhost:1",
+            flush_interval=0.05,
+        )
+        stream.handle_message(
+            json.dumps(
+                {
+                    "stream": "ethusdt@kline_5m",
+                    "data": {"k": make_kline("ETHUSDT", 1648425600000)},
+                }
+            )
+        )
+        await stream.run(duration=0.3)
+        return stream
+
+    stream = asyncio.run(run())
+    assert stream.storage.failures == 0
+    assert stream.storage.read("USDT", "ETH", "5m")["timestamp"].to_list() == [
+        datetime(2022, 3, 28, 0, 0)
+    ]
+    assert stream.writer.executor._shutdown
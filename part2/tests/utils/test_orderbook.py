@@ -0,0 +1,281 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from src.utils.cost_model import KLINES_WEIGHT, CostModel
+from src.utils.fake_exchange import DEFAULT_LISTING_TIME, FakeAsyncClient, FakeExchange
+from src.utils.orderbook import Orderbook
+from src.utils.worker_pool import WorkerPool
+
+WINDOW_SIZE_MS = 5 * 60 * 1000
+
+
+def make_exchange(listings: dict, failing: list = ()) -> FakeExchange:
+    """Returns a fake exchange that keeps the parameters of every klines request.
+
+    The klines requests of the failing pairs get a response that is not json, which
+    fails without being retried.
+    """
+    exchange = FakeExchange(
+        symbols=list(listings),
+        listings=listings,
+        request_weight=CostModel.request_weight,
+    )
+    exchange.klines_requests = []
+    request = exchange.request
+
+    async def _request(uri: str, params: dict):
+        if uri.endswith("klines"):
+            exchange.klines_requests.append(params)
+            if params["symbol"] in failing:
+                return 200, {}, "<html>"
+        return await request(uri, params)
+
+    exchange.request = _request
+    return exchange
+
+
+def make_orderbook(
+    path,
+    exchange: FakeExchange,
+    start_date: datetime,
+    base_currencies: list = ("USDT",),
+    **kwargs,
+):
+    """Creates an orderbook on the fake exchange, within a running event loop as the
+    client needs one."""
+    orderbook = Orderbook(
+        base_currencies=list(base_currencies),
+        window_size="5m",
+        base_path=str(path),
+        start_date=start_date.strftime("%d-%m-%Y"),
+        **kwargs,
+    )
+    orderbook.use_client(FakeAsyncClient(exchange))
+    return orderbook
+
+
+def expected_timestamps(exchange: FakeExchange, pair: str, start, end) -> list:
+    klines = exchange.klines(
+        pair=pair,
+        interval="5m",
+        start_time=Orderbook.datetime_to_milliseconds(start),
+        end_time=Orderbook.datetime_to_milliseconds(end),
+        limit=100_000,
+    )
+    return [datetime.utcfromtimestamp(kline[0] / 1000) for kline in klines]
+
+
+def test_sharded_backfill_stitches_the_pages_of_every_checkpoint(tmp_path):
+    start_date = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=10)
+    start_time = Orderbook.datetime_to_milliseconds(start_date)
+    exchange = make_exchange(
+        {
+            "ADAUSDT": start_time - 100 * WINDOW_SIZE_MS,
+            # listed within the first checkpoint, not at the start of a page
+            "ETHUSDT": start_time + 1500 * WINDOW_SIZE_MS + 12345,
+        }
+    )
+
+    async def run():
+        orderbook = make_orderbook(
+            tmp_path, exchange, start_date, backfill_concurrency=4, checkpoint_pages=2
+        )
+        await orderbook.get_orderbook(action="create", to_write=True)
+        return orderbook
+
+    orderbook = asyncio.run(run())
+
+    for pair, symbol in [("ADAUSDT", "ADA"), ("ETHUSDT", "ETH")]:
+        df = orderbook.storage.read("USDT", symbol, "5m")
+        assert df["timestamp"].to_list() == expected_timestamps(
+            exchange, pair, start_date, orderbook.newest_data_point
+        )
+
+    # the first candle of every pair is looked up once, not once per checkpoint
+    probes = [params for params in exchange.klines_requests if params["limit"] == "1"]
+    assert sorted(params["symbol"] for params in probes) == ["ADAUSDT", "ETHUSDT"]
+    ada_weight = KLINES_WEIGHT * sum(
+        params["symbol"] == "ADAUSDT" for params in exchange.klines_requests
+    )
+    assert ada_weight == orderbook.cost_model.historical_klines_weight(
+        start_date, orderbook.newest_data_point
+    )
+
+
+def test_failing_pair_does_not_stop_the_other_pairs_from_updating(tmp_path):
+    start_date = datetime.utcnow() - timedelta(days=2)
+    exchange = make_exchange(
+        {"AAAUSDT": DEFAULT_LISTING_TIME, "BBBUSDT": DEFAULT_LISTING_TIME},
+        failing=["BBBUSDT"],
+    )
+
+    async def run():
+        orderbook = make_orderbook(tmp_path, exchange, start_date)
+        await orderbook.get_orderbook(action="update", to_write=True)
+
+    for _ in range(3):
+        requests = len(exchange.klines_requests)
+        asyncio.run(run())
+        symbols = {params["symbol"] for params in exchange.klines_requests[requests:]}
+        assert symbols == {"AAAUSDT", "BBBUSDT"}
+
+
+def test_repair_only_retrieves_the_gaps(tmp_path):
+    start_date = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=10)
+    exchange = make_exchange({"ADAUSDT": DEFAULT_LISTING_TIME})
+
+    async def run(action: str):
+        orderbook = make_orderbook(tmp_path, exchange, start_date)
+        await orderbook.get_orderbook(action=action, to_write=True)
+        return orderbook
+
+    orderbook = asyncio.run(run("create"))
+    storage = orderbook.storage
+    df = storage.read("USDT", "ADA", "5m")
+    expected = df["timestamp"].to_list()
+    assert expected == expected_timestamps(
+        exchange, "ADAUSDT", start_date, orderbook.newest_data_point
+    )
+
+    # a short gap of a single page and a long one of two pages
+    with_gaps = df[:100].vstack(df[110:1000]).vstack(df[2500:])
+    storage.remove("USDT", "ADA", "5m")
+    storage.append("USDT", "ADA", "5m", with_gaps)
+    requests = len(exchange.klines_requests)
+
+    orderbook = asyncio.run(run("repair"))
+
+    assert storage.read("USDT", "ADA", "5m")["timestamp"].to_list() == expected
+    assert storage.gaps("USDT", "ADA", "5m") == []
+    # only the pages of the gaps, the earliest candle is not looked up
+    repair_requests = exchange.klines_requests[requests:]
+    assert len(repair_requests) == 3
+    assert all(params["limit"] == "1000" for params in repair_requests)
+    assert orderbook.estimate_symbol_cost("USDT", "ADA", "repair") == (
+        KLINES_WEIGHT * len(repair_requests)
+    )
+
+
+def test_create_on_a_stored_pair_continues_from_its_newest_candle(tmp_path):
+    start_date = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=5)
+    exchange = make_exchange({"ADAUSDT": DEFAULT_LISTING_TIME})
+
+    async def run():
+        orderbook = make_orderbook(tmp_path, exchange, start_date)
+        await orderbook.get_orderbook(action="create", to_write=True)
+        return orderbook
+
+    orderbook = asyncio.run(run())
+    last_timestamp = orderbook.storage.last_timestamp("USDT", "ADA", "5m")
+    requests = len(exchange.klines_requests)
+    orderbook = asyncio.run(run())
+
+    df = orderbook.storage.read("USDT", "ADA", "5m")
+    assert df["timestamp"].to_list() == expected_timestamps(
+        exchange, "ADAUSDT", start_date, orderbook.newest_data_point
+    )
+    # the history is not retrieved again
+    pages = [
+        params
+        for params in exchange.klines_requests[requests:]
+        if params["limit"] == "1000"
+    ]
+    assert len(pages) == 1
+    assert int(pages[0]["startTime"]) >= Orderbook.datetime_to_milliseconds(
+        last_timestamp
+    )
+
+
+def test_base_currencies_share_one_pool_and_one_journal(tmp_path, monkeypatch):
+    start_date = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=2)
+    exchange = make_exchange(
+        {
+            "ETHUSDT": DEFAULT_LISTING_TIME,
+            "ADAUSDT": DEFAULT_LISTING_TIME,
+            "ETHBTC": DEFAULT_LISTING_TIME,
+        }
+    )
+    runs = []
+    run_pool = WorkerPool.run
+
+    async def record_run(pool, jobs, worker):
+        runs.append(sorted(jobs))
+        return await run_pool(pool, jobs=jobs, worker=worker)
+
+    monkeypatch.setattr(WorkerPool, "run", record_run)
+
+    async def run():
+        orderbook = make_orderbook(
+            tmp_path, exchange, start_date, base_currencies=["USDT", "BTC"]
+        )
+        # the journal forgets the completed pairs once the run is done
+        finish = orderbook.journal.finish
+        completed = []
+
+        def record_finish():
+            completed.extend(sorted(orderbook.journal.completed))
+            finish()
+
+        orderbook.journal.finish = record_finish
+        await orderbook.get_orderbook(action="create", to_write=True)
+        return orderbook, completed
+
+    orderbook, completed = asyncio.run(run())
+
+    assert runs == [[("BTC", "ETH"), ("USDT", "ADA"), ("USDT", "ETH")]]
+    assert completed == ["BTC/ETH", "USDT/ADA", "USDT/ETH"]
+    storage = orderbook.storage
+    assert storage.symbols("USDT", "5m") == ["ADA", "ETH"]
+    assert storage.symbols("BTC", "5m") == ["ETH"]
+    for base_currency, symbol in [("USDT", "ADA"), ("USDT", "ETH"), ("BTC", "ETH")]:
+        df = storage.read(base_currency, symbol, "5m")
+        assert df["timestamp"].to_list() == expected_timestamps(
+            exchange,
+            f"{symbol}{base_currency}",
+            start_date,
+            orderbook.newest_data_point,
+        )
+
+
+def test_newest_data_point_is_the_newest_closed_candle(tmp_path):
+    start_date = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timedelta(days=1)
+    exchange = make_exchange({"ADAUSDT": DEFAULT_LISTING_TIME})
+    server_times = []
+    request = exchange.request
+
+    async def _request(uri: str, params: dict):
+        status, headers, body = await request(uri, params)
+        if uri.endswith("time"):
+            server_times.append(json.loads(body)["serverTime"])
+        return status, headers, body
+
+    exchange.request = _request
+
+    async def run():
+        orderbook = make_orderbook(tmp_path, exchange, start_date)
+        await orderbook.get_orderbook(action="create", to_write=True)
+        return orderbook
+
+    orderbook = asyncio.run(run())
+
+    # aligned to the window and closed before the time of the exchange
+    newest = Orderbook.datetime_to_milliseconds(orderbook.newest_data_point)
+    assert newest % WINDOW_SIZE_MS == 0
+    assert newest + WINDOW_SIZE_MS <= server_times[0] < newest + 2 * WINDOW_SIZE_MS
+    # the candle that is still open is neither requested nor stored
+    pages = [params for params in exchange.klines_requests if "endTime" in params]
+    assert len(pages) > 0
+    assert all(int(params["endTime"]) <= newest for params in pages)
+    storage = orderbook.storage
+    assert storage.last_timestamp("USDT", "ADA", "5m") == orderbook.newest_data_point
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from part2.src.utils.rate_limiter import RateLimiter
+
+
+def test_acquire_within_budget_does_not_wait():
+    async def acquire_all():
+        rate_limiter = RateLimiter(limit=100, period=60)
+        start_time = time.monotonic()
+        for _ in range(10):
+            await rate_limiter.acquire(10)
+        return time.monotonic() - start_time, rate_limiter.used_weight
+
+    duration, used_weight = asyncio.run(acquire_all())
+    assert duration < 0.1
+    assert used_weight == 100
+
+
+def test_acquire_waits_until_budget_frees_up():
+    async def acquire_over_budget():
+        rate_limiter = RateLimiter(limit=10, period=1)
+        await rate_limiter.acquire(10)
+        start_time = time.monotonic()
+        await rate_limiter.acquire(1)
+        return time.monotonic() - start_time
+
+    assert 0 < asyncio.run(acquire_over_budget()) < 1.1
+
+
+def test_update_uses_weight_reported_by_exchange():
+    rate_limiter = RateLimiter(limit=1200, period=60)
+    rate_limiter.update({"x-mbx-used-weight-1m": "500"})
+    assert rate_limiter.used_weight == 500
+
+    # a response of a previous window does not count for the current one
+    rate_limiter.update({"x-mbx-used-weight-1m": "900"}, window=0)
+    assert rate_limiter.used_weight == 500
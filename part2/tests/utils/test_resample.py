@@ -0,0 +1,128 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from part2.src.utils.resample import (
+    EPOCH,
+    IntervalDeriver,
+    build_pyramid,
+    pyramid_sources,
+    resample_ohlcv,
+)
+from part2.src.utils.storage import ParquetStorage
+from part2.tests.utils.test_storage import make_candles
+
+
+def test_resample_ohlcv_aggregates_exactly():
+    candles = make_candles(datetime(2022, 4, 1), 24)
+    df = resample_ohlcv(candles, "1h")
+
+    assert df["timestamp"].to_list() == [datetime(2022, 4, 1), datetime(2022, 4, 1, 1)]
+    assert df["open"].to_list() == [0.0, 12.0]
+    assert df["high"].to_list() == [12.0, 24.0]
+    assert df["low"].to_list() == [-1.0, 11.0]
+    assert df["close"].to_list() == [11.0, 23.0]
+    assert df["volume"].to_list() == [12.0, 12.0]
+    assert df["trades"].to_list() == [12, 12]
+
+
+def test_weekly_candles_start_on_monday():
+    # 01-04-2022 is a friday
+    df = resample_ohlcv(make_candles(datetime(2022, 4, 1), 12), "1w")
+    assert df["timestamp"].to_list() == [datetime(2022, 3, 28)]
+
+
+def test_pyramid_aggregates_from_the_largest_exact_divisor():
+    assert pyramid_sources(["1h", "2h", "4h", "12h", "1d", "2d", "3d", "1w"]) == {
+        "1h": None,
+        "2h": "1h",
+        "4h": "2h",
+        "12h": "4h",
+        "1d": "12h",
+        "2d": "1d",
+        "3d": "1d",
+        "1w": "1d",
+    }
+
+
+def test_pyramid_matches_resampling_the_base_candles():
+    candles = make_candles(datetime(2022, 3, 30, 7), 12 * 24 * 20)
+    intervals = ["1w", "1h", "3d", "2d", "1d", "4h", "12h"]
+    pyramid = build_pyramid(candles.lazy(), intervals, by="symbol")
+
+    assert list(pyramid) == intervals
+    for interval, df in pyramid.items():
+        assert isinstance(df, pl.LazyFrame)
+        assert df.collect().frame_equal(resample_ohlcv(candles, interval, by="symbol"))
+
+
+def test_derive_incrementally_only_stores_closed_candles(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    deriver = IntervalDeriver(storage, base_interval="5m", intervals=["15m", "1h"])
+    candles = make_candles(datetime(2022, 4, 1), 30)
+
+    storage.append("USDT", "ETH", "5m", candles[:20])
+    deriver.derive("USDT", "ETH")
+    assert len(storage.read("USDT", "ETH", "1h")) == 1
+    assert len(storage.read("USDT", "ETH", "15m")) == 6
+
+    storage.append("USDT", "ETH", "5m", candles[20:])
+    deriver.derive("USDT", "ETH")
+    expected = resample_ohlcv(candles, "15m", by="symbol")
+    derived = storage.read("USDT", "ETH", "15m")
+    assert derived.select(expected.columns).frame_equal(expected)
+    assert derived["close_time"][-1] == datetime(2022, 4, 1, 2, 29, 59, 999000)
+
+
+def record_scans(storage: ParquetStorage) -> list:
+    """Keeps the interval, the symbols and the start of every scan of the
+    storage."""
+    scans = []
+    scan_universe = storage.scan_universe
+
+    def _scan_universe(base_currency, interval, symbols=None, start=None, end=None):
+        scans.append((interval, symbols, start))
+        return scan_universe(base_currency, interval, symbols, start, end)
+
+    storage.scan_universe = _scan_universe
+    return scans
+
+
+def test_update_reads_every_symbol_from_its_own_watermark(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    deriver = IntervalDeriver(storage, base_interval="5m", intervals=["15m", "1h"])
+    ada = make_candles(datetime(2022, 4, 1), 600, "ADA")
+    storage.append("USDT", "ADA", "5m", ada[:300])
+    # stopped trading long ago, every candle of it is derived already
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 3, 1), 24))
+    deriver.update("USDT")
+
+    storage.append("USDT", "ADA", "5m", ada[300:])
+    storage.append("USDT", "BTC", "5m", make_candles(datetime(2022, 4, 2), 12, "BTC"))
+    scans = record_scans(storage)
+    deriver.update("USDT")
+
+    # the new symbol is read from its first candle, without dragging the others
+    assert scans == [("5m", ["BTC"], EPOCH), ("5m", ["ADA"], datetime(2022, 4, 2, 1))]
+    for symbol, candles in [("ADA", ada), ("BTC", storage.read("USDT", "BTC", "5m"))]:
+        expected = resample_ohlcv(candles, "1h", by="symbol")
+        derived = storage.read("USDT", symbol, "1h")
+        assert derived.select(expected.columns).frame_equal(expected)
+
+
+def test_deriver_rejects_intervals_that_do_not_divide():
+    with pytest.raises(ValueError):
+        IntervalDeriver(ParquetStorage("data/"), base_interval="3d", intervals=["1w"])
+    with pytest.raises(ValueError):
+        IntervalDeriver(ParquetStorage("data/"), base_interval="1h", intervals=["1h"])
+
+
+def test_derived_candles_keep_the_stored_columns(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12))
+    IntervalDeriver(storage, base_interval="5m", intervals=["1h"]).derive("USDT", "ETH")
+
+    derived = storage.read("USDT", "ETH", "1h")
+    assert derived.columns == make_candles(datetime(2022, 4, 1), 1).columns
+    assert derived.filter(pl.col("symbol") == "ETH").height == 1
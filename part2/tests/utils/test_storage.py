@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from part2.src.utils.storage import CsvStorage, ParquetStorage, copy_symbols
+
+
+def make_candles(start: datetime, n: int, symbol: str = "ETH") -> pl.DataFrame:
+    timestamps = [start + timedelta(minutes=5 * i) for i in range(n)]
+    return pl.DataFrame(
+        {
+            "timestamp": timestamps,
+            "close_time": [t + timedelta(minutes=5) for t in timestamps],
+            "open": [float(i) for i in range(n)],
+            "high": [float(i + 1) for i in range(n)],
+            "low": [float(i - 1) for i in range(n)],
+            "close": [float(i) for i in range(n)],
+            "volume": [1.0] * n,
+            "quote_av": [1.0] * n,
+            "tb_base_av": [1.0] * n,
+            "tb_quote_av": [1.0] * n,
+            "trades": [1] * n,
+            "symbol": [symbol] * n,
+        }
+    ).with_columns([pl.col(["timestamp", "close_time"]).dt.cast_time_unit("ms")])
+
+
+def test_parquet_storage_append_only_adds_files(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 3, 31, 23), 24))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 1), 12))
+
+    # the first write spans two months, the second one adds a file to april
+    assert len(storage.partitions("USDT", "ETH", "5m")) == 3
+    df = storage.read("USDT", "ETH", "5m")
+    assert len(df) == 36
+    assert df["timestamp"].series_equal(df["timestamp"].sort())
+    assert storage.symbols("USDT", "5m") == ["ETH"]
+
+
+def test_parquet_storage_compact(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 1), 12))
+    storage.compact("USDT", "ETH", "5m")
+
+    assert len(storage.partitions("USDT", "ETH", "5m")) == 1
+    assert len(storage.read("USDT", "ETH", "5m")) == 24
+
+
+def test_parquet_storage_read_missing_symbol(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    assert not storage.exists("USDT", "ETH", "5m")
+    assert len(storage.read("USDT", "ETH", "5m")) == 0
+
+
+def test_copy_symbols_from_csv(tmp_path):
+    (tmp_path / "USDT").mkdir()
+    csv_storage = CsvStorage(str(tmp_path))
+    csv_storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12))
+    csv_storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 1), 12))
+
+    parquet_storage = ParquetStorage(str(tmp_path / "parquet"))
+    copy_symbols(csv_storage, parquet_storage, "USDT", "5m")
+
+    assert parquet_storage.read("USDT", "ETH", "5m").frame_equal(
+        csv_storage.read("USDT", "ETH", "5m")
+    )
+
+
+def test_parquet_storage_last_timestamp(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    assert storage.last_timestamp("USDT", "ETH", "5m") is None
+
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12))
+    assert storage.last_timestamp("USDT", "ETH", "5m") == datetime(2022, 4, 1, 0, 55)
+
+    # a crash after writing the files leaves the previous manifest behind
+    manifest_file = (
+        tmp_path / "base=USDT" / "symbol=ETH" / "interval=5m" / "_manifest.json"
+    )
+    manifest = manifest_file.read_text()
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 1), 12))
+    manifest_file.write_text(manifest)
+    assert storage.last_timestamp("USDT", "ETH", "5m") == datetime(2022, 4, 1, 1, 55)
+
+    # without manifest the watermark is derived from the file names
+    manifest_file.unlink()
+    assert storage.last_timestamp("USDT", "ETH", "5m") == datetime(2022, 4, 1, 1, 55)
+
+
+def test_csv_storage_last_timestamp(tmp_path):
+    (tmp_path / "USDT").mkdir()
+    storage = CsvStorage(str(tmp_path))
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 500))
+
+    assert storage.last_timestamp("USDT", "ETH", "5m") == datetime(2022, 4, 2, 17, 35)
+
+
+def test_scan_universe_prunes_files_by_symbol_and_time(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    for symbol in ["ETH", "ADA", "DOT"]:
+        candles = make_candles(datetime(2022, 3, 31), 600, symbol)
+        storage.append("USDT", symbol, "5m", candles)
+
+    catalog = storage.catalog("USDT", "5m")
+    assert sorted(catalog["month"].unique()) == ["2022-03", "2022-04"]
+    assert len(catalog) == 6
+
+    df = storage.scan_universe(
+        "USDT", "5m", symbols=["ETH", "ADA"], start=datetime(2022, 4, 1, 12)
+    ).collect()
+    assert df["symbol"].unique().sort().to_list() == ["ADA", "ETH"]
+    assert df["timestamp"].min() == datetime(2022, 4, 1, 12)
+    # sorted by symbol and time
+    assert df["symbol"].to_list() == ["ADA"] * 168 + ["ETH"] * 168
+
+
+def test_compact_schema_reads_wide_and_compact_files(tmp_path):
+    ParquetStorage(str(tmp_path)).append(
+        "USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12)
+    )
+    storage = ParquetStorage(str(tmp_path), compact_schema=True)
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 1), 12))
+
+    df = storage.read("USDT", "ETH", "5m")
+    assert df.columns == make_candles(datetime(2022, 4, 1), 1).columns
+    assert df.schema["close"] == pl.Float32
+    assert df.schema["symbol"] == pl.Categorical
+    assert len(df) == 24
+    assert df["close_time"][0] == datetime(2022, 4, 1, 0, 4, 59, 999000)
+    assert df["symbol"].unique().to_list() == ["ETH"]
+
+    # a month with files of both schemas is merged into a single compact file
+    storage.merge("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1, 2), 12))
+    assert len(storage.partitions("USDT", "ETH", "5m")) == 1
+    df = storage.read("USDT", "ETH", "5m")
+    assert len(df) == 36
+    assert df["timestamp"].to_list() == sorted(df["timestamp"].to_list())
+
+
+def test_gaps_lists_the_missing_ranges(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    candles = make_candles(datetime(2022, 4, 1), 24)
+    storage.append("USDT", "ETH", "5m", candles[:5].vstack(candles[8:10]))
+    storage.append("USDT", "ETH", "5m", candles[11:])
+
+    assert storage.gaps("USDT", "ETH", "5m") == [
+        (datetime(2022, 4, 1, 0, 25), datetime(2022, 4, 1, 0, 35)),
+        (datetime(2022, 4, 1, 0, 50), datetime(2022, 4, 1, 0, 50)),
+    ]
+
+
+def test_merge_fills_gaps_without_duplicates(tmp_path):
+    for storage in [
+        ParquetStorage(str(tmp_path / "parquet")),
+        CsvStorage(str(tmp_path)),
+    ]:
+        (tmp_path / "USDT").mkdir(exist_ok=True)
+        candles = make_candles(datetime(2022, 4, 1), 24)
+        storage.append("USDT", "ETH", "5m", candles[:5].vstack(candles[8:10]))
+        storage.append("USDT", "ETH", "5m", candles[11:])
+
+        # the refill overlaps with the stored candles around the gaps
+        storage.merge("USDT", "ETH", "5m", candles[3:12])
+
+        df = storage.read("USDT", "ETH", "5m")
+        assert df["timestamp"].series_equal(candles["timestamp"])
+        assert storage.gaps("USDT", "ETH", "5m") == []
+
+
+def test_compact_schema_scans_symbols_without_a_global_string_cache(tmp_path):
+    storage = ParquetStorage(str(tmp_path), compact_schema=True)
+    assert not pl.using_string_cache()
+    storage.append("USDT", "ETH", "5m", make_candles(datetime(2022, 4, 1), 12))
+    storage.append("USDT", "ADA", "5m", make_candles(datetime(2022, 4, 1), 12, "ADA"))
+
+    df = storage.scan_universe("USDT", "5m").collect()
+    assert not pl.using_string_cache()
+    assert "close_time" not in df.columns
+    assert df.schema["symbol"] == pl.Categorical
+    assert df["symbol"].cast(pl.Utf8).to_list() == ["ADA"] * 12 + ["ETH"] * 12
@@ -0,0 +1,49 @@
+import asyncio
+
+from part2.src.utils.symbol_registry import SymbolRegistry
+
+
+class ExchangeInfoClient:
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = 0
+
+    async def get_exchange_info(self):
+        self.calls += 1
+        return {
+            "symbols": [
+                {
+                    "symbol": pair,
+                    "status": status,
+                    "baseAsset": pair[:-4],
+                    "quoteAsset": pair[-4:],
+                }
+                for pair, status in self.statuses.items()
+            ]
+        }
+
+
+def test_refresh_reports_added_and_delisted_pairs(tmp_path):
+    registry = SymbolRegistry(str(tmp_path / "_symbols.json"), ttl=0)
+    client = ExchangeInfoClient({"ETHUSDT": "TRADING", "ADAUSDT": "TRADING"})
+    assert asyncio.run(registry.refresh(client)) == (["ADAUSDT", "ETHUSDT"], [])
+
+    client.statuses = {"ETHUSDT": "BREAK", "DOTUSDT": "TRADING"}
+    assert asyncio.run(registry.refresh(client)) == (
+        ["DOTUSDT"],
+        ["ADAUSDT", "ETHUSDT"],
+    )
+    assert registry.symbols("USDT") == ["DOT"]
+    assert not registry.is_trading("USDT", "ETH")
+
+
+def test_fresh_registry_is_loaded_from_its_file(tmp_path):
+    path = str(tmp_path / "_symbols.json")
+    client = ExchangeInfoClient({"ETHUSDT": "TRADING", "BULLUSDT": "TRADING"})
+    asyncio.run(SymbolRegistry(path).refresh(client))
+
+    registry = SymbolRegistry(path, deprecated_coins=["BULL"])
+    assert asyncio.run(registry.refresh(client)) == ([], [])
+    assert client.calls == 1
+    assert registry.symbols("USDT") == ["ETH"]
+    assert registry.is_trading("USDT", "ETH")
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from part2.src.utils.worker_pool import WorkerPool
+
+
+def test_slow_job_does_not_hold_back_other_jobs():
+    completed = []
+
+    async def fetch(job):
+        await asyncio.sleep(0.3 if job == "slow" else 0.01)
+
+    async def run():
+        worker_pool = WorkerPool(
+            number_of_workers=2,
+            on_complete=lambda job, error, progress: completed.append(
+                (job, time.monotonic() - progress.start_time)
+            ),
+        )
+        return await worker_pool.run(["slow"] + [f"fast-{i}" for i in range(10)], fetch)
+
+    progress = asyncio.run(run())
+    assert progress.completed == 11
+    assert completed[-1][0] == "slow"
+    # all fast jobs are processed by the second worker while the slow one runs
+    assert all(duration < 0.3 for job, duration in completed[:-1])
+
+
+def test_failing_job_is_recorded():
+    async def fetch(job):
+        if job == 2:
+            raise ValueError("failed")
+
+    progress = asyncio.run(WorkerPool(number_of_workers=3).run(range(5), fetch))
+    assert progress.completed == 5
+    assert progress.failed == [2]
+    assert progress.eta == 0
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from part2.src.utils.writer import AsyncWriter
+
+
+class RecordingStorage:
+    def __init__(self, fail_symbol=None):
+        self.appends = []
+        self.fail_symbol = fail_symbol
+
+    def append(self, base_currency, symbol, interval, df):
+        if symbol == self.fail_symbol:
+            raise OSError("disk full")
+        self.appends.append((base_currency, symbol, interval, len(df)))
+
+
+def candles(n):
+    return pl.DataFrame(
+        {
+            "timestamp": [datetime(2022, 1, 1, 0, i) for i in range(n)],
+            "close": [1.0] * n,
+        }
+    )
+
+
+def test_queued_writes_are_combined_per_symbol():
+    storage = RecordingStorage()
+
+    async def run():
+        writer = AsyncWriter(storage, max_queue_size=8)
+        # writes queued before the writer starts end up in the same batch
+        futures = [
+            await writer.put("USDT", symbol, "5m", candles(2))
+            for symbol in ["ETH", "ADA", "ETH"]
+        ]
+        writer.start()
+        await writer.close()
+        return writer, futures
+
+    writer, futures = asyncio.run(run())
+    assert writer.batches == 1
+    assert sorted(storage.appends) == [
+        ("USDT", "ADA", "5m", 2),
+        ("USDT", "ETH", "5m", 4),
+    ]
+    assert all(future.done() and future.exception() is None for future in futures)
+
+
+def test_full_queue_applies_backpressure():
+    async def run():
+        writer = AsyncWriter(RecordingStorage(), max_queue_size=1)
+        await writer.put("USDT", "ETH", "5m", candles(1))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(writer.put("USDT", "ADA", "5m", candles(1)), 0.1)
+
+        writer.start()
+        await writer.put("USDT", "ADA", "5m", candles(1))
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_failed_write_is_set_on_the_future():
+    async def run():
+        writer = AsyncWriter(RecordingStorage(fail_symbol="ETH"), max_batch_size=1)
+        writer.start()
+        failed = await writer.put("USDT", "ETH", "5m", candles(1))
+        written = await writer.put("USDT", "ADA", "5m", candles(1))
+        await writer.close()
+        return failed, written
+
+    failed, written = asyncio.run(run())
+    assert isinstance(failed.exception(), OSError)
+    assert written.exception() is None